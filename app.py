@@ -1,32 +1,148 @@
 """
 Aplicación Flask principal - API REST para SalesFlow
 """
-from flask import Flask, jsonify, request, render_template
+from flask import Flask, Response, jsonify, request, render_template, send_file, stream_with_context
 from flask_cors import CORS
-from models import Venta, Cliente, Producto
-from builder import ReporteVentasBuilder, FacturaBuilder
-from datetime import datetime
+from models import Venta, Cliente, Producto, CambiosVenta, WatermarkExpirado
+from database import ConnectionPool, Database, RegistroSentencias
+from cache import TTLCache
+from builder import ReporteVentasBuilder
+from exportacion import FORMATOS, generar_csv, generar_ndjson
+from eventos import generar_eventos_ventas
+from comandos import registrar_comandos
+from esquema import advertir_planes, falta_tabla, migrar_al_iniciar
+from facturacion import iniciar_lote, consultar_lote, clave_periodo, validar_workers
+from trabajos import COMPLETADO, consultar_trabajo, enviar_trabajo, ruta_resultado
+from importacion import IMPORTACION_LOTE, RECHAZOS_DETALLE, ErrorImportacion, importar_ventas
+from peticiones import (
+    ErrorPeticion, aplicar_filtros_reporte, cambios_ventas, es_entero, factura_de_venta, factura_de_ventas,
+    leer_paginacion, leer_periodo, leer_since, leer_solicitud_factura, pagina_ventas, preparar_reporte,
+    revisar_rango_factura, revisar_ventas_factura, ventas_de_cliente, LIMITE_VENTAS_FACTURA
+)
+from instrumentacion import (
+    ProveedorJSONMedido, formato_prometheus, iniciar_medicion, indicadores_de, presupuesto_consultas,
+    registrar_request, resumen_medicion, server_timing
+)
+from decimal import Decimal
+from serializacion import dumps_bytes
+import gzip
+import io
+import itertools
+import logging
+import os
 import mysql.connector
 
 app = Flask(__name__)
+app.json = ProveedorJSONMedido(app)
 CORS(app)  # Permite peticiones desde cualquier origen
+registrar_comandos(app)
+migrar_al_iniciar()
+
+if os.getenv('REVISAR_PLANES') == '1':
+    # Advierte al iniciar si alguna consulta crítica recorre tablas completas
+    try:
+        advertir_planes()
+    except mysql.connector.Error as e:
+        logging.getLogger(__name__).warning("No se pudieron revisar los planes de consulta: %s", e)
+
+@app.before_request
+def iniciar_medicion_request():
+    """Reinicia los contadores de consultas del request"""
+    iniciar_medicion()
+
+@app.after_request
+def registrar_medicion(response):
+    """Agrega la cabecera Server-Timing y acumula las métricas del endpoint"""
+    if request.endpoint != 'metricas':
+        medicion = resumen_medicion()
+        response.headers['Server-Timing'] = server_timing(medicion)
+        endpoint = request.url_rule.rule if request.url_rule else 'desconocido'
+        registrar_request(endpoint, request.method, response.status_code, medicion)
+    return response
+
+@app.teardown_appcontext
+def liberar_conexion(error):
+    """Devuelve al pool la conexión usada durante el request"""
+    Database().release_connection(discard=isinstance(error, mysql.connector.Error))
+
+def respuesta_error(error: Exception):
+    """500 con el mensaje del error; 503 si falta una tabla porque no se aplicaron las migraciones"""
+    if falta_tabla(error):
+        return jsonify({
+            "success": False,
+            "error": "El esquema de la base de datos no está al día; aplique las migraciones "
+                     "(flask --app app db migrar)"
+        }), 503
+    return jsonify({
+        "success": False,
+        "error": str(error)
+    }), 500
+
+def respuesta_watermark_expirado(error: WatermarkExpirado):
+    """410: el cliente debe descartar sus datos y volver a cargarlos completos"""
+    return jsonify({
+        "success": False,
+        "error": str(error),
+        "recargar": True
+    }), 410
 
 # ==================== ENDPOINTS DE VENTAS (CRUD) ====================
 
 @app.route('/api/ventas', methods=['GET'])
 def get_ventas():
-    """Obtiene todas las ventas"""
+    """Obtiene una página de ventas (paginación por cursor)
+    
+    Con `since=<watermark>` retorna en cambio solo las ventas insertadas o
+    actualizadas desde ese watermark, los IDs eliminados y el nuevo watermark.
+    """
     try:
-        ventas = Venta.get_all()
-        # Convertir fechas datetime a string
-        for venta in ventas:
-            if isinstance(venta['fecha'], datetime):
-                venta['fecha'] = venta['fecha'].isoformat()
+        try:
+            limite, cursor = leer_paginacion(request.args)
+            since = leer_since(request.args)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        if since is not None:
+            try:
+                ids, watermark, hay_mas = CambiosVenta.desde(since)
+            except WatermarkExpirado as e:
+                return respuesta_watermark_expirado(e)
+            ventas = Venta.buscar(ids=ids) if ids else []
+            return jsonify(cambios_ventas(ids, ventas, watermark, hay_mas)), 200
+        
+        # La primera página trae el watermark desde el que pedir cambios
+        watermark = CambiosVenta.watermark() if cursor is None else None
+        ventas, siguiente = Venta.paginar(limite, cursor)
+        return jsonify(pagina_ventas(ventas, siguiente, watermark)), 200
+    except Exception as e:
         return jsonify({
-            "success": True,
-            "data": ventas,
-            "total": len(ventas)
-        }), 200
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/ventas/stream', methods=['GET'])
+def stream_ventas():
+    """Transmite con Server-Sent Events las ventas insertadas, actualizadas o eliminadas
+    
+    Empieza en el watermark de `Last-Event-ID` (reconexión) o de `since`; sin
+    ninguno, en el watermark actual.
+    """
+    try:
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        if since is not None and not since.isdigit():
+            return jsonify({
+                "success": False,
+                "error": "Last-Event-ID y since deben ser un watermark (entero no negativo)"
+            }), 400
+        since = int(since) if since is not None else CambiosVenta.watermark()
+        
+        return Response(generar_eventos_ventas(since), content_type='text/event-stream', headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        })
     except Exception as e:
         return jsonify({
             "success": False,
@@ -39,8 +155,6 @@ def get_venta(id_venta):
     try:
         venta = Venta.get_by_id(id_venta)
         if venta:
-            if isinstance(venta['fecha'], datetime):
-                venta['fecha'] = venta['fecha'].isoformat()
             return jsonify({
                 "success": True,
                 "data": venta
@@ -57,6 +171,7 @@ def get_venta(id_venta):
         }), 500
 
 @app.route('/api/ventas', methods=['POST'])
+@presupuesto_consultas(8)
 def create_venta():
     """Crea una nueva venta"""
     try:
@@ -95,16 +210,12 @@ def create_venta():
             }), 404
         
         # Calcular total
-        precio_unitario = float(producto['precio'])
-        total = precio_unitario * cantidad
+        total = Decimal(str(producto['precio'])) * cantidad
         
-        # Crear venta
-        venta_id = Venta.create(id_cliente, id_producto, cantidad, total)
-        
-        # Obtener la venta creada
-        venta = Venta.get_by_id(venta_id)
-        if isinstance(venta['fecha'], datetime):
-            venta['fecha'] = venta['fecha'].isoformat()
+        # Crear venta (con la hora del servidor de base de datos) y componer
+        # la respuesta con los datos ya disponibles
+        venta_id, fecha = Venta.create(id_cliente, id_producto, cantidad, total)
+        venta = Venta.fila_detalle(venta_id, fecha, cantidad, total, cliente, producto)
         
         return jsonify({
             "success": True,
@@ -113,12 +224,148 @@ def create_venta():
         }), 201
     
     except Exception as e:
+        return respuesta_error(e)
+
+LIMITE_LOTE_VENTAS = 1000
+
+@app.route('/api/ventas/batch', methods=['POST'])
+@presupuesto_consultas(8)
+def create_ventas_batch():
+    """Crea un lote de ventas en una sola transacción"""
+    try:
+        data = request.get_json()
+        
+        if not isinstance(data, list) or not data:
+            return jsonify({
+                "success": False,
+                "error": "Se esperaba una lista de ventas"
+            }), 400
+        
+        if len(data) > LIMITE_LOTE_VENTAS:
+            return jsonify({
+                "success": False,
+                "error": f"El lote no puede superar {LIMITE_LOTE_VENTAS} ventas"
+            }), 400
+        
+        # Revisar los tipos de cada fila antes de consultar la base de datos
+        errores = []
+        candidatas = []
+        for indice, fila in enumerate(data):
+            fila = fila if isinstance(fila, dict) else {}
+            id_cliente = fila.get('id_cliente')
+            id_producto = fila.get('id_producto')
+            cantidad = fila.get('cantidad', 1)
+            
+            if not id_cliente or not id_producto:
+                error = "id_cliente e id_producto son requeridos"
+            elif not es_entero(id_cliente) or not es_entero(id_producto):
+                error = "id_cliente e id_producto deben ser enteros"
+            elif not es_entero(cantidad) or cantidad < 1:
+                error = "cantidad debe ser un entero positivo"
+            else:
+                candidatas.append((indice, id_cliente, id_producto, cantidad))
+                continue
+            errores.append({"indice": indice, "error": error})
+        
+        # Validar clientes y productos con una consulta por tabla
+        clientes = Cliente.get_many([candidata[1] for candidata in candidatas])
+        productos = Producto.get_many([candidata[2] for candidata in candidatas])
+        
+        validas = []
+        indices = []
+        for indice, id_cliente, id_producto, cantidad in candidatas:
+            if id_cliente not in clientes:
+                error = "Cliente no encontrado"
+            elif id_producto not in productos:
+                error = "Producto no encontrado"
+            else:
+                total = Decimal(str(productos[id_producto]['precio'])) * cantidad
+                validas.append((id_cliente, id_producto, cantidad, total))
+                indices.append(indice)
+                continue
+            errores.append({"indice": indice, "error": error})
+        errores.sort(key=lambda error: error["indice"])
+        
+        if not validas:
+            return jsonify({
+                "success": False,
+                "error": "Ninguna venta del lote es válida",
+                "errores": errores
+            }), 400
+        
+        # Insertar todas las ventas válidas en una sola transacción
+        ids_creados = Venta.create_many(validas)
+        ids = [None] * len(data)
+        for indice, id_venta in zip(indices, ids_creados):
+            ids[indice] = id_venta
+        
         return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+            "success": True,
+            "message": f"{len(ids_creados)} ventas creadas exitosamente",
+            "ids": ids,
+            "errores": errores
+        }), 201
+    
+    except Exception as e:
+        return respuesta_error(e)
+
+@app.route('/api/ventas/importar', methods=['POST'])
+def importar_ventas_csv():
+    """Importa ventas desde un CSV, como archivo `archivo` de un formulario o como cuerpo `text/csv`
+    
+    El archivo se procesa en streaming por lotes de `lote` ventas (query
+    string) y la respuesta es NDJSON: una línea de progreso por lote insertado
+    y una línea final con el resumen y las primeras filas rechazadas.
+    """
+    try:
+        lote = request.args.get('lote', IMPORTACION_LOTE, type=int)
+        saltar = request.args.get('saltar', 0, type=int)
+        if 'archivo' in request.files:
+            binario = request.files['archivo'].stream
+        else:
+            binario = request.stream
+        lineas = io.TextIOWrapper(binario, encoding='utf-8-sig', newline='')
+        
+        rechazos = []
+        def rechazada(rechazo):
+            if len(rechazos) < RECHAZOS_DETALLE:
+                rechazos.append(rechazo)
+        
+        progreso = importar_ventas(lineas, lote or 0, max(saltar or 0, 0), rechazada)
+        try:
+            # El encabezado se valida antes de empezar a responder
+            primero = next(progreso)
+        except ErrorImportacion as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        def generar():
+            estado = None
+            try:
+                for estado in itertools.chain([primero], progreso):
+                    if estado['estado'] == 'completado':
+                        estado = {**estado, "rechazos": rechazos}
+                    yield dumps_bytes({"success": True, **estado}) + b"\n"
+            except Exception as e:
+                ultimo = estado or {}
+                yield dumps_bytes({
+                    "success": False,
+                    "estado": "interrumpido",
+                    "error": str(e),
+                    "insertadas": ultimo.get('insertadas', 0),
+                    "reanudar_desde": ultimo.get('leidas', max(saltar or 0, 0)),
+                    "rechazos": rechazos
+                }) + b"\n"
+        
+        return Response(stream_with_context(generar()), content_type='application/x-ndjson')
+    
+    except Exception as e:
+        return respuesta_error(e)
 
 @app.route('/api/ventas/<int:id_venta>', methods=['PUT'])
+@presupuesto_consultas(9)
 def update_venta(id_venta):
     """Actualiza una venta existente"""
     try:
@@ -143,30 +390,30 @@ def update_venta(id_venta):
         cantidad = data.get('cantidad', venta_existente['cantidad'])
         
         # Validar cliente y producto
-        if id_cliente and not Cliente.get_by_id(id_cliente):
+        cliente = Cliente.get_by_id(id_cliente) if id_cliente else None
+        if not cliente:
             return jsonify({
                 "success": False,
                 "error": "Cliente no encontrado"
             }), 404
         
-        if id_producto and not Producto.get_by_id(id_producto):
+        producto = Producto.get_by_id(id_producto) if id_producto else None
+        if not producto:
             return jsonify({
                 "success": False,
                 "error": "Producto no encontrado"
             }), 404
         
         # Calcular nuevo total
-        producto = Producto.get_by_id(id_producto)
-        precio_unitario = float(producto['precio'])
-        total = precio_unitario * cantidad
+        total = Decimal(str(producto['precio'])) * cantidad
         
-        # Actualizar venta
-        Venta.update(id_venta, id_cliente, id_producto, cantidad, total)
-        
-        # Obtener venta actualizada
-        venta = Venta.get_by_id(id_venta)
-        if isinstance(venta['fecha'], datetime):
-            venta['fecha'] = venta['fecha'].isoformat()
+        # Actualizar venta y componer la respuesta con los datos ya disponibles
+        if not Venta.update(id_venta, id_cliente, id_producto, cantidad, total):
+            return jsonify({
+                "success": False,
+                "error": "Venta no encontrada"
+            }), 404
+        venta = Venta.fila_detalle(id_venta, venta_existente['fecha'], cantidad, total, cliente, producto)
         
         return jsonify({
             "success": True,
@@ -175,43 +422,42 @@ def update_venta(id_venta):
         }), 200
     
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+        return respuesta_error(e)
 
 @app.route('/api/ventas/<int:id_venta>', methods=['DELETE'])
+@presupuesto_consultas(5)
 def delete_venta(id_venta):
     """Elimina una venta"""
     try:
-        # Verificar que la venta existe
-        venta = Venta.get_by_id(id_venta)
-        if not venta:
+        # Eliminar venta; si no se eliminó ninguna fila, no existía
+        if not Venta.delete(id_venta):
             return jsonify({
                 "success": False,
                 "error": "Venta no encontrada"
             }), 404
         
-        # Eliminar venta
-        Venta.delete(id_venta)
-        
         return jsonify({
             "success": True,
             "message": "Venta eliminada exitosamente"
         }), 200
     
     except Exception as e:
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+        return respuesta_error(e)
 
 # ==================== ENDPOINTS DE CONSULTAS ====================
 
 @app.route('/api/ventas/cliente/<int:id_cliente>', methods=['GET'])
 def get_ventas_by_cliente(id_cliente):
-    """Obtiene todas las ventas de un cliente específico"""
+    """Obtiene una página de ventas de un cliente específico"""
     try:
+        try:
+            limite, cursor = leer_paginacion(request.args)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
         # Verificar que el cliente existe
         cliente = Cliente.get_by_id(id_cliente)
         if not cliente:
@@ -220,23 +466,9 @@ def get_ventas_by_cliente(id_cliente):
                 "error": "Cliente no encontrado"
             }), 404
         
-        ventas = Venta.get_by_cliente(id_cliente)
+        ventas, siguiente = Venta.paginar(limite, cursor, id_cliente=id_cliente)
         
-        # Convertir fechas
-        for venta in ventas:
-            if isinstance(venta['fecha'], datetime):
-                venta['fecha'] = venta['fecha'].isoformat()
-        
-        return jsonify({
-            "success": True,
-            "cliente": {
-                "id": cliente['id_cliente'],
-                "nombre": cliente['nombre'],
-                "correo": cliente['correo']
-            },
-            "data": ventas,
-            "total": len(ventas)
-        }), 200
+        return jsonify(ventas_de_cliente(cliente, ventas, siguiente)), 200
     
     except Exception as e:
         return jsonify({
@@ -250,34 +482,107 @@ def get_ventas_by_cliente(id_cliente):
 def generar_reporte_ventas():
     """Genera un reporte de ventas con filtros opcionales usando el patrón Builder"""
     try:
-        # Obtener parámetros de filtro de la query string
-        id_cliente = request.args.get('id_cliente', type=int)
-        id_producto = request.args.get('id_producto', type=int)
-        fecha_inicio = request.args.get('fecha_inicio')
-        fecha_fin = request.args.get('fecha_fin')
+        # Construir reporte usando Builder, con los filtros y opciones de la query string
+        try:
+            builder, formato = preparar_reporte(request.args)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
-        # Construir reporte usando Builder
-        builder = ReporteVentasBuilder()
-        builder.reset()
-        builder.set_titulo("Reporte de Ventas")
-        builder.set_tipo("reporte_ventas")
+        # Construir y obtener el reporte (desde la caché si los datos no cambiaron)
+        try:
+            reporte = builder.construir()
+        except WatermarkExpirado as e:
+            return respuesta_watermark_expirado(e)
         
-        # Aplicar filtros si están presentes
-        if id_cliente:
-            builder.aplicar_filtro_cliente(id_cliente)
+        return jsonify({
+            "success": True,
+            "reporte": reporte.to_dict(columnar=formato == 'columnar')
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/reportes/ventas/export', methods=['GET'])
+def exportar_reporte_ventas():
+    """Exporta las ventas filtradas en CSV o NDJSON, transmitiendo la respuesta por lotes"""
+    try:
+        formato = request.args.get('format', 'csv').lower()
+        if formato not in FORMATOS:
+            return jsonify({
+                "success": False,
+                "error": f"Formato no soportado: {formato}. Use csv o ndjson"
+            }), 400
         
-        if id_producto:
-            builder.aplicar_filtro_producto(id_producto)
+        builder = aplicar_filtros_reporte(ReporteVentasBuilder(), request.args)
+        lotes = builder.iterar_datos()
         
-        if fecha_inicio and fecha_fin:
-            builder.aplicar_filtro_fecha(fecha_inicio, fecha_fin)
+        if formato == 'csv':
+            contenido = generar_csv(lotes, Venta.CAMPOS)
+        else:
+            contenido = generar_ndjson(lotes)
         
-        # Construir y obtener el reporte
-        reporte = builder.calcular_metricas().construir()
+        return Response(contenido, content_type=FORMATOS[formato], headers={
+            "Content-Disposition": f"attachment; filename=reporte_ventas.{formato}"
+        })
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/reportes/jobs', methods=['POST'])
+def crear_trabajo_reporte():
+    """Encola un reporte de ventas para construirlo en segundo plano
+    
+    Acepta en el cuerpo JSON los mismos filtros y opciones que
+    `GET /api/reportes/ventas`. Si el mismo reporte ya se pidió y las ventas
+    no cambiaron, retorna el trabajo existente en lugar de crear otro.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            trabajo, nuevo = enviar_trabajo(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        return jsonify({
+            "success": True,
+            "message": "Trabajo de reporte iniciado" if nuevo else "Trabajo de reporte existente",
+            "trabajo": trabajo,
+            "estado_url": f"/api/reportes/jobs/{trabajo['id']}",
+            "resultado_url": f"/api/reportes/jobs/{trabajo['id']}/resultado"
+        }), 202 if trabajo['estado'] != COMPLETADO else 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/reportes/jobs/<id_trabajo>', methods=['GET'])
+def estado_trabajo_reporte(id_trabajo):
+    """Consulta el estado y el progreso de un trabajo de reporte"""
+    try:
+        trabajo = consultar_trabajo(id_trabajo)
+        if trabajo is None:
+            return jsonify({
+                "success": False,
+                "error": "Trabajo no encontrado"
+            }), 404
         
         return jsonify({
             "success": True,
-            "reporte": reporte.to_dict()
+            "trabajo": trabajo
         }), 200
     
     except Exception as e:
@@ -286,6 +591,50 @@ def generar_reporte_ventas():
             "error": str(e)
         }), 500
 
+@app.route('/api/reportes/jobs/<id_trabajo>/resultado', methods=['GET'])
+def resultado_trabajo_reporte(id_trabajo):
+    """Descarga el reporte de un trabajo terminado desde su archivo comprimido
+    
+    Se envía tal cual con `Content-Encoding: gzip` a los clientes que lo
+    aceptan y descomprimido a los demás; nunca se vuelve a construir.
+    """
+    try:
+        trabajo = consultar_trabajo(id_trabajo)
+        if trabajo is None:
+            return jsonify({
+                "success": False,
+                "error": "Trabajo no encontrado"
+            }), 404
+        
+        ruta = ruta_resultado(id_trabajo) if trabajo['estado'] == COMPLETADO else None
+        if ruta is None:
+            return jsonify({
+                "success": False,
+                "error": "El trabajo aún no tiene resultado",
+                "trabajo": trabajo
+            }), 409
+        
+        if 'gzip' in request.accept_encodings:
+            respuesta = send_file(ruta, mimetype='application/json', conditional=True, etag=True)
+            respuesta.headers['Content-Encoding'] = 'gzip'
+        else:
+            def descomprimir():
+                with gzip.open(ruta, 'rb') as archivo:
+                    while True:
+                        bloque = archivo.read(64 * 1024)
+                        if not bloque:
+                            break
+                        yield bloque
+            respuesta = Response(descomprimir(), mimetype='application/json')
+        respuesta.headers['Vary'] = 'Accept-Encoding'
+        return respuesta
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @app.route('/api/facturas/<int:id_venta>', methods=['GET'])
 def generar_factura(id_venta):
     """Genera una factura detallada usando el patrón Builder"""
@@ -297,19 +646,56 @@ def generar_factura(id_venta):
                 "error": "Venta no encontrada"
             }), 404
         
-        # Construir factura usando Builder
-        factura_builder = FacturaBuilder()
-        factura_builder.reset()
-        factura_builder.set_numero_factura(id_venta)
-        factura_builder.set_cliente(venta['id_cliente'])
-        factura_builder.agregar_item(id_venta)
+        return jsonify({
+            "success": True,
+            "factura": factura_de_venta(venta)
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/facturas', methods=['POST'])
+def generar_factura_multiple():
+    """Genera una factura que agrupa varias ventas de un mismo cliente
+    
+    Acepta `ids_venta` (lista de IDs) o `id_cliente` con `fecha_inicio` y `fecha_fin`.
+    """
+    try:
+        data = request.get_json()
+        try:
+            solicitud = leer_solicitud_factura(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
-        if isinstance(venta['fecha'], datetime):
-            factura_builder.set_fecha(venta['fecha'].isoformat())
-        else:
-            factura_builder.set_fecha(venta['fecha'])
+        try:
+            if solicitud.ids_venta:
+                ventas = Venta.get_many(solicitud.ids_venta)
+                cliente = revisar_ventas_factura(solicitud.ids_venta, ventas)
+            else:
+                cliente = Cliente.get_by_id(solicitud.id_cliente)
+                if not cliente:
+                    raise ErrorPeticion("Cliente no encontrado", 404)
+                ventas = revisar_rango_factura(Venta.buscar(
+                    id_cliente=solicitud.id_cliente,
+                    fecha_inicio=solicitud.fecha_inicio,
+                    fecha_fin=solicitud.fecha_fin,
+                    detalle=True,
+                    limite=LIMITE_VENTAS_FACTURA + 1
+                ))
+        except ErrorPeticion as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), e.estado
         
-        factura = factura_builder.construir()
+        # Construir factura usando Builder con los datos ya obtenidos
+        factura = factura_de_ventas(data, cliente, ventas)
         
         return jsonify({
             "success": True,
@@ -322,6 +708,70 @@ def generar_factura(id_venta):
             "error": str(e)
         }), 500
 
+@app.route('/api/facturas/lote', methods=['POST'])
+def iniciar_lote_facturas():
+    """Inicia en segundo plano la facturación de todos los clientes de un período"""
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('fecha_inicio') or not data.get('fecha_fin'):
+            return jsonify({
+                "success": False,
+                "error": "fecha_inicio y fecha_fin son requeridos"
+            }), 400
+        
+        try:
+            fecha_inicio, fecha_fin = leer_periodo(data)
+            workers = validar_workers(data.get('workers', 4))
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        periodo = clave_periodo(fecha_inicio, fecha_fin)
+        
+        if not iniciar_lote(fecha_inicio, fecha_fin, workers=workers):
+            return jsonify({
+                "success": False,
+                "error": "Ya hay un lote en curso para este período",
+                "periodo": periodo
+            }), 409
+        
+        return jsonify({
+            "success": True,
+            "message": "Lote de facturas iniciado",
+            "periodo": periodo,
+            "estado_url": f"/api/facturas/lote/{periodo}"
+        }), 202
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/facturas/lote/<periodo>', methods=['GET'])
+def estado_lote_facturas(periodo):
+    """Consulta el progreso de un lote de facturas"""
+    try:
+        estado = consultar_lote(periodo)
+        if estado is None:
+            return jsonify({
+                "success": False,
+                "error": "Lote no encontrado"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "lote": estado
+        }), 200
+    
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 # ==================== ENDPOINTS AUXILIARES ====================
 
 @app.route('/api/clientes', methods=['GET'])
@@ -356,6 +806,82 @@ def get_productos():
             "error": str(e)
         }), 500
 
+LIMITE_BUSQUEDA_DEFECTO = 10
+LIMITE_BUSQUEDA_MAXIMO = 50
+
+def obtener_busqueda():
+    """Lee `q` y `limit` de la query string; lanza ValueError si `limit` no es válido"""
+    limite = request.args.get('limit', LIMITE_BUSQUEDA_DEFECTO, type=int)
+    if limite is None or not 1 <= limite <= LIMITE_BUSQUEDA_MAXIMO:
+        raise ValueError(f"limit debe estar entre 1 y {LIMITE_BUSQUEDA_MAXIMO}")
+    return request.args.get('q', ''), limite
+
+@app.route('/api/clientes/buscar', methods=['GET'])
+def buscar_clientes():
+    """Busca clientes por nombre o correo (typeahead), ordenados por relevancia"""
+    try:
+        try:
+            texto, limite = obtener_busqueda()
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        clientes = Cliente.buscar(texto, limite)
+        return jsonify({
+            "success": True,
+            "data": clientes,
+            "total": len(clientes)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+@app.route('/api/productos/buscar', methods=['GET'])
+def buscar_productos():
+    """Busca productos por nombre o descripción (typeahead), ordenados por relevancia"""
+    try:
+        try:
+            texto, limite = obtener_busqueda()
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        productos = Producto.buscar(texto, limite)
+        return jsonify({
+            "success": True,
+            "data": productos,
+            "total": len(productos)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+# ==================== MÉTRICAS ====================
+
+@app.route('/metrics', methods=['GET'])
+def metricas():
+    """Métricas por endpoint, del pool de conexiones y de las cachés en formato Prometheus"""
+    indicadores = indicadores_de("salesflow_db_pool", "Estado del pool de conexiones",
+                                 Database().pool_stats(), ConnectionPool.CONTADORES)
+    indicadores.extend(indicadores_de("salesflow_db_sentencias", "Sentencias preparadas de las conexiones del pool",
+                                      Database().sentencias_stats(), RegistroSentencias.CONTADORES))
+    caches = (("clientes", Cliente.cache_stats()), ("productos", Producto.cache_stats()),
+              ("clientes_listado", Cliente.cache_stats(listado=True)),
+              ("productos_listado", Producto.cache_stats(listado=True)),
+              ("reportes", ReporteVentasBuilder.cache_stats()))
+    for nombre, stats in caches:
+        indicadores.extend(indicadores_de("salesflow_cache", "Estado de las cachés en memoria",
+                                          stats, TTLCache.CONTADORES, {"cache": nombre}))
+    return Response(formato_prometheus(indicadores), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # ==================== INTERFAZ WEB ====================
 
 @app.route('/')
@@ -0,0 +1,405 @@
+"""
+Modo de servicio asíncrono (ASGI) de la API
+
+Las lecturas más frecuentes (`GET /api/ventas`, `GET /api/ventas/cliente/<id>`,
+`GET /api/reportes/ventas`, `GET /api/facturas/<id>` y `POST /api/facturas`)
+se atienden con manejadores asíncronos sobre un pool de conexiones aiomysql,
+de modo que un solo proceso sostiene muchas peticiones concurrentes sin un
+hilo por conexión. La validación, la composición de las respuestas y la
+caché de reportes son las de `peticiones` y `builder`, las mismas que usa
+`app.py`, y las consultas SQL salen de los métodos `sql_*` de `models`.
+
+Las demás rutas (escrituras, exportaciones, eventos, páginas) se delegan a
+la aplicación Flask a través del adaptador WSGI→ASGI de `a2wsgi`, que las
+atiende en un pool de `ASGI_HILOS` hilos con las conexiones de `database`.
+Ambas partes corren en el mismo proceso, así que las escrituras de Flask
+invalidan las cachés que leen los manejadores asíncronos.
+
+Uso:
+    uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+import logging
+import os
+import re
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import aiomysql
+from a2wsgi import WSGIMiddleware
+
+from app import app as aplicacion_flask
+from builder import ReporteVentasBuilder
+from instrumentacion import registrar_request, server_timing
+from models import Cliente, Venta, ResumenDiario, CambiosVenta, WatermarkExpirado, valores_por_columna
+from peticiones import (
+    ErrorPeticion, cambios_ventas, factura_de_venta, factura_de_ventas, leer_paginacion, leer_since,
+    leer_solicitud_factura, pagina_ventas, preparar_reporte, revisar_rango_factura, revisar_ventas_factura,
+    ventas_de_cliente, LIMITE_VENTAS_FACTURA
+)
+from serializacion import dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+# Por defecto, tantos hilos como conexiones admite el pool de la base de datos
+ASGI_HILOS = int(os.getenv(
+    'ASGI_HILOS',
+    str(int(os.getenv('DB_POOL_SIZE', '5')) + int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')))
+))
+ASGI_POOL_MIN = int(os.getenv('ASGI_POOL_MIN', '1'))
+ASGI_POOL_MAX = int(os.getenv('ASGI_POOL_MAX', '20'))
+
+_pool: Optional[aiomysql.Pool] = None
+_medicion: ContextVar[Dict] = ContextVar('medicion')
+
+aplicacion_wsgi = WSGIMiddleware(aplicacion_flask, workers=ASGI_HILOS)
+
+
+# ==================== BASE DE DATOS ====================
+
+async def crear_pool() -> aiomysql.Pool:
+    """Crea el pool aiomysql con la misma base de datos que `Database.get_pool()`"""
+    return await aiomysql.create_pool(
+        minsize=ASGI_POOL_MIN,
+        maxsize=ASGI_POOL_MAX,
+        host=os.getenv('DB_HOST', '127.0.0.1'),
+        port=int(os.getenv('DB_PORT', '3306')),
+        db=os.getenv('DB_NAME', 'salesflow'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        autocommit=True,
+        pool_recycle=3600
+    )
+
+
+async def consultar(sql: str, params: tuple = (), dictionary: bool = True) -> Tuple[List, List[str]]:
+    """Ejecuta una consulta de lectura; retorna las filas y los nombres de columna
+
+    Cuenta la consulta, sus filas y su duración en la medición de la petición.
+    """
+    inicio = time.perf_counter()
+    async with _pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor if dictionary else aiomysql.Cursor) as cursor:
+            await cursor.execute(sql, params)
+            filas = list(await cursor.fetchall())
+            columnas = [columna[0] for columna in cursor.description or ()]
+    medicion = _medicion.get(None)
+    if medicion is not None:
+        medicion["consultas"] += 1
+        medicion["filas"] += len(filas)
+        medicion["bd"] += time.perf_counter() - inicio
+    return filas, columnas
+
+
+async def filas_de(sql: str, params: tuple = (), dictionary: bool = True) -> List:
+    """Filas de una consulta de lectura"""
+    filas, _ = await consultar(sql, params, dictionary)
+    return filas
+
+
+async def watermark() -> int:
+    """Equivalente asíncrono de `CambiosVenta.watermark`"""
+    filas = await filas_de(CambiosVenta.SQL_ESTADO, (CambiosVenta.MARGEN,), dictionary=False)
+    return CambiosVenta.watermark_seguro(filas[0])
+
+
+async def version_datos() -> Tuple[int, int]:
+    """Equivalente asíncrono de `ReporteVentasBuilder.version_datos`; comparte la versión recordada"""
+    version = ReporteVentasBuilder.version_reciente()
+    if version is None:
+        local = Venta.version_datos()
+        filas = await filas_de(CambiosVenta.SQL_VERSION, dictionary=False)
+        version = ReporteVentasBuilder.recordar_version(local, int(filas[0][0]) if filas else 0)
+    return version
+
+
+async def cambios_desde(since: int) -> Tuple[List[int], int, bool]:
+    """Equivalente asíncrono de `CambiosVenta.desde`; lanza WatermarkExpirado igual que este"""
+    estado = (await filas_de(CambiosVenta.SQL_ESTADO, (CambiosVenta.MARGEN,), dictionary=False))[0]
+    cambios = await filas_de(*CambiosVenta.sql_desde(since, CambiosVenta.LIMITE), dictionary=False)
+    cambios, nuevo, hay_mas = CambiosVenta.recortar(since, estado, cambios, CambiosVenta.LIMITE)
+    return CambiosVenta.ids_venta(cambios), nuevo, hay_mas
+
+
+async def ventas_columnar(**filtros) -> List[list]:
+    """Equivalente asíncrono de `Venta.buscar_columnar`"""
+    filas = await filas_de(*Venta.sql_buscar(**filtros), dictionary=False)
+    return valores_por_columna(filas, len(Venta.CAMPOS))
+
+
+async def metricas(**filtros) -> Dict:
+    """Equivalente asíncrono de `ResumenDiario.metricas`"""
+    filas = []
+    for sql, params in ResumenDiario.plan_metricas(**filtros):
+        filas.extend(await filas_de(sql, params, dictionary=False))
+    return ResumenDiario.combinar_metricas(filas)
+
+
+async def cliente_por_id(id_cliente: int) -> Optional[Dict]:
+    """Equivalente asíncrono de `Cliente.get_by_id`, con la misma caché"""
+    encontrado, cliente = Cliente._cache.get(id_cliente)
+    if not encontrado:
+        filas = await filas_de(Cliente.SQL_POR_ID, (id_cliente,))
+        if not filas:
+            return None
+        cliente = filas[0]
+        Cliente._cache.set(id_cliente, cliente)
+    return dict(cliente)
+
+
+# ==================== PETICIÓN Y RESPUESTA ====================
+
+class Peticion:
+    """Datos de una petición HTTP ASGI"""
+
+    def __init__(self, scope: Dict, cuerpo: bytes):
+        self.metodo = scope['method']
+        self.ruta = scope['path']
+        # Como `request.args.get`: el primer valor de cada parámetro, incluidos los vacíos
+        self.args = {
+            clave: valores[0]
+            for clave, valores in parse_qs(scope.get('query_string', b'').decode('latin-1'),
+                                           keep_blank_values=True).items()
+        }
+        self.cuerpo = cuerpo
+
+    def json(self):
+        """Cuerpo de la petición decodificado como JSON; None si está vacío"""
+        if not self.cuerpo:
+            return None
+        try:
+            return loads(self.cuerpo)
+        except ValueError:
+            raise ErrorPeticion("El cuerpo de la petición no es JSON válido")
+
+
+def respuesta(datos: Dict, estado: int = 200) -> Tuple[int, Dict]:
+    """Respuesta JSON con el formato de la API"""
+    return estado, datos
+
+
+def error(mensaje: str, estado: int) -> Tuple[int, Dict]:
+    """Respuesta de error con el formato de la API"""
+    return respuesta({"success": False, "error": mensaje}, estado)
+
+
+# ==================== ENDPOINTS ====================
+
+async def get_ventas(peticion: Peticion):
+    """Obtiene una página de ventas, o con `since` solo las ventas cambiadas desde ese watermark"""
+    limite, cursor = leer_paginacion(peticion.args)
+    since = leer_since(peticion.args)
+    if since is not None:
+        ids, nuevo, hay_mas = await cambios_desde(since)
+        ventas = await filas_de(*Venta.sql_buscar(ids=ids)) if ids else []
+        return respuesta(cambios_ventas(ids, ventas, nuevo, hay_mas))
+
+    # La primera página trae el watermark desde el que pedir cambios
+    actual = await watermark() if cursor is None else None
+    ventas, siguiente = Venta.cortar_pagina(await filas_de(*Venta.sql_pagina(limite, cursor)), limite)
+    return respuesta(pagina_ventas(ventas, siguiente, actual))
+
+
+async def get_ventas_by_cliente(peticion: Peticion, id_cliente: int):
+    """Obtiene una página de ventas de un cliente específico"""
+    limite, cursor = leer_paginacion(peticion.args)
+    cliente = await cliente_por_id(id_cliente)
+    if not cliente:
+        return error("Cliente no encontrado", 404)
+    filas = await filas_de(*Venta.sql_pagina(limite, cursor, id_cliente=id_cliente))
+    ventas, siguiente = Venta.cortar_pagina(filas, limite)
+    return respuesta(ventas_de_cliente(cliente, ventas, siguiente))
+
+
+async def generar_reporte_ventas(peticion: Peticion):
+    """Genera un reporte de ventas como `ReporteVentasBuilder.construir`, sin bloquear el bucle
+
+    Usa la misma caché de reportes que la aplicación Flask: un reporte
+    construido por cualquiera de las dos se sirve desde la caché a la otra.
+    """
+    builder, formato = preparar_reporte(peticion.args)
+    clave = builder.clave_cache()
+    if clave is not None:
+        # La versión se lee antes que los datos, como en `construir`
+        version = await version_datos()
+        if builder.desde_cache(clave, version):
+            return respuesta({
+                "success": True,
+                "reporte": builder.reporte.to_dict(columnar=formato == 'columnar')
+            })
+
+    filtros = builder.filtros_consulta()
+    reporte = builder.reporte
+    if builder.solo_metricas:
+        reporte.set_columnas(Venta.CAMPOS, [[] for _ in Venta.CAMPOS])
+    elif reporte.agrupacion:
+        filas, columnas = await consultar(*ResumenDiario.sql_agrupado(**builder.argumentos_agrupacion()),
+                                          dictionary=False)
+        reporte.set_columnas(columnas, valores_por_columna(filas, len(columnas)))
+    elif builder.desde is not None:
+        ids, nuevo, hay_mas = await cambios_desde(builder.desde)
+        if ids:
+            valores = await ventas_columnar(**filtros, ids=ids)
+        else:
+            valores = [[] for _ in Venta.CAMPOS]
+        reporte.set_columnas(Venta.CAMPOS, valores)
+        reporte.marcar_incremental(builder.desde, ids, nuevo, hay_mas)
+    else:
+        # El watermark se lee antes que las ventas para no perder cambios intermedios
+        reporte.watermark = await watermark()
+        reporte.set_columnas(Venta.CAMPOS, await ventas_columnar(**filtros))
+    reporte.fecha_generacion = datetime.now()
+    reporte.metricas = await metricas(**filtros)
+    if clave is not None:
+        builder.guardar_en_cache(clave, version)
+
+    return respuesta({
+        "success": True,
+        "reporte": reporte.to_dict(columnar=formato == 'columnar')
+    })
+
+
+async def generar_factura(peticion: Peticion, id_venta: int):
+    """Genera la factura de una venta"""
+    filas = await filas_de(Venta.SQL_POR_ID, (id_venta,))
+    if not filas:
+        return error("Venta no encontrada", 404)
+    return respuesta({
+        "success": True,
+        "factura": factura_de_venta(filas[0])
+    })
+
+
+async def generar_factura_multiple(peticion: Peticion):
+    """Genera una factura que agrupa varias ventas de un mismo cliente
+
+    Acepta `ids_venta` (lista de IDs) o `id_cliente` con `fecha_inicio` y `fecha_fin`.
+    """
+    data = peticion.json()
+    solicitud = leer_solicitud_factura(data)
+    if solicitud.ids_venta:
+        ventas = await filas_de(*Venta.sql_get_many(solicitud.ids_venta))
+        cliente = revisar_ventas_factura(solicitud.ids_venta, ventas)
+    else:
+        cliente = await cliente_por_id(solicitud.id_cliente)
+        if not cliente:
+            raise ErrorPeticion("Cliente no encontrado", 404)
+        ventas = revisar_rango_factura(await filas_de(*Venta.sql_buscar(
+            id_cliente=solicitud.id_cliente,
+            fecha_inicio=solicitud.fecha_inicio,
+            fecha_fin=solicitud.fecha_fin,
+            detalle=True,
+            limite=LIMITE_VENTAS_FACTURA + 1
+        )))
+    return respuesta({
+        "success": True,
+        "factura": factura_de_ventas(data, cliente, ventas)
+    })
+
+
+# (método, patrón, regla de la ruta Flask equivalente para las métricas, manejador)
+RUTAS = [
+    ('GET', re.compile(r'^/api/ventas$'), '/api/ventas', get_ventas),
+    ('GET', re.compile(r'^/api/ventas/cliente/(\d+)$'), '/api/ventas/cliente/<int:id_cliente>',
+     get_ventas_by_cliente),
+    ('GET', re.compile(r'^/api/reportes/ventas$'), '/api/reportes/ventas', generar_reporte_ventas),
+    ('GET', re.compile(r'^/api/facturas/(\d+)$'), '/api/facturas/<int:id_venta>', generar_factura),
+    ('POST', re.compile(r'^/api/facturas$'), '/api/facturas', generar_factura_multiple),
+]
+
+
+def buscar_ruta(metodo: str, ruta: str):
+    """Manejador asíncrono, regla y argumentos de la ruta; None si la atiende Flask"""
+    for metodo_ruta, patron, regla, manejador in RUTAS:
+        coincidencia = patron.match(ruta)
+        if coincidencia and metodo_ruta == metodo:
+            return manejador, regla, [int(grupo) for grupo in coincidencia.groups()]
+    return None
+
+
+async def despachar(peticion: Peticion, manejador, argumentos: List[int]) -> Tuple[int, Dict]:
+    """Ejecuta el manejador y traduce sus errores a respuestas, como los endpoints Flask"""
+    try:
+        return await manejador(peticion, *argumentos)
+    except ValueError as e:
+        return error(str(e), 400)
+    except ErrorPeticion as e:
+        return error(str(e), e.estado)
+    except WatermarkExpirado as e:
+        # El cliente debe descartar sus datos y volver a cargarlos completos
+        return respuesta({"success": False, "error": str(e), "recargar": True}, 410)
+    except Exception as e:
+        logger.exception("Error en %s %s", peticion.metodo, peticion.ruta)
+        return error(str(e), 500)
+
+
+# ==================== APLICACIÓN ASGI ====================
+
+async def _leer_cuerpo(receive) -> bytes:
+    """Lee el cuerpo completo de la petición"""
+    partes = []
+    while True:
+        mensaje = await receive()
+        partes.append(mensaje.get('body', b''))
+        if not mensaje.get('more_body'):
+            return b''.join(partes)
+
+
+async def _lifespan(receive, send):
+    """Abre el pool al arrancar el servidor y lo cierra al detenerlo"""
+    global _pool
+    while True:
+        mensaje = await receive()
+        if mensaje['type'] == 'lifespan.startup':
+            try:
+                _pool = await crear_pool()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            logger.info("Pool de conexiones asíncrono creado")
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensaje['type'] == 'lifespan.shutdown':
+            if _pool is not None:
+                _pool.close()
+                await _pool.wait_closed()
+                _pool = None
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """Punto de entrada ASGI"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    ruta = buscar_ruta(scope['method'], scope['path']) if scope['type'] == 'http' else None
+    if ruta is None:
+        await aplicacion_wsgi(scope, receive, send)
+        return
+
+    manejador, regla, argumentos = ruta
+    medicion = {"total": 0.0, "bd": 0.0, "consultas": 0, "filas": 0, "tiempos": {}}
+    _medicion.set(medicion)
+    inicio = time.perf_counter()
+    peticion = Peticion(scope, await _leer_cuerpo(receive))
+    estado, datos = await despachar(peticion, manejador, argumentos)
+    inicio_serializacion = time.perf_counter()
+    cuerpo = dumps_bytes(datos)
+    medicion["tiempos"]["serializacion"] = time.perf_counter() - inicio_serializacion
+    medicion["total"] = time.perf_counter() - inicio
+    registrar_request(regla, peticion.metodo, estado, medicion)
+
+    await send({
+        'type': 'http.response.start',
+        'status': estado,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(cuerpo)).encode()),
+            (b'server-timing', server_timing(medicion).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': cuerpo})
@@ -0,0 +1,6 @@
+"""
+Herramientas de medición de rendimiento de SalesFlow
+
+- `benchmarks.seeder`: llena la base de datos con datos sintéticos.
+- `benchmarks.escenarios`: mide throughput y latencia de los endpoints más usados.
+"""
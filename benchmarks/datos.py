@@ -0,0 +1,76 @@
+"""
+Generación de filas sintéticas realistas para clientes, productos y ventas
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Iterator, List, Sequence, Tuple
+
+NOMBRES = [
+    "Ana", "Luis", "María", "Carlos", "Lucía", "Jorge", "Sofía", "Miguel", "Valeria", "Diego",
+    "Camila", "Andrés", "Paula", "Fernando", "Daniela", "Ricardo", "Elena", "Javier", "Laura", "Pablo"
+]
+APELLIDOS = [
+    "García", "Martínez", "López", "Hernández", "González", "Pérez", "Rodríguez", "Sánchez",
+    "Ramírez", "Torres", "Flores", "Rivera", "Gómez", "Díaz", "Cruz", "Morales", "Reyes", "Ortiz"
+]
+CALLES = ["Av. Reforma", "Calle Juárez", "Av. Insurgentes", "Calle Hidalgo", "Av. Universidad", "Calle Morelos"]
+CATEGORIAS = [
+    ("Laptop", 8000, 30000), ("Monitor", 2000, 9000), ("Teclado", 200, 2500), ("Mouse", 100, 1500),
+    ("Audífonos", 300, 6000), ("Impresora", 1500, 8000), ("Tablet", 3000, 15000), ("Cable", 50, 400)
+]
+MARCAS = ["Acme", "Nova", "Orion", "Vertex", "Zenit", "Atlas"]
+
+def generar_clientes(cantidad: int, rng: random.Random) -> Iterator[Tuple[str, str, str, str]]:
+    """Genera filas (nombre, correo, telefono, direccion)"""
+    for i in range(1, cantidad + 1):
+        nombre = f"{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}"
+        correo = f"cliente{i}@ejemplo.com"
+        telefono = f"55{rng.randrange(10**7, 10**8)}"
+        direccion = f"{rng.choice(CALLES)} {rng.randrange(1, 2000)}"
+        yield nombre, correo, telefono, direccion
+
+def generar_productos(cantidad: int, rng: random.Random) -> List[Tuple[str, str, Decimal]]:
+    """Genera filas (nombre, descripcion, precio)"""
+    productos = []
+    for i in range(1, cantidad + 1):
+        categoria, minimo, maximo = rng.choice(CATEGORIAS)
+        marca = rng.choice(MARCAS)
+        precio = Decimal(rng.randrange(minimo * 100, maximo * 100)) / 100
+        productos.append((f"{categoria} {marca} {i}", f"{categoria} marca {marca}, modelo {i}", precio))
+    return productos
+
+def _pesos_zipf(cantidad: int, exponente: float = 0.9) -> List[float]:
+    """Pesos acumulados de una distribución tipo Zipf: pocos elementos concentran la mayoría"""
+    acumulado = 0.0
+    pesos = []
+    for rango in range(1, cantidad + 1):
+        acumulado += 1 / rango ** exponente
+        pesos.append(acumulado)
+    return pesos
+
+def generar_ventas(cantidad: int, ids_clientes: Sequence[int], precios: Sequence[Tuple[int, Decimal]],
+                   desde: datetime, hasta: datetime,
+                   rng: random.Random) -> Iterator[Tuple[int, int, int, Decimal, datetime]]:
+    """Genera filas (id_cliente, id_producto, cantidad, total, fecha) en orden cronológico
+
+    Los clientes y productos siguen una distribución sesgada (unos pocos
+    concentran la mayoría de las ventas) y las horas se concentran en horario
+    comercial, para que índices y planes de consulta se comporten como en producción.
+    """
+    clientes = list(ids_clientes)
+    productos = list(precios)
+    rng.shuffle(clientes)
+    rng.shuffle(productos)
+    pesos_clientes = _pesos_zipf(len(clientes))
+    pesos_productos = _pesos_zipf(len(productos))
+    paso = (hasta - desde) / max(cantidad, 1)
+
+    for i in range(cantidad):
+        id_cliente = rng.choices(clientes, cum_weights=pesos_clientes)[0]
+        id_producto, precio = rng.choices(productos, cum_weights=pesos_productos)[0]
+        unidades = min(int(rng.expovariate(0.6)) + 1, 20)
+        dia = (desde + paso * i).replace(hour=0, minute=0, second=0, microsecond=0)
+        hora = min(max(rng.gauss(14, 3), 0), 23.99)
+        fecha = dia + timedelta(hours=hora)
+        yield id_cliente, id_producto, unidades, precio * unidades, fecha.replace(microsecond=0)
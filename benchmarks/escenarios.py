@@ -0,0 +1,236 @@
+"""
+Escenarios de carga sobre los endpoints más usados de la API
+
+Cada escenario envía peticiones desde varios hilos durante un tiempo fijo y
+reporta throughput y latencias p50/p95/p99. Los resultados pueden guardarse
+como línea base en JSON y compararse con ejecuciones posteriores.
+
+Uso:
+    python -m benchmarks.escenarios --url http://localhost:5000 --guardar base.json
+    python -m benchmarks.escenarios --url http://localhost:5000 --comparar base.json
+    python -m benchmarks.escenarios --escenario listar_ventas --escenario factura
+
+Los escenarios de escritura (`crear_venta`, `crear_lote`) insertan ventas
+reales; ejecútelos contra una base de datos de pruebas.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from itertools import combinations
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+Peticion = Tuple[str, str, Optional[object]]
+
+class Contexto:
+    """IDs reales de la base de datos con los que se arman las peticiones"""
+
+    def __init__(self, url: str, tamano_lote: int):
+        self.url = url.rstrip('/')
+        self.tamano_lote = tamano_lote
+        self.clientes = [c['id_cliente'] for c in self._obtener('/api/clientes')['data']]
+        self.productos = [p['id_producto'] for p in self._obtener('/api/productos')['data']]
+        self.ventas = [v['id_venta'] for v in self._obtener('/api/ventas?limit=500')['data']]
+        if not self.clientes or not self.productos or not self.ventas:
+            raise RuntimeError("La base de datos no tiene datos; ejecute primero benchmarks.seeder")
+        self.fecha_fin = datetime.now().replace(microsecond=0)
+        self.fecha_inicio = self.fecha_fin - timedelta(days=30)
+
+    def _obtener(self, ruta: str) -> Dict:
+        with urlopen(self.url + ruta, timeout=60) as respuesta:
+            return json.loads(respuesta.read())
+
+def _reporte(filtros: Tuple[str, ...]) -> Callable[[Contexto, random.Random], Peticion]:
+    """Escenario de reporte con una combinación de filtros"""
+    def peticion(ctx: Contexto, rng: random.Random) -> Peticion:
+        params = {}
+        if 'cliente' in filtros:
+            params['id_cliente'] = rng.choice(ctx.clientes)
+        if 'producto' in filtros:
+            params['id_producto'] = rng.choice(ctx.productos)
+        if 'fecha' in filtros:
+            params['fecha_inicio'] = ctx.fecha_inicio.isoformat()
+            params['fecha_fin'] = ctx.fecha_fin.isoformat()
+        return 'GET', f"/api/reportes/ventas?{urlencode(params)}", None
+    return peticion
+
+def _listar_ventas(ctx: Contexto, rng: random.Random) -> Peticion:
+    return 'GET', '/api/ventas?limit=50', None
+
+def _factura(ctx: Contexto, rng: random.Random) -> Peticion:
+    return 'GET', f"/api/facturas/{rng.choice(ctx.ventas)}", None
+
+def _venta_aleatoria(ctx: Contexto, rng: random.Random) -> Dict:
+    return {
+        "id_cliente": rng.choice(ctx.clientes),
+        "id_producto": rng.choice(ctx.productos),
+        "cantidad": rng.randint(1, 5)
+    }
+
+def _crear_venta(ctx: Contexto, rng: random.Random) -> Peticion:
+    return 'POST', '/api/ventas', _venta_aleatoria(ctx, rng)
+
+def _crear_lote(ctx: Contexto, rng: random.Random) -> Peticion:
+    return 'POST', '/api/ventas/batch', [_venta_aleatoria(ctx, rng) for _ in range(ctx.tamano_lote)]
+
+FILTROS_REPORTE = ('cliente', 'producto', 'fecha')
+
+ESCENARIOS: Dict[str, Callable[[Contexto, random.Random], Peticion]] = {
+    'listar_ventas': _listar_ventas,
+    **{
+        f"reporte[{'+'.join(combinacion) or 'sin_filtros'}]": _reporte(combinacion)
+        for n in range(len(FILTROS_REPORTE) + 1)
+        for combinacion in combinations(FILTROS_REPORTE, n)
+    },
+    'factura': _factura,
+    'crear_venta': _crear_venta,
+    'crear_lote': _crear_lote,
+}
+
+def percentil(valores_ordenados: List[float], p: float) -> float:
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(int(round(p / 100 * len(valores_ordenados) + 0.5)) - 1, 0)
+    return valores_ordenados[min(indice, len(valores_ordenados) - 1)]
+
+def _enviar(url: str, peticion: Peticion) -> int:
+    """Envía una petición y retorna el código de estado"""
+    metodo, ruta, cuerpo = peticion
+    datos = json.dumps(cuerpo).encode('utf-8') if cuerpo is not None else None
+    solicitud = Request(url + ruta, data=datos, method=metodo, headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(solicitud, timeout=60) as respuesta:
+            respuesta.read()
+            return respuesta.status
+    except HTTPError as e:
+        e.read()
+        return e.code
+
+def ejecutar_escenario(ctx: Contexto, nombre: str, duracion: float, concurrencia: int,
+                       calentamiento: float = 1.0, semilla: int = 42) -> Dict:
+    """Ejecuta un escenario durante `duracion` segundos con `concurrencia` hilos
+
+    Las peticiones del período de calentamiento no se cuentan.
+    """
+    generar = ESCENARIOS[nombre]
+    latencias: List[float] = []
+    errores = [0]
+    lock = threading.Lock()
+    inicio_medicion = time.perf_counter() + calentamiento
+    fin = inicio_medicion + duracion
+
+    def trabajador(numero: int):
+        rng = random.Random(semilla + numero)
+        propias = []
+        fallidas = 0
+        while True:
+            antes = time.perf_counter()
+            if antes >= fin:
+                break
+            try:
+                estado = _enviar(ctx.url, generar(ctx, rng))
+            except (URLError, OSError):
+                estado = 0
+            despues = time.perf_counter()
+            if antes >= inicio_medicion:
+                propias.append(despues - antes)
+                if not 200 <= estado < 300:
+                    fallidas += 1
+        with lock:
+            latencias.extend(propias)
+            errores[0] += fallidas
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as executor:
+        list(executor.map(trabajador, range(concurrencia)))
+
+    latencias.sort()
+    ms = [valor * 1000 for valor in latencias]
+    return {
+        "peticiones": len(ms),
+        "errores": errores[0],
+        "throughput_rps": round(len(ms) / duracion, 2),
+        "p50_ms": round(percentil(ms, 50), 2),
+        "p95_ms": round(percentil(ms, 95), 2),
+        "p99_ms": round(percentil(ms, 99), 2),
+        "max_ms": round(ms[-1], 2) if ms else 0.0
+    }
+
+def comparar(base: Dict, actual: Dict, umbral: float) -> List[str]:
+    """Imprime la diferencia con una línea base; retorna los escenarios que empeoraron más de `umbral` %"""
+    regresiones = []
+    print(f"\n{'escenario':32} {'rps':>10} {'Δ':>8} {'p95 ms':>10} {'Δ':>8} {'p99 ms':>10} {'Δ':>8}")
+    for nombre, resultado in actual.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            continue
+        deltas = {}
+        for metrica in ("throughput_rps", "p95_ms", "p99_ms"):
+            deltas[metrica] = ((resultado[metrica] - anterior[metrica]) / anterior[metrica] * 100
+                               if anterior[metrica] else 0.0)
+        print(f"{nombre:32} {resultado['throughput_rps']:>10.1f} {deltas['throughput_rps']:>+7.1f}% "
+              f"{resultado['p95_ms']:>10.1f} {deltas['p95_ms']:>+7.1f}% "
+              f"{resultado['p99_ms']:>10.1f} {deltas['p99_ms']:>+7.1f}%")
+        if deltas['throughput_rps'] < -umbral or deltas['p95_ms'] > umbral:
+            regresiones.append(nombre)
+    return regresiones
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Pruebas de carga de la API de SalesFlow")
+    parser.add_argument("--url", default="http://localhost:5000", help="URL base de la API")
+    parser.add_argument("--escenario", action="append", choices=list(ESCENARIOS),
+                        help="Escenario a ejecutar (repetible; por defecto todos)")
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos de medición por escenario")
+    parser.add_argument("--calentamiento", type=float, default=1.0, help="Segundos descartados al inicio")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Hilos cliente simultáneos")
+    parser.add_argument("--tamano-lote", type=int, default=100, help="Ventas por petición en crear_lote")
+    parser.add_argument("--solo-lectura", action="store_true", help="Omitir los escenarios que insertan ventas")
+    parser.add_argument("--guardar", metavar="RUTA", help="Guardar los resultados como línea base JSON")
+    parser.add_argument("--comparar", metavar="RUTA", help="Comparar con una línea base JSON")
+    parser.add_argument("--umbral", type=float, default=10.0,
+                        help="Empeoramiento en %% a partir del cual --comparar falla")
+    args = parser.parse_args(argv)
+
+    nombres = args.escenario or list(ESCENARIOS)
+    if args.solo_lectura:
+        nombres = [nombre for nombre in nombres if not nombre.startswith('crear_')]
+
+    ctx = Contexto(args.url, args.tamano_lote)
+    resultados = {}
+    for nombre in nombres:
+        resultado = ejecutar_escenario(ctx, nombre, args.duracion, args.concurrencia, args.calentamiento)
+        resultados[nombre] = resultado
+        print(f"{nombre:32} {resultado['throughput_rps']:>9.1f} rps  p50 {resultado['p50_ms']:>8.1f} ms  "
+              f"p95 {resultado['p95_ms']:>8.1f} ms  p99 {resultado['p99_ms']:>8.1f} ms  "
+              f"errores {resultado['errores']}")
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                "fecha": datetime.now().isoformat(),
+                "url": ctx.url,
+                "concurrencia": args.concurrencia,
+                "duracion": args.duracion,
+                "python": platform.python_version(),
+                "resultados": resultados
+            }, archivo, indent=2)
+        print(f"\nLínea base guardada en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)["resultados"]
+        regresiones = comparar(base, resultados, args.umbral)
+        if regresiones:
+            print(f"\nRegresiones de más de {args.umbral}%: {', '.join(regresiones)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Llena `clientes`, `productos` y `ventas` con datos sintéticos para pruebas de rendimiento
+
+Uso:
+    python -m benchmarks.seeder --ventas 1000000
+    python -m benchmarks.seeder --ventas 100000 --sqlite bench.db
+
+Contra MySQL usa la configuración `DB_*` de la aplicación, aplica antes las
+migraciones pendientes y, al terminar, reconstruye el resumen diario. La opción `--sqlite` genera el mismo conjunto
+de datos en un archivo SQLite, útil para inspeccionarlo o medir la
+generación sin un servidor; la API solo funciona sobre MySQL.
+"""
+import argparse
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, List, Optional
+
+from benchmarks.datos import generar_clientes, generar_productos, generar_ventas
+
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    correo TEXT NOT NULL,
+    telefono TEXT,
+    direccion TEXT
+);
+CREATE TABLE IF NOT EXISTS productos (
+    id_producto INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre TEXT NOT NULL,
+    descripcion TEXT,
+    precio NUMERIC NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ventas (
+    id_venta INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_cliente INTEGER NOT NULL REFERENCES clientes(id_cliente),
+    id_producto INTEGER NOT NULL REFERENCES productos(id_producto),
+    cantidad INTEGER NOT NULL,
+    total NUMERIC NOT NULL,
+    fecha TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_cliente ON ventas (id_cliente, fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_producto ON ventas (id_producto, fecha);
+"""
+
+class Destino:
+    """Base de datos donde se insertan los datos sintéticos"""
+
+    marcador = "%s"
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def insertar(self, tabla: str, columnas: List[str], filas: Iterable[tuple]):
+        """Inserta filas con una sola sentencia de varias filas"""
+        marcadores = ", ".join([self.marcador] * len(columnas))
+        cursor = self.conn.cursor()
+        cursor.executemany(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({marcadores})", list(filas))
+        cursor.close()
+
+    def consultar(self, sql: str) -> List[tuple]:
+        """Ejecuta una consulta de lectura"""
+        cursor = self.conn.cursor()
+        cursor.execute(sql)
+        filas = cursor.fetchall()
+        cursor.close()
+        return filas
+
+    def ejecutar(self, sql: str):
+        """Ejecuta una sentencia sin resultado"""
+        cursor = self.conn.cursor()
+        cursor.execute(sql)
+        cursor.close()
+
+    def commit(self):
+        self.conn.commit()
+
+    def limpiar(self):
+        """Elimina los datos existentes de las tablas de ventas y catálogos"""
+        for tabla in ("ventas", "productos", "clientes"):
+            self.ejecutar(f"DELETE FROM {tabla}")
+        self.commit()
+
+    def finalizar(self):
+        """Tareas posteriores a la carga"""
+
+class DestinoMySQL(Destino):
+    """Base de datos MySQL configurada para la aplicación
+
+    Aplica las migraciones pendientes al conectarse, de modo que existen las
+    tablas derivadas de `ventas` (resumen diario y registro de cambios).
+    """
+
+    def __init__(self):
+        from database import Database
+        from esquema import migrar
+        migrar()
+        super().__init__(Database().get_connection())
+
+    def limpiar(self):
+        for tabla in ("ventas_resumen_diario", "ventas_cambios"):
+            self.ejecutar(f"DELETE FROM {tabla}")
+        super().limpiar()
+
+    def finalizar(self):
+        from models import CambiosVenta, ResumenDiario
+        # Las ventas se insertaron sin pasar por Venta: avanzar la versión
+        # invalida los reportes en caché de la aplicación
+        self.ejecutar(CambiosVenta.SQL_AVANZAR_VERSION)
+        self.commit()
+        filas = ResumenDiario.reconstruir()
+        print(f"Resumen diario reconstruido: {filas} filas")
+
+class DestinoSQLite(Destino):
+    """Archivo SQLite con el mismo esquema de tablas"""
+
+    marcador = "?"
+
+    def __init__(self, ruta: str):
+        conn = sqlite3.connect(ruta)
+        conn.executescript(ESQUEMA_SQLITE)
+        super().__init__(conn)
+
+    def insertar(self, tabla: str, columnas: List[str], filas: Iterable[tuple]):
+        # sqlite3 no acepta Decimal ni datetime sin adaptadores
+        filas = [tuple(str(v) if not isinstance(v, (int, str, type(None))) else v for v in fila) for fila in filas]
+        super().insertar(tabla, columnas, filas)
+
+def _en_lotes(filas: Iterable[tuple], tamano: int):
+    """Agrupa un iterable en listas de `tamano` elementos"""
+    iterador = iter(filas)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
+
+def sembrar(destino: Destino, ventas: int, clientes: Optional[int] = None, productos: Optional[int] = None,
+            dias: int = 365, tamano_lote: int = 10000, semilla: int = 42, limpiar: bool = False):
+    """Inserta los datos sintéticos en el destino
+
+    Si no se indica, el número de clientes es 1 por cada 20 ventas y el de
+    productos 1 por cada 200, con mínimos razonables.
+    """
+    rng = random.Random(semilla)
+    clientes = clientes or max(ventas // 20, 100)
+    productos = productos or min(max(ventas // 200, 50), 50000)
+
+    if limpiar:
+        destino.limpiar()
+
+    inicio = time.perf_counter()
+    for lote in _en_lotes(generar_clientes(clientes, rng), tamano_lote):
+        destino.insertar("clientes", ["nombre", "correo", "telefono", "direccion"], lote)
+        destino.commit()
+    destino.insertar("productos", ["nombre", "descripcion", "precio"], generar_productos(productos, rng))
+    destino.commit()
+
+    ids_clientes = [fila[0] for fila in destino.consultar("SELECT id_cliente FROM clientes")]
+    precios = [(id_producto, Decimal(str(precio)))
+               for id_producto, precio in destino.consultar("SELECT id_producto, precio FROM productos")]
+    print(f"{clientes} clientes y {productos} productos insertados")
+
+    hasta = datetime.now().replace(microsecond=0)
+    filas = generar_ventas(ventas, ids_clientes, precios, hasta - timedelta(days=dias), hasta, rng)
+    insertadas = 0
+    for lote in _en_lotes(filas, tamano_lote):
+        destino.insertar("ventas", ["id_cliente", "id_producto", "cantidad", "total", "fecha"], lote)
+        destino.commit()
+        insertadas += len(lote)
+        transcurrido = time.perf_counter() - inicio
+        print(f"\r{insertadas}/{ventas} ventas ({insertadas / transcurrido:,.0f} filas/s)", end="", flush=True)
+    print()
+
+    destino.finalizar()
+    print(f"Carga completa en {time.perf_counter() - inicio:.1f}s")
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos de ventas")
+    parser.add_argument("--ventas", type=int, default=10000, help="Número de ventas (10k a 10M)")
+    parser.add_argument("--clientes", type=int, help="Número de clientes (por defecto ventas/20)")
+    parser.add_argument("--productos", type=int, help="Número de productos (por defecto ventas/200)")
+    parser.add_argument("--dias", type=int, default=365, help="Días de historia hacia atrás desde hoy")
+    parser.add_argument("--lote", type=int, default=10000, help="Filas por INSERT y por commit")
+    parser.add_argument("--semilla", type=int, default=42, help="Semilla para datos reproducibles")
+    parser.add_argument("--sqlite", metavar="RUTA", help="Generar en un archivo SQLite en lugar de MySQL")
+    parser.add_argument("--limpiar", action="store_true", help="Borrar los datos existentes antes de cargar")
+    args = parser.parse_args(argv)
+
+    destino = DestinoSQLite(args.sqlite) if args.sqlite else DestinoMySQL()
+    sembrar(destino, args.ventas, args.clientes, args.productos, args.dias, args.lote, args.semilla, args.limpiar)
+
+if __name__ == "__main__":
+    main()
@@ -2,32 +2,100 @@
 Implementación del patrón Builder para la construcción de reportes y facturas
 """
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
 from datetime import datetime
-from models import Venta, Cliente, Producto
+from models import Venta, Cliente, Producto, ResumenDiario, CambiosVenta
+from cache import TTLCache
+from instrumentacion import medir
+import copy
+import os
+import sys
+import time
 
 class Reporte:
-    """Clase que representa un reporte construido"""
+    """Clase que representa un reporte construido
+    
+    Los datos se guardan por columnas: `columnas` tiene los nombres y
+    `valores` una lista por columna, en el mismo orden.
+    
+    `watermark` permite pedir después solo los cambios (`since`). En un
+    reporte incremental, `datos` contiene las ventas insertadas o actualizadas
+    y `eliminadas` los IDs que ya no forman parte del reporte.
+    """
     
     def __init__(self):
         self.titulo = ""
         self.tipo = ""
         self.filtros = {}
-        self.datos = []
+        self.columnas = []
+        self.valores = []
         self.metricas = {}
+        self.agrupacion = None
+        self.watermark = None
+        self.incremental = None
         self.fecha_generacion = None
         self.formato = "JSON"
     
-    def to_dict(self) -> Dict:
-        """Convierte el reporte a diccionario para respuesta JSON"""
+    def set_columnas(self, columnas: Sequence[str], valores: List[list]):
+        """Establece los datos del reporte por columnas"""
+        self.columnas = list(columnas)
+        self.valores = valores
+    
+    @property
+    def num_filas(self) -> int:
+        return len(self.valores[0]) if self.valores else 0
+    
+    @property
+    def datos(self) -> List[Dict]:
+        """Datos del reporte como lista de filas"""
+        return [dict(zip(self.columnas, fila)) for fila in zip(*self.valores)]
+    
+    @datos.setter
+    def datos(self, filas: List[Dict]):
+        columnas = list(filas[0]) if filas else self.columnas
+        self.set_columnas(columnas, [[fila[columna] for fila in filas] for columna in columnas])
+    
+    def tamano_estimado(self) -> int:
+        """Bytes aproximados que ocupa el reporte en memoria (datos y metadatos)"""
+        tamano = sys.getsizeof(self.valores) + sys.getsizeof(self.metricas) + 1024
+        for columna in self.valores:
+            tamano += sys.getsizeof(columna) + sum(map(sys.getsizeof, columna))
+        return tamano
+    
+    def marcar_incremental(self, since: int, ids: List[int], watermark: int, hay_mas: bool):
+        """Marca el reporte como incremental; `ids` son las ventas cambiadas desde `since`"""
+        presentes = self.valores[self.columnas.index('id_venta')] if self.num_filas else []
+        self.watermark = watermark
+        self.incremental = {
+            "since": since,
+            "eliminadas": CambiosVenta.separar(ids, presentes),
+            "hay_mas": hay_mas
+        }
+    
+    def to_dict(self, columnar: bool = False) -> Dict:
+        """Convierte el reporte a diccionario para respuesta JSON
+        
+        Con `columnar`, `datos` contiene los nombres de columna una sola vez
+        y un arreglo de valores por columna, en lugar de una lista de filas.
+        """
+        if columnar:
+            datos = {"columnas": self.columnas, "valores": self.valores, "filas": self.num_filas}
+        else:
+            datos = self.datos
+        return {**self.encabezado(columnar), "datos": datos}
+    
+    def encabezado(self, columnar: bool = False) -> Dict:
+        """Campos de `to_dict` salvo `datos`, para escribir los datos por separado"""
         return {
             "titulo": self.titulo,
             "tipo": self.tipo,
             "filtros_aplicados": self.filtros,
             "fecha_generacion": self.fecha_generacion.isoformat() if self.fecha_generacion else None,
-            "formato": self.formato,
-            "datos": self.datos,
-            "metricas": self.metricas
+            "formato": "columnar" if columnar else self.formato,
+            "metricas": self.metricas,
+            "agrupacion": self.agrupacion,
+            "watermark": self.watermark,
+            "incremental": self.incremental
         }
 
 class IReporteBuilder(ABC):
@@ -68,20 +136,66 @@ class IReporteBuilder(ABC):
         """Calcula métricas del reporte (total, promedio, etc.)"""
         pass
     
+    @abstractmethod
+    def set_solo_metricas(self, solo_metricas: bool = True) -> 'IReporteBuilder':
+        """Construye el reporte con métricas pero sin filas de datos"""
+        pass
+    
+    @abstractmethod
+    def agrupar_por(self, dimension: str) -> 'IReporteBuilder':
+        """Agrupa los datos por cliente, producto, día, semana o mes"""
+        pass
+    
+    @abstractmethod
+    def set_orden(self, ordenar_por: Optional[str], descendente: Optional[bool] = None) -> 'IReporteBuilder':
+        """Establece el orden de los grupos"""
+        pass
+    
+    @abstractmethod
+    def set_top(self, limite: int) -> 'IReporteBuilder':
+        """Limita el reporte agrupado a los primeros `limite` grupos"""
+        pass
+    
+    @abstractmethod
+    def set_desde(self, watermark: int) -> 'IReporteBuilder':
+        """Incluye solo las ventas que cambiaron después del watermark"""
+        pass
+    
     @abstractmethod
     def construir(self) -> Reporte:
         """Construye y retorna el reporte final"""
         pass
 
 class ReporteVentasBuilder(IReporteBuilder):
-    """Builder concreto para construir reportes de ventas"""
+    """Builder concreto para construir reportes de ventas
+    
+    Los reportes construidos se guardan en una caché LRU acotada en memoria,
+    con los filtros normalizados como clave. Cada entrada lleva la versión de
+    los datos con que se construyó y se descarta en cuanto una escritura de
+    `Venta` la cambia.
+    """
+    
+    cache = TTLCache(
+        max_entries=int(os.getenv('CACHE_REPORTES_MAX', '1000')),
+        ttl=float(os.getenv('CACHE_REPORTES_TTL', '300')),
+        max_bytes=int(float(os.getenv('CACHE_REPORTES_MB', '64')) * 1024 * 1024)
+    )
+    
+    # Segundos durante los que se reutiliza la versión leída de la base; las
+    # escrituras de este proceso cambian la versión local y la releen en el acto
+    VERSION_SEGUNDOS = float(os.getenv('CACHE_REPORTES_VERSION_SEGUNDOS', '1'))
+    _version_leida = (None, 0, 0.0)
     
     def __init__(self):
         self.reporte = Reporte()
+        self.solo_metricas = False
+        self.desde = None
     
     def reset(self) -> 'IReporteBuilder':
         """Reinicia el builder"""
         self.reporte = Reporte()
+        self.solo_metricas = False
+        self.desde = None
         return self
     
     def set_titulo(self, titulo: str) -> 'IReporteBuilder':
@@ -111,73 +225,231 @@ class ReporteVentasBuilder(IReporteBuilder):
         return self
     
     def calcular_metricas(self) -> 'IReporteBuilder':
-        """Calcula métricas del reporte"""
-        if not self.reporte.datos:
-            self.reporte.metricas = {
-                "total_ventas": 0,
-                "total_monto": 0.0,
-                "promedio_venta": 0.0,
-                "cantidad_items": 0
-            }
-        else:
-            total_monto = sum(float(venta['total']) for venta in self.reporte.datos)
-            cantidad_items = sum(int(venta['cantidad']) for venta in self.reporte.datos)
-            self.reporte.metricas = {
-                "total_ventas": len(self.reporte.datos),
-                "total_monto": round(total_monto, 2),
-                "promedio_venta": round(total_monto / len(self.reporte.datos), 2) if self.reporte.datos else 0.0,
-                "cantidad_items": cantidad_items
-            }
+        """Calcula métricas del reporte a partir del resumen diario de ventas"""
+        with medir('builder'):
+            self.reporte.metricas = ResumenDiario.metricas(**self.filtros_consulta())
         return self
     
-    def construir(self) -> Reporte:
-        """Construye el reporte aplicando los filtros y obteniendo datos"""
-        # Obtener datos según los filtros aplicados
-        ventas = []
-        
-        if 'id_cliente' in self.reporte.filtros:
-            ventas = Venta.get_by_cliente(self.reporte.filtros['id_cliente'])
-        else:
-            ventas = Venta.get_all()
-        
-        # Aplicar filtro de producto si existe
-        if 'id_producto' in self.reporte.filtros:
-            ventas = [v for v in ventas if v['id_producto'] == self.reporte.filtros['id_producto']]
-        
-        # Aplicar filtro de fecha si existe
-        if 'fecha_inicio' in self.reporte.filtros and 'fecha_fin' in self.reporte.filtros:
-            fecha_inicio = datetime.fromisoformat(self.reporte.filtros['fecha_inicio'])
-            fecha_fin = datetime.fromisoformat(self.reporte.filtros['fecha_fin'])
-            ventas_filtradas = []
-            for v in ventas:
-                fecha_venta = v['fecha']
-                if isinstance(fecha_venta, str):
-                    fecha_venta = datetime.fromisoformat(fecha_venta.replace(' ', 'T'))
-                elif isinstance(fecha_venta, datetime):
-                    fecha_venta = fecha_venta
-                else:
-                    continue
-                
-                if fecha_inicio <= fecha_venta <= fecha_fin:
-                    ventas_filtradas.append(v)
-            ventas = ventas_filtradas
+    def set_solo_metricas(self, solo_metricas: bool = True) -> 'IReporteBuilder':
+        """Omite la carga de filas: el reporte solo incluye métricas"""
+        self.solo_metricas = solo_metricas
+        return self
+    
+    def agrupar_por(self, dimension: str) -> 'IReporteBuilder':
+        """Agrupa los datos en la base de datos por cliente, producto, día, semana o mes"""
+        if dimension not in ResumenDiario.DIMENSIONES:
+            raise ValueError(f"Agrupación no soportada: {dimension}. "
+                             f"Use {', '.join(ResumenDiario.DIMENSIONES)}")
+        # Por defecto los periodos van en orden cronológico y clientes y productos de mayor a menor monto
+        ordenar_por = 'monto' if dimension in ('cliente', 'producto') else 'clave'
+        self.reporte.agrupacion = {
+            "dimension": dimension,
+            "ordenar_por": ordenar_por,
+            "descendente": ordenar_por != 'clave',
+            "top": None
+        }
+        return self
+    
+    def set_orden(self, ordenar_por: Optional[str], descendente: Optional[bool] = None) -> 'IReporteBuilder':
+        """Ordena los grupos por `monto`, `cantidad`, `num_ventas` o `clave` (cliente, producto o periodo)
         
-        # Convertir fechas a formato string para JSON
-        for venta in ventas:
-            if isinstance(venta['fecha'], datetime):
-                venta['fecha'] = venta['fecha'].isoformat()
-            elif isinstance(venta['fecha'], str):
-                # Ya está en formato string
-                pass
+        Sin `ordenar_por` se conserva el criterio actual; sin `descendente`,
+        `clave` ordena ascendente y las demás descendente.
+        """
+        ordenar_por = ordenar_por or self._agrupacion()["ordenar_por"]
+        if ordenar_por not in ResumenDiario.ORDENES:
+            raise ValueError(f"Orden no soportado: {ordenar_por}. Use {', '.join(ResumenDiario.ORDENES)}")
+        agrupacion = self._agrupacion()
+        agrupacion["ordenar_por"] = ordenar_por
+        agrupacion["descendente"] = ordenar_por != 'clave' if descendente is None else descendente
+        return self
+    
+    def set_top(self, limite: int) -> 'IReporteBuilder':
+        """Conserva solo los primeros `limite` grupos según el orden"""
+        if limite < 1:
+            raise ValueError("top debe ser un entero positivo")
+        self._agrupacion()["top"] = limite
+        return self
+    
+    def set_desde(self, watermark: int) -> 'IReporteBuilder':
+        """Construye un reporte incremental con las ventas cambiadas después de `watermark`"""
+        if watermark < 0:
+            raise ValueError("since debe ser un entero no negativo")
+        self.desde = watermark
+        return self
+    
+    def _agrupacion(self) -> Dict:
+        if self.reporte.agrupacion is None:
+            raise ValueError("El orden y el top requieren agrupar_por")
+        return self.reporte.agrupacion
+    
+    def argumentos_agrupacion(self) -> Dict:
+        """Traduce la agrupación y los filtros a argumentos de `ResumenDiario.agrupar`"""
+        agrupacion = self.reporte.agrupacion
+        return {
+            "dimension": agrupacion["dimension"],
+            "ordenar_por": agrupacion["ordenar_por"],
+            "descendente": agrupacion["descendente"],
+            "limite": agrupacion["top"],
+            **self.filtros_consulta()
+        }
+    
+    def filtros_consulta(self) -> Dict:
+        """Traduce los filtros aplicados a argumentos de consulta del modelo"""
+        filtros = self.reporte.filtros
+        consulta = {
+            "id_cliente": filtros.get('id_cliente'),
+            "id_producto": filtros.get('id_producto')
+        }
+        if 'fecha_inicio' in filtros and 'fecha_fin' in filtros:
+            consulta["fecha_inicio"] = datetime.fromisoformat(filtros['fecha_inicio'])
+            consulta["fecha_fin"] = datetime.fromisoformat(filtros['fecha_fin'])
+        return consulta
+    
+    def clave_cache(self) -> Optional[Tuple]:
+        """Clave del reporte en caché; None si no debe guardarse (reportes incrementales)"""
+        if self.desde is not None:
+            return None
+        filtros = tuple(sorted((clave, valor) for clave, valor in self.filtros_consulta().items()
+                               if valor is not None))
+        agrupacion = tuple(sorted(self.reporte.agrupacion.items())) if self.reporte.agrupacion else None
+        return (self.reporte.titulo, self.reporte.tipo, filtros, agrupacion, self.solo_metricas)
+    
+    @staticmethod
+    def version_datos() -> Tuple[int, int]:
+        """Versión de las ventas: la local cambia al escribir en este proceso y la de
+        `ventas_version`, con cada commit de cualquiera
         
-        self.reporte.datos = ventas
-        self.reporte.fecha_generacion = datetime.now()
+        La de la base se lee como máximo cada `VERSION_SEGUNDOS`, de modo que
+        los aciertos de caché seguidos no agregan una consulta cada uno.
+        """
+        version = ReporteVentasBuilder.version_reciente()
+        if version is None:
+            local = Venta.version_datos()
+            version = ReporteVentasBuilder.recordar_version(local, CambiosVenta.version())
+        return version
+    
+    @staticmethod
+    def version_reciente() -> Optional[Tuple[int, int]]:
+        """Versión leída de la base hace menos de `VERSION_SEGUNDOS`; None si hay que releerla"""
+        local = Venta.version_datos()
+        leida_local, version, instante = ReporteVentasBuilder._version_leida
+        if leida_local == local and time.monotonic() - instante < ReporteVentasBuilder.VERSION_SEGUNDOS:
+            return local, version
+        return None
+    
+    @staticmethod
+    def recordar_version(local: int, version: int) -> Tuple[int, int]:
+        """Guarda la versión recién leída de la base; `local` debe leerse antes de consultarla"""
+        ReporteVentasBuilder._version_leida = (local, version, time.monotonic())
+        return local, version
+    
+    @staticmethod
+    def cache_stats() -> Dict:
+        """Aciertos, fallos, entradas y memoria usada por la caché de reportes"""
+        return ReporteVentasBuilder.cache.stats()
+    
+    def iterar_datos(self, tamano_lote: int = 1000):
+        """Retorna un iterador de lotes de ventas con los filtros aplicados, sin materializar el reporte"""
+        return Venta.iterar_lotes(tamano_lote, **self.filtros_consulta())
+    
+    def construir(self) -> Reporte:
+        """Construye el reporte aplicando los filtros y obteniendo datos
         
-        # Calcular métricas si no se han calculado
-        if not self.reporte.metricas:
-            self.calcular_metricas()
+        Si un reporte con los mismos filtros ya se construyó con la versión
+        actual de los datos, lo retorna desde la caché. Los reportes cuyas
+        métricas se calcularon antes de `construir` no usan la caché, porque
+        podrían ser anteriores a la versión leída.
+        """
+        clave = None if self.reporte.metricas else self.clave_cache()
+        with medir('builder'):
+            if clave is not None:
+                # La versión se lee antes que los datos: si cambian mientras se
+                # construye, la entrada queda con la versión anterior
+                version = self.version_datos()
+                if self.desde_cache(clave, version):
+                    return self.reporte
+            
+            # Obtener solo las ventas que cumplen los filtros, filtrando en la base de datos
+            # (las fechas y decimales se codifican al serializar la respuesta)
+            self.revisar_opciones()
+            if self.solo_metricas:
+                self.reporte.set_columnas(Venta.CAMPOS, [[] for _ in Venta.CAMPOS])
+            elif self.reporte.agrupacion:
+                # Agregación en la base de datos: decenas de filas en lugar de todas las ventas
+                self.reporte.set_columnas(*ResumenDiario.agrupar(**self.argumentos_agrupacion()))
+            elif self.desde is not None:
+                self._construir_incremental()
+            else:
+                # El watermark se lee antes que las ventas para no perder cambios intermedios
+                self.reporte.watermark = CambiosVenta.watermark()
+                self.reporte.set_columnas(Venta.CAMPOS, Venta.buscar_columnar(**self.filtros_consulta()))
+            self.reporte.fecha_generacion = datetime.now()
+            
+            # Calcular métricas si no se han calculado
+            if not self.reporte.metricas:
+                self.calcular_metricas()
+            
+            if clave is not None:
+                self.guardar_en_cache(clave, version)
         
         return self.reporte
+    
+    def revisar_opciones(self):
+        """Lanza ValueError si las opciones del reporte no se pueden combinar"""
+        if self.desde is not None and (self.solo_metricas or self.reporte.agrupacion):
+            raise ValueError("since no se puede combinar con solo_metricas ni agrupar_por")
+    
+    def desde_cache(self, clave: Tuple, version: Tuple[int, int]) -> bool:
+        """Toma de la caché el reporte de `clave` construido con `version`; retorna si estaba"""
+        encontrado, reporte = self.cache.get(clave, version)
+        if encontrado:
+            reporte = copy.copy(reporte)
+            reporte.filtros = dict(self.reporte.filtros)
+            self.reporte = reporte
+        return encontrado
+    
+    def guardar_en_cache(self, clave: Tuple, version: Tuple[int, int]):
+        """Guarda el reporte construido con los datos de `version`"""
+        self.cache.set(clave, self.reporte, self.reporte.tamano_estimado(), version)
+    
+    def _construir_incremental(self):
+        """Carga solo las ventas cambiadas desde el watermark que cumplen los filtros"""
+        ids, watermark, hay_mas = CambiosVenta.desde(self.desde)
+        if ids:
+            valores = Venta.buscar_columnar(**self.filtros_consulta(), ids=ids)
+        else:
+            valores = [[] for _ in Venta.CAMPOS]
+        self.reporte.set_columnas(Venta.CAMPOS, valores)
+        self.reporte.marcar_incremental(self.desde, ids, watermark, hay_mas)
+
+def aplicar_agrupacion(builder: IReporteBuilder, args) -> IReporteBuilder:
+    """Aplica al builder los parámetros de agrupación de una query string
+    
+    `agrupar_por`, `ordenar_por`, `orden` (`asc` o `desc`) y `top`; lanza
+    ValueError si alguno no es válido.
+    """
+    dimension = args.get('agrupar_por')
+    if not dimension:
+        if args.get('ordenar_por') or args.get('top'):
+            raise ValueError("ordenar_por y top requieren agrupar_por")
+        return builder
+    builder.agrupar_por(dimension)
+    
+    orden = args.get('orden')
+    if orden and orden not in ('asc', 'desc'):
+        raise ValueError("orden debe ser asc o desc")
+    if args.get('ordenar_por') or orden:
+        builder.set_orden(args.get('ordenar_por'), None if orden is None else orden == 'desc')
+    
+    top = args.get('top')
+    if top:
+        try:
+            top = int(top)
+        except ValueError:
+            raise ValueError("top debe ser un entero positivo")
+        builder.set_top(top)
+    return builder
 
 class FacturaBuilder:
     """Builder para construir facturas detalladas"""
@@ -211,9 +483,24 @@ class FacturaBuilder:
         self.factura["numero_factura"] = numero
         return self
     
-    def set_cliente(self, id_cliente: int):
-        """Establece el cliente de la factura"""
-        cliente = Cliente.get_by_id(id_cliente)
+    @staticmethod
+    def cliente_de_venta(venta: Dict) -> Dict:
+        """Extrae los datos del cliente de una fila de venta con detalle"""
+        return {
+            "id_cliente": venta['id_cliente'],
+            "nombre": venta['cliente_nombre'],
+            "correo": venta['cliente_correo'],
+            "telefono": venta.get('cliente_telefono', ''),
+            "direccion": venta.get('cliente_direccion', '')
+        }
+    
+    def set_cliente(self, id_cliente: int, cliente: Optional[Dict] = None):
+        """Establece el cliente de la factura
+        
+        Si se proporcionan los datos del `cliente`, no se consulta la base de datos.
+        """
+        if cliente is None:
+            cliente = Cliente.get_by_id(id_cliente)
         if cliente:
             self.factura["cliente"] = {
                 "id": cliente['id_cliente'],
@@ -224,9 +511,13 @@ class FacturaBuilder:
             }
         return self
     
-    def agregar_item(self, id_venta: int):
-        """Agrega un item de venta a la factura"""
-        venta = Venta.get_by_id(id_venta)
+    def agregar_item(self, id_venta: int, venta: Optional[Dict] = None):
+        """Agrega un item de venta a la factura
+        
+        Si se proporciona la fila de la `venta` ya obtenida, no se consulta la base de datos.
+        """
+        if venta is None:
+            venta = Venta.get_by_id(id_venta)
         if venta:
             item = {
                 "id_venta": venta['id_venta'],
@@ -240,6 +531,12 @@ class FacturaBuilder:
             self.factura["subtotal"] += float(venta['total'])
         return self
     
+    def agregar_items(self, ventas: List[Dict]):
+        """Agrega varios items a partir de filas de venta ya obtenidas"""
+        for venta in ventas:
+            self.agregar_item(venta['id_venta'], venta)
+        return self
+    
     def calcular_total(self):
         """Calcula el total de la factura"""
         # En este caso el subtotal es igual al total (sin impuestos)
@@ -0,0 +1,248 @@
+"""
+Índice en memoria de prefijos de palabras para búsquedas de tipo typeahead
+
+Cada fila se indexa por las palabras de sus campos de texto (por ejemplo,
+nombre y correo), normalizadas sin mayúsculas ni acentos. Las palabras se
+guardan en una lista ordenada, de modo que las que empiezan con un prefijo
+forman un rango contiguo que se localiza con búsqueda binaria.
+"""
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import os
+import re
+import threading
+import time
+import unicodedata
+
+_SEPARADORES = re.compile(r"[^0-9a-z]+")
+
+# Filas candidatas que se puntúan como máximo por búsqueda; acota el costo de
+# los prefijos muy cortos, que coinciden con gran parte del catálogo
+CANDIDATOS_MAX = 5000
+
+# Filas nuevas o modificadas a partir de las que un refresco reconstruye el
+# índice completo (fuera del bloqueo) en lugar de actualizarlo fila por fila
+REFRESCO_MAX = 1000
+
+# Palabras a partir de las que agregar varias filas reordena la lista una sola
+# vez en lugar de insertar cada palabra con insort, que la desplaza entera
+INSERCIONES_MAX = 256
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin acentos"""
+    descompuesto = unicodedata.normalize('NFKD', str(texto).lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def palabras(texto: str) -> List[str]:
+    """Palabras normalizadas de un texto"""
+    return [palabra for palabra in _SEPARADORES.split(normalizar(texto)) if palabra]
+
+
+class IndicePrefijos:
+    """Índice de prefijos seguro para hilos
+
+    `campos` son los campos de texto indexados; el primero es el principal
+    (por ejemplo, el nombre) y decide el orden de los resultados con la misma
+    puntuación.
+    """
+
+    def __init__(self, campo_id: str, campos: Sequence[str]):
+        self.campo_id = campo_id
+        self.campos = tuple(campos)
+        self._lock = threading.RLock()
+        self._entradas: List[Tuple[str, int]] = []
+        self._filas: Dict[int, Tuple[Dict, Tuple[str, ...], str]] = {}
+
+    def _claves(self, fila: Dict) -> Tuple[Tuple[str, ...], str]:
+        """Palabras indexadas de una fila y su texto principal normalizado"""
+        claves = []
+        for campo in self.campos:
+            if fila.get(campo):
+                claves.extend(palabras(fila[campo]))
+        principal = normalizar(fila.get(self.campos[0]) or '')
+        return tuple(dict.fromkeys(claves)), principal
+
+    def reconstruir(self, filas: Iterable[Dict]):
+        """Reemplaza el contenido del índice"""
+        nuevas = {}
+        entradas = []
+        for fila in filas:
+            id_fila = fila[self.campo_id]
+            claves, principal = self._claves(fila)
+            nuevas[id_fila] = (dict(fila), claves, principal)
+            entradas.extend((clave, id_fila) for clave in claves)
+        entradas.sort()
+        with self._lock:
+            self._filas = nuevas
+            self._entradas = entradas
+
+    def actualizar(self, fila: Dict):
+        """Agrega una fila o reemplaza la existente con el mismo ID"""
+        self.actualizar_varias([fila])
+
+    def actualizar_varias(self, filas: Iterable[Dict]):
+        """Agrega o reemplaza varias filas; sus palabras se calculan antes de tomar el bloqueo"""
+        nuevas = {}
+        entradas = []
+        for fila in filas:
+            id_fila = fila[self.campo_id]
+            claves, principal = self._claves(fila)
+            nuevas[id_fila] = (dict(fila), claves, principal)
+            entradas.extend((clave, id_fila) for clave in claves)
+        with self._lock:
+            for id_fila in nuevas:
+                self._quitar(id_fila)
+            self._filas.update(nuevas)
+            if len(entradas) > INSERCIONES_MAX:
+                self._entradas.extend(entradas)
+                self._entradas.sort()
+            else:
+                for entrada in entradas:
+                    insort(self._entradas, entrada)
+
+    def eliminar(self, id_fila: int):
+        """Quita una fila del índice, si está"""
+        with self._lock:
+            self._quitar(id_fila)
+
+    def _quitar(self, id_fila: int):
+        anterior = self._filas.pop(id_fila, None)
+        if anterior is None:
+            return
+        for clave in anterior[1]:
+            posicion = bisect_left(self._entradas, (clave, id_fila))
+            if posicion < len(self._entradas) and self._entradas[posicion] == (clave, id_fila):
+                del self._entradas[posicion]
+
+    def _rango(self, prefijo: str) -> Tuple[int, int]:
+        """Posiciones [inicio, fin) de las palabras que empiezan con `prefijo`"""
+        return (bisect_left(self._entradas, (prefijo,)),
+                bisect_left(self._entradas, (prefijo + '\uffff',)))
+
+    def _coincidencias(self, prefijo: str, rango: Tuple[int, int]) -> Dict[int, bool]:
+        """IDs con alguna palabra que empieza con `prefijo`; el valor indica si una es igual"""
+        resultado = {}
+        for posicion in range(*rango):
+            if len(resultado) >= CANDIDATOS_MAX:
+                break
+            clave, id_fila = self._entradas[posicion]
+            resultado[id_fila] = resultado.get(id_fila, False) or clave == prefijo
+        return resultado
+
+    def buscar(self, texto: str, limite: int = 10) -> List[Dict]:
+        """Filas que tienen, para cada palabra de `texto`, alguna palabra que empieza con ella
+
+        Se ordenan por puntuación: cuenta más una palabra igual a la buscada
+        y que el campo principal empiece con la primera palabra; a igual
+        puntuación, primero los textos principales más cortos.
+        """
+        terminos = palabras(texto)
+        if not terminos:
+            return []
+        with self._lock:
+            # Los candidatos salen del término con menos palabras coincidentes
+            rangos = {termino: self._rango(termino) for termino in terminos}
+            base = min(terminos, key=lambda termino: rangos[termino][1] - rangos[termino][0])
+            candidatos = self._coincidencias(base, rangos[base])
+            puntuados = []
+            for id_fila, exacta in candidatos.items():
+                fila, claves, principal = self._filas[id_fila]
+                puntos = 0
+                for termino in terminos:
+                    if termino == base:
+                        puntos += 3 if exacta else 1
+                        continue
+                    if termino in claves:
+                        puntos += 3
+                    elif any(clave.startswith(termino) for clave in claves):
+                        puntos += 1
+                    else:
+                        break
+                else:
+                    if principal.startswith(terminos[0]):
+                        puntos += 2
+                    puntuados.append((-puntos, len(principal), principal, id_fila))
+            puntuados.sort()
+            return [dict(self._filas[id_fila][0]) for _, _, _, id_fila in puntuados[:limite]]
+
+    @property
+    def max_id(self) -> int:
+        with self._lock:
+            return max(self._filas, default=0)
+
+    def stats(self) -> Dict:
+        """Filas y palabras indexadas"""
+        with self._lock:
+            return {"filas": len(self._filas), "palabras": len(self._entradas)}
+
+
+class IndiceCatalogo(IndicePrefijos):
+    """Índice de un catálogo que se mantiene al día con la base de datos
+
+    Se construye con todas las filas la primera vez y luego se refresca de
+    forma incremental: cada `BUSQUEDA_INTERVALO` segundos agrega las filas con
+    ID mayor que el último indexado y vuelve a leer las marcadas con
+    `marcar()` (modificadas o eliminadas). Si son más de `REFRESCO_MAX`, o
+    cada `BUSQUEDA_RECONSTRUIR` segundos como respaldo ante cambios no
+    avisados, se reconstruye completo.
+    """
+
+    def __init__(self, campo_id: str, campos: Sequence[str]):
+        super().__init__(campo_id, campos)
+        self.intervalo = float(os.getenv('BUSQUEDA_INTERVALO', '5'))
+        self.reconstruccion = float(os.getenv('BUSQUEDA_RECONSTRUIR', '600'))
+        self._construido = None
+        self._revisado = 0.0
+        self._pendientes = set()
+        self._refrescando = threading.Lock()
+
+    def marcar(self, id_fila: Optional[int] = None):
+        """Pide releer una fila en el próximo refresco, o reconstruir todo si no se indica ID"""
+        with self._lock:
+            if id_fila is None:
+                self._construido = None
+            else:
+                self._pendientes.add(id_fila)
+
+    def refrescar(self, cargar_todas: Callable[[], List[Dict]],
+                  cargar_desde: Callable[[int, int], List[Dict]],
+                  cargar_ids: Callable[[List[int]], Dict[int, Dict]]):
+        """Pone el índice al día si venció alguno de sus intervalos
+
+        `cargar_desde(id, limite)` lee como máximo `limite` filas con ID mayor
+        que `id`. Mientras un hilo refresca, los demás buscan sobre el
+        contenido anterior en lugar de esperar, salvo que el índice aún no exista.
+        """
+        ahora = time.monotonic()
+        if self._construido is not None and ahora - self._revisado < self.intervalo:
+            return
+        bloquear = self._construido is None
+        if not self._refrescando.acquire(blocking=bloquear):
+            return
+        try:
+            ahora = time.monotonic()
+            if self._construido is None or ahora - self._construido >= self.reconstruccion:
+                with self._lock:
+                    self._pendientes.clear()
+                self.reconstruir(cargar_todas())
+                self._construido = ahora
+            elif ahora - self._revisado >= self.intervalo:
+                nuevas = cargar_desde(self.max_id, REFRESCO_MAX + 1)
+                with self._lock:
+                    pendientes = list(self._pendientes)
+                    self._pendientes.clear()
+                if len(nuevas) > REFRESCO_MAX or len(pendientes) > REFRESCO_MAX:
+                    self.reconstruir(cargar_todas())
+                    self._construido = ahora
+                else:
+                    encontradas = cargar_ids(pendientes) if pendientes else {}
+                    self.actualizar_varias(nuevas + [encontradas[id_fila] for id_fila in pendientes
+                                                     if id_fila in encontradas])
+                    for id_fila in pendientes:
+                        if id_fila not in encontradas:
+                            self.eliminar(id_fila)
+            self._revisado = ahora
+        finally:
+            self._refrescando.release()
@@ -0,0 +1,102 @@
+"""
+Caché en memoria con expiración (TTL) y desalojo LRU
+"""
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """Caché acotada y segura para hilos
+
+    Guarda como máximo `max_entries` valores; al superar el límite desaloja
+    el usado hace más tiempo. Cada valor expira `ttl` segundos después de
+    guardarse.
+
+    Con `max_bytes`, además se desalojan entradas mientras la suma de los
+    tamaños indicados en `set` supere ese límite. Con `version`, una entrada
+    guardada con otra versión de los datos se descarta como fallo.
+    """
+
+    # Estadísticas que solo crecen; el resto describe el estado actual
+    CONTADORES = ("hits", "misses", "evictions", "stale")
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._obsoletas = 0
+
+    def get(self, clave: Hashable, version: Hashable = None) -> Tuple[bool, Any]:
+        """Busca una clave; retorna (encontrado, valor)"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None:
+                valor, expira, _, version_guardada = entrada
+                if expira > time.monotonic() and version_guardada == version:
+                    self._datos.move_to_end(clave)
+                    self._hits += 1
+                    return True, valor
+                if version_guardada != version:
+                    self._obsoletas += 1
+                self._quitar(clave)
+            self._misses += 1
+            return False, None
+
+    def set(self, clave: Hashable, valor: Any, tamano: int = 0, version: Hashable = None):
+        """Guarda un valor, desalojando los menos usados si la caché está llena
+
+        Un valor más grande que `max_bytes` no se guarda.
+        """
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+            if self.max_bytes is not None and tamano > self.max_bytes:
+                return
+            self._datos[clave] = (valor, time.monotonic() + self.ttl, tamano, version)
+            self._bytes += tamano
+            while len(self._datos) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._quitar(next(iter(self._datos)))
+                self._evictions += 1
+
+    def _quitar(self, clave: Hashable):
+        self._bytes -= self._datos.pop(clave)[2]
+
+    def invalidate(self, clave: Hashable):
+        """Elimina una clave, si existe"""
+        with self._lock:
+            if clave in self._datos:
+                self._quitar(clave)
+
+    def clear(self):
+        """Elimina todas las entradas"""
+        with self._lock:
+            self._datos.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Contadores de aciertos, fallos y ocupación"""
+        with self._lock:
+            consultas = self._hits + self._misses
+            stats = {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / consultas, 4) if consultas else 0.0,
+                "evictions": self._evictions,
+                "stale": self._obsoletas,
+                "entries": len(self._datos),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl
+            }
+            if self.max_bytes is not None:
+                stats["bytes"] = self._bytes
+                stats["max_bytes"] = self.max_bytes
+            return stats
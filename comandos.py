@@ -0,0 +1,159 @@
+"""
+Comandos de administración para la CLI de Flask (`flask --app app <comando>`)
+"""
+import click
+import csv
+from datetime import datetime
+from flask import Flask
+from models import ResumenDiario, CambiosVenta
+from esquema import advertir_planes, estado, migrar, revisar_planes, PLANES_MIN_FILAS
+from facturacion import DIRECTORIO_FACTURAS, FACTURAS_WORKERS_MAX, generar_facturas_periodo
+from trabajos import REPORTES_RETENCION_HORAS, purgar_resultados
+from importacion import (
+    COLUMNAS_OPCIONALES, COLUMNAS_REQUERIDAS, IMPORTACION_LOTE, ErrorImportacion, importar_ventas
+)
+
+def registrar_comandos(app: Flask):
+    """Registra los comandos de administración en la aplicación"""
+    
+    @app.cli.group('db')
+    def db():
+        """Migraciones del esquema y revisión de planes de consulta"""
+    
+    @db.command('migrar')
+    @click.option('--hasta', type=int, default=None, help='Última versión a aplicar')
+    def migrar_esquema(hasta: int):
+        """Aplica las migraciones pendientes de `migraciones/`"""
+        aplicadas = migrar(hasta, lambda migracion: click.echo(
+            f"Aplicando {migracion.version:03d} {migracion.nombre}..."))
+        click.echo(f"Migraciones aplicadas: {len(aplicadas)}")
+    
+    @db.command('estado')
+    def estado_esquema():
+        """Muestra las migraciones aplicadas y pendientes"""
+        for migracion in estado():
+            aplicada = migracion['aplicada'] or 'pendiente'
+            click.echo(f"{migracion['version']:03d} {migracion['nombre']}: {aplicada}")
+    
+    @db.command('explicar')
+    @click.option('--min-filas', default=PLANES_MIN_FILAS, show_default=True,
+                  help='Filas estimadas a partir de las que se reporta un recorrido completo')
+    def explicar_consultas(min_filas: int):
+        """Ejecuta EXPLAIN sobre las consultas críticas y advierte los recorridos completos"""
+        pasos = revisar_planes(min_filas)
+        for paso in pasos:
+            marca = '!!' if paso['recorrido_completo'] else '  '
+            click.echo(f"{marca} {paso['consulta']:<28} {str(paso['tabla']):<16} {str(paso['tipo']):<8} "
+                       f"{str(paso['indice'] or '-'):<28} ~{paso['filas']} filas")
+        completos = advertir_planes(min_filas, pasos)
+        if completos:
+            raise click.ClickException(f"{len(completos)} recorridos completos de tabla")
+        click.echo("Sin recorridos completos de tabla")
+    
+    @app.cli.group('resumen')
+    def resumen():
+        """Resumen diario de ventas usado por las métricas de reportes"""
+    
+    @resumen.command('reconstruir')
+    def reconstruir_resumen():
+        """Aplica las migraciones pendientes y repuebla el resumen diario desde la tabla de ventas"""
+        migrar()
+        filas = ResumenDiario.reconstruir()
+        click.echo(f"Resumen diario reconstruido: {filas} filas")
+    
+    @app.cli.group('cambios')
+    def cambios():
+        """Registro de cambios de ventas usado por las lecturas incrementales (`since`)"""
+    
+    @cambios.command('crear')
+    def crear_cambios():
+        """Aplica las migraciones pendientes, entre ellas la que crea la tabla de cambios"""
+        migrar()
+        click.echo("Tabla ventas_cambios lista")
+    
+    @cambios.command('purgar')
+    @click.option('--dias', default=7, show_default=True, help='Antigüedad mínima de los cambios a eliminar')
+    def purgar_cambios(dias: int):
+        """Elimina los cambios antiguos; los clientes con un watermark anterior deberán recargar todo"""
+        eliminados = CambiosVenta.purgar(dias)
+        click.echo(f"Cambios eliminados: {eliminados}")
+    
+    @app.cli.group('ventas')
+    def ventas():
+        """Carga masiva de ventas"""
+    
+    @ventas.command('importar')
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--lote', default=IMPORTACION_LOTE, show_default=True, help='Ventas por transacción')
+    @click.option('--saltar', default=0, show_default=True,
+                  help='Filas de datos a omitir al inicio, para reanudar una importación interrumpida')
+    @click.option('--rechazos', type=click.Path(dir_okay=False), default=None,
+                  help='CSV donde guardar las filas rechazadas con su motivo')
+    def importar(archivo: str, lote: int, saltar: int, rechazos: str):
+        """Importa ventas desde un CSV con columnas id_cliente, id_producto, cantidad y opcionalmente fecha y total"""
+        salida_rechazos = open(rechazos, 'w', newline='', encoding='utf-8') if rechazos else None
+        escritor = None
+        if salida_rechazos:
+            escritor = csv.writer(salida_rechazos)
+            escritor.writerow(('linea', 'error') + COLUMNAS_REQUERIDAS + COLUMNAS_OPCIONALES)
+        
+        def rechazada(rechazo):
+            if escritor:
+                fila = rechazo['fila']
+                escritor.writerow([rechazo['linea'], rechazo['error']] +
+                                  [fila.get(columna, '') for columna in COLUMNAS_REQUERIDAS + COLUMNAS_OPCIONALES])
+        
+        estado = None
+        try:
+            with open(archivo, newline='', encoding='utf-8-sig') as entrada:
+                for estado in importar_ventas(entrada, lote, saltar, rechazada):
+                    click.echo(f"\r{estado['leidas']} filas leídas, {estado['insertadas']} insertadas, "
+                               f"{estado['rechazadas']} rechazadas ({estado['filas_por_segundo']:.0f} filas/s)",
+                               nl=False)
+        except ErrorImportacion as e:
+            raise click.ClickException(str(e))
+        finally:
+            click.echo()
+            if salida_rechazos:
+                salida_rechazos.close()
+            if estado is not None and estado['estado'] != 'completado':
+                click.echo(f"Importación interrumpida: reanudar con --saltar {estado['leidas']}", err=True)
+        click.echo(f"Importación completada: {estado['insertadas']} ventas insertadas en "
+                   f"{estado['duracion']}s, {estado['rechazadas']} filas rechazadas")
+    
+    @app.cli.group('reportes')
+    def reportes():
+        """Trabajos de reportes en segundo plano (`/api/reportes/jobs`)"""
+    
+    @reportes.command('purgar')
+    @click.option('--horas', default=REPORTES_RETENCION_HORAS, show_default=True,
+                  help='Antigüedad mínima de los trabajos a eliminar')
+    def purgar_reportes(horas: float):
+        """Elimina los trabajos terminados y sus resultados comprimidos"""
+        eliminados = purgar_resultados(horas)
+        click.echo(f"Trabajos eliminados: {eliminados}")
+    
+    @app.cli.group('facturas')
+    def facturas():
+        """Facturación por lotes"""
+    
+    @facturas.command('generar')
+    @click.option('--desde', 'fecha_inicio', required=True, type=click.DateTime(),
+                  help='Inicio del período (AAAA-MM-DD)')
+    @click.option('--hasta', 'fecha_fin', required=True, type=click.DateTime(),
+                  help='Fin del período (AAAA-MM-DD)')
+    @click.option('--directorio', default=DIRECTORIO_FACTURAS, show_default=True,
+                  help='Directorio de salida')
+    @click.option('--workers', default=4, show_default=True, type=click.IntRange(1, FACTURAS_WORKERS_MAX),
+                  help='Procesos de generación (como máximo uno por núcleo)')
+    def generar_facturas(fecha_inicio: datetime, fecha_fin: datetime, directorio: str, workers: int):
+        """Genera una factura por cliente con las ventas del período"""
+        def mostrar(estado):
+            click.echo(f"\r{estado['generadas'] + estado['omitidas']}/{estado['total']} facturas "
+                       f"({estado['omitidas']} ya existentes, {len(estado['errores'])} errores)", nl=False)
+        
+        estado = generar_facturas_periodo(fecha_inicio, fecha_fin, directorio, workers, mostrar)
+        click.echo()
+        for error in estado['errores']:
+            click.echo(f"Cliente {error['id_cliente']}: {error['error']}", err=True)
+        click.echo(f"Facturas en {estado['directorio']}: {estado['estado']}")
@@ -3,42 +3,474 @@ Módulo de configuración y conexión a la base de datos
 """
 import mysql.connector
 from mysql.connector import Error
+from mysql.connector.errors import PoolError
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 import os
+import threading
+import time
 from dotenv import load_dotenv
+import instrumentacion
 
 load_dotenv()
 
+
+class PoolTimeoutError(PoolError):
+    """Se agotó el tiempo de espera por una conexión libre del pool"""
+
+
+class _CursorMedido:
+    """Cursor que registra consultas, tiempos y filas leídas en la instrumentación"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.execute(*args, **kwargs)
+        finally:
+            instrumentacion.registrar_consulta(time.perf_counter() - inicio)
+
+    def executemany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        try:
+            return self._cursor.executemany(*args, **kwargs)
+        finally:
+            instrumentacion.registrar_consulta(time.perf_counter() - inicio)
+
+    def fetchone(self):
+        inicio = time.perf_counter()
+        fila = self._cursor.fetchone()
+        instrumentacion.registrar_lectura(0 if fila is None else 1, time.perf_counter() - inicio)
+        return fila
+
+    def fetchmany(self, *args, **kwargs):
+        inicio = time.perf_counter()
+        filas = self._cursor.fetchmany(*args, **kwargs)
+        instrumentacion.registrar_lectura(len(filas), time.perf_counter() - inicio)
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        filas = self._cursor.fetchall()
+        instrumentacion.registrar_lectura(len(filas), time.perf_counter() - inicio)
+        return filas
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+class _CursorPreparado(_CursorMedido):
+    """Cursor de una sentencia preparada del registro de una conexión
+
+    `close()` no libera la sentencia: descarta las filas sin leer para que la
+    conexión quede lista y el cursor pueda reutilizarse en la siguiente llamada.
+    """
+
+    def __init__(self, cursor, registro: 'RegistroSentencias', clave: tuple):
+        super().__init__(cursor)
+        self._registro = registro
+        self._clave = clave
+        self._sql = clave[0]
+        self._conn = registro.conn
+
+    def execute(self, sql, params=()):
+        if sql != self._sql:
+            raise ValueError("El cursor preparado solo ejecuta su propia sentencia")
+        try:
+            # El conector vuelve a preparar la sentencia si recibe otro objeto str
+            return super().execute(self._sql, params)
+        except Error:
+            self._registro.olvidar(self._clave)
+            raise
+
+    def close(self):
+        if self._conn.unread_result:
+            self._cursor.fetchall()
+
+
+class RegistroSentencias:
+    """Sentencias preparadas de una conexión del pool, reutilizadas entre llamadas
+
+    Cada SQL se prepara en el servidor la primera vez que se usa en la
+    conexión; las siguientes ejecuciones solo envían los parámetros. Conserva
+    hasta `maximo` sentencias y cierra la usada hace más tiempo al superarlo.
+    Solo debe registrarse SQL de texto fijo: una consulta con un número
+    variable de marcadores (`IN (%s, ...)`) ocuparía una sentencia por longitud.
+    """
+
+    _lock = threading.Lock()
+    # Estadísticas que solo crecen; `abiertas` sube y baja
+    CONTADORES = ("preparadas", "reutilizadas", "desalojadas", "errores")
+    _stats = {
+        "preparadas": 0,
+        "reutilizadas": 0,
+        "desalojadas": 0,
+        "errores": 0,
+        "abiertas": 0,
+    }
+
+    def __init__(self, conn, maximo: int):
+        self.conn = conn
+        self.maximo = maximo
+        self._cursores = OrderedDict()
+
+    @classmethod
+    def _contar(cls, **incrementos):
+        with cls._lock:
+            for clave, valor in incrementos.items():
+                cls._stats[clave] += valor
+
+    def cursor(self, sql: str, dictionary: bool = False) -> _CursorPreparado:
+        """Cursor preparado para `sql`, creándolo si la conexión aún no lo tiene"""
+        clave = (sql, dictionary)
+        cursor = self._cursores.get(clave)
+        if cursor is not None:
+            self._cursores.move_to_end(clave)
+            self._contar(reutilizadas=1)
+            return cursor
+        cursor = _CursorPreparado(self.conn.cursor(prepared=True, dictionary=dictionary), self, clave)
+        self._cursores[clave] = cursor
+        self._contar(preparadas=1, abiertas=1)
+        while len(self._cursores) > self.maximo:
+            _, antiguo = self._cursores.popitem(last=False)
+            self._contar(desalojadas=1, abiertas=-1)
+            self._cerrar(antiguo)
+        return cursor
+
+    def olvidar(self, clave: tuple):
+        """Quita una sentencia cuya ejecución falló, para prepararla de nuevo en el próximo uso"""
+        cursor = self._cursores.pop(clave, None)
+        if cursor is not None:
+            self._contar(errores=1, abiertas=-1)
+            self._cerrar(cursor)
+
+    @staticmethod
+    def _cerrar(cursor: _CursorPreparado):
+        try:
+            cursor._cursor.close()
+        except Error:
+            pass
+
+    def descartar(self):
+        """Olvida las sentencias sin cerrarlas; el servidor las libera al cerrar la conexión"""
+        self._contar(abiertas=-len(self._cursores))
+        self._cursores.clear()
+
+    @classmethod
+    def stats(cls) -> dict:
+        """Estadísticas de todas las conexiones del proceso"""
+        with cls._lock:
+            stats = dict(cls._stats)
+        usos = stats["preparadas"] + stats["reutilizadas"]
+        stats["hit_ratio"] = stats["reutilizadas"] / usos if usos else 0.0
+        return stats
+
+
+class _ConexionMedida:
+    """Conexión cuyos cursores y commits se registran en la instrumentación"""
+
+    def __init__(self, conn, max_sentencias: int = 0):
+        self._conn = conn
+        self._sentencias = RegistroSentencias(conn, max_sentencias) if max_sentencias > 0 else None
+        self._incremento = None
+
+    def cursor(self, *args, **kwargs):
+        return _CursorMedido(self._conn.cursor(*args, **kwargs))
+
+    def cursor_preparado(self, sql: str, dictionary: bool = False):
+        """Cursor para ejecutar `sql`, preparada una sola vez por conexión
+
+        Con el registro desactivado (`DB_SENTENCIAS_MAX=0`) retorna un cursor común.
+        """
+        if self._sentencias is None:
+            return self.cursor(dictionary=dictionary)
+        return self._sentencias.cursor(sql, dictionary)
+
+    def incremento_autoincremento(self) -> int:
+        """`@@auto_increment_increment` de la sesión, consultado una sola vez por conexión
+
+        Es la distancia entre los IDs que asigna un mismo INSERT de varias
+        filas: 1 salvo en replicación con varios primarios (Galera, por ejemplo).
+        """
+        if self._incremento is None:
+            cursor = self.cursor()
+            cursor.execute("SELECT @@auto_increment_increment")
+            self._incremento = int(cursor.fetchone()[0])
+            cursor.close()
+        return self._incremento
+
+    def close(self):
+        if self._sentencias is not None:
+            self._sentencias.descartar()
+        return self._conn.close()
+
+    def commit(self):
+        inicio = time.perf_counter()
+        try:
+            return self._conn.commit()
+        finally:
+            instrumentacion.registrar_consulta(time.perf_counter() - inicio)
+
+    def __getattr__(self, nombre):
+        return getattr(self._conn, nombre)
+
+
+class ConnectionPool:
+    """Pool de conexiones MySQL seguro para hilos
+
+    Mantiene hasta `size` conexiones abiertas y permite `max_overflow`
+    conexiones temporales adicionales en picos de carga. Cuando se alcanza el
+    límite, los hilos esperan hasta `timeout` segundos a que se libere una.
+    Las conexiones que llevan más de `health_check_interval` segundos ociosas
+    se verifican antes de entregarse, en lugar de hacer ping en cada uso.
+    """
+
+    # Estadísticas que solo crecen; el resto describe el estado actual
+    CONTADORES = ("checkouts", "created", "discarded", "health_checks", "waits", "wait_time_total", "timeouts")
+
+    def __init__(self, size: int = 5, max_overflow: int = 10, timeout: float = 30.0,
+                 health_check_interval: float = 30.0, max_sentencias: int = 0, **connect_args):
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_sentencias = max_sentencias
+        self._connect_args = connect_args
+        self._idle = deque()
+        self._total = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "health_checks": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+        }
+
+    def _crear_conexion(self):
+        """Abre una conexión física nueva"""
+        conn = _ConexionMedida(mysql.connector.connect(**self._connect_args), self.max_sentencias)
+        with self._cond:
+            self._stats["created"] += 1
+        print("Conexión a la base de datos establecida exitosamente")
+        return conn
+
+    def _cerrar_conexion(self, conn):
+        """Cierra una conexión física ignorando errores de red"""
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def acquire(self):
+        """Toma una conexión del pool, esperando si está agotado"""
+        conn = None
+        ultimo_uso = None
+        with self._cond:
+            inicio_espera = None
+            while True:
+                if self._idle:
+                    conn, ultimo_uso = self._idle.pop()
+                    break
+                if self._total < self.size + self.max_overflow:
+                    self._total += 1
+                    break
+                ahora = time.monotonic()
+                if inicio_espera is None:
+                    inicio_espera = ahora
+                    self._stats["waits"] += 1
+                restante = inicio_espera + self.timeout - ahora
+                if restante <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No hay conexiones libres tras esperar {self.timeout}s "
+                        f"(size={self.size}, max_overflow={self.max_overflow})"
+                    )
+                self._cond.wait(restante)
+            if inicio_espera is not None:
+                espera = time.monotonic() - inicio_espera
+                self._stats["wait_time_total"] += espera
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], espera)
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+
+        try:
+            if conn is None:
+                conn = self._crear_conexion()
+            elif time.monotonic() - ultimo_uso > self.health_check_interval:
+                conn = self._verificar(conn)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def _verificar(self, conn):
+        """Comprueba una conexión ociosa y la reemplaza si está caída"""
+        with self._cond:
+            self._stats["health_checks"] += 1
+        if conn.is_connected():
+            return conn
+        with self._cond:
+            self._stats["discarded"] += 1
+        self._cerrar_conexion(conn)
+        return self._crear_conexion()
+
+    def release(self, conn, discard: bool = False):
+        """Devuelve una conexión al pool
+
+        Las transacciones abiertas se revierten para que el siguiente usuario
+        reciba la conexión limpia. Las conexiones de desborde, y las marcadas
+        con `discard`, se cierran en lugar de volver al pool.
+        """
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._total > self.size:
+                self._total -= 1
+                if discard:
+                    self._stats["discarded"] += 1
+                cerrar = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                cerrar = False
+            self._cond.notify()
+
+        if cerrar:
+            self._cerrar_conexion(conn)
+
+    @contextmanager
+    def connection(self):
+        """Conexión dedicada durante un bloque `with`"""
+        conn = self.acquire()
+        try:
+            yield conn
+        except BaseException:
+            self.release(conn, discard=not conn.is_connected())
+            raise
+        self.release(conn)
+
+    def stats(self) -> dict:
+        """Estadísticas de uso del pool"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "open": self._total,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            })
+        return stats
+
+    def close_all(self):
+        """Cierra las conexiones ociosas del pool"""
+        with self._cond:
+            ociosas = list(self._idle)
+            self._idle.clear()
+            self._total -= len(ociosas)
+        for conn, _ in ociosas:
+            self._cerrar_conexion(conn)
+
+
 class Database:
-    """Clase singleton para gestionar la conexión a la base de datos"""
-    
+    """Clase singleton para gestionar la conexión a la base de datos
+
+    Cada hilo recibe su propia conexión del pool en la primera llamada a
+    `get_connection()` y la conserva hasta `release_connection()`, que la
+    aplicación invoca al terminar cada request.
+    """
+
     _instance = None
-    _connection = None
-    
+    _pool = None
+    _lock = threading.Lock()
+    _local = threading.local()
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
-    
+
+    def get_pool(self) -> ConnectionPool:
+        """Obtiene el pool de conexiones, creándolo la primera vez"""
+        if Database._pool is None:
+            with Database._lock:
+                if Database._pool is None:
+                    Database._pool = ConnectionPool(
+                        size=int(os.getenv('DB_POOL_SIZE', '5')),
+                        max_overflow=int(os.getenv('DB_POOL_MAX_OVERFLOW', '10')),
+                        timeout=float(os.getenv('DB_POOL_TIMEOUT', '30')),
+                        health_check_interval=float(os.getenv('DB_POOL_HEALTH_CHECK', '30')),
+                        max_sentencias=int(os.getenv('DB_SENTENCIAS_MAX', '64')),
+                        host=os.getenv('DB_HOST', '127.0.0.1'),
+                        port=os.getenv('DB_PORT', '3306'),
+                        database=os.getenv('DB_NAME', 'salesflow'),
+                        user=os.getenv('DB_USER', 'root'),
+                        password=os.getenv('DB_PASSWORD', '')
+                    )
+        return Database._pool
+
     def get_connection(self):
-        """Obtiene una conexión a la base de datos"""
-        if self._connection is None or not self._connection.is_connected():
+        """Obtiene la conexión asignada al hilo actual"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
             try:
-                self._connection = mysql.connector.connect(
-                    host=os.getenv('DB_HOST', '127.0.0.1'),
-                    port=os.getenv('DB_PORT', '3306'),
-                    database=os.getenv('', 'salesflow'),
-                    user=os.getenv('', 'root'),
-                    password=os.getenv('', '')
-                )
-                print("Conexión a la base de datos establecida exitosamente")
+                conn = self.get_pool().acquire()
             except Error as e:
                 print(f"Error al conectar a la base de datos: {e}")
                 raise
-        return self._connection
-    
-    def close_connection(self):
-        """Cierra la conexión a la base de datos"""
-        if self._connection and self._connection.is_connected():
-            self._connection.close()
-            print("Conexión cerrada")
+            self._local.connection = conn
+        return conn
+
+    def release_connection(self, discard: bool = False):
+        """Devuelve al pool la conexión del hilo actual, si tiene una"""
+        conn = getattr(self._local, 'connection', None)
+        if conn is not None:
+            self._local.connection = None
+            self.get_pool().release(conn, discard=discard)
+
+    @contextmanager
+    def connection(self):
+        """Asigna una conexión al hilo durante un bloque `with`
 
+        Si el hilo ya tenía una conexión, el bloque la reutiliza y no la libera.
+        """
+        propia = getattr(self._local, 'connection', None) is None
+        conn = self.get_connection()
+        try:
+            yield conn
+        finally:
+            if propia:
+                self.release_connection()
+
+    def pool_stats(self) -> dict:
+        """Estadísticas del pool de conexiones"""
+        return self.get_pool().stats()
+
+    def sentencias_stats(self) -> dict:
+        """Estadísticas de las sentencias preparadas de todas las conexiones"""
+        return RegistroSentencias.stats()
+
+    def close_connection(self):
+        """Devuelve la conexión del hilo y cierra las conexiones ociosas"""
+        self.release_connection()
+        if Database._pool is not None:
+            Database._pool.close_all()
+            print("Conexiones cerradas")
@@ -0,0 +1,246 @@
+"""
+Migraciones versionadas del esquema y revisión de los planes de las consultas críticas
+
+Cada archivo `migraciones/NNN_nombre.sql` es una migración; se aplican en
+orden de versión y cada una se registra en `esquema_migraciones` al terminar.
+MySQL confirma implícitamente cada sentencia DDL, así que una migración
+interrumpida no se revierte: sus sentencias deben poder repetirse sin error
+(`CREATE TABLE IF NOT EXISTS`, `INSERT IGNORE`). Crear un índice que ya
+existe con el mismo nombre se ignora, de modo que las bases creadas antes de
+las migraciones pueden ponerse al día con `flask --app app db migrar`.
+
+Con `MIGRAR_AL_INICIAR=1` la aplicación aplica las migraciones pendientes al
+cargarse, antes de atender requests (`migrar_al_iniciar`); si no, una
+escritura que necesita una tabla que aún no existe responde 503.
+"""
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+import logging
+import os
+import re
+from mysql.connector import Error, errorcode
+from database import Database
+from models import Venta, ResumenDiario, CambiosVenta
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+
+SQL_TABLA_MIGRACIONES = """
+    CREATE TABLE IF NOT EXISTS esquema_migraciones (
+        version INT NOT NULL PRIMARY KEY,
+        nombre VARCHAR(255) NOT NULL,
+        aplicada TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# Impide que dos procesos apliquen las mismas migraciones a la vez
+BLOQUEO_MIGRACIONES = 'salesflow_migraciones'
+ESPERA_BLOQUEO = 60
+
+# Con `MIGRAR_AL_INICIAR=1` la aplicación aplica las migraciones al cargarse;
+# por defecto solo se aplican con `db migrar`
+MIGRAR_AL_INICIAR = os.getenv('MIGRAR_AL_INICIAR', '0') == '1'
+
+# Errores que indican que la sentencia ya se había aplicado
+ERRORES_REPETIDOS = (errorcode.ER_DUP_KEYNAME, errorcode.ER_DUP_FIELDNAME)
+
+_ARCHIVO = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+
+class Migracion(NamedTuple):
+    version: int
+    nombre: str
+    ruta: str
+
+
+def listar_migraciones(directorio: str = DIRECTORIO_MIGRACIONES) -> List[Migracion]:
+    """Migraciones del directorio ordenadas por versión; lanza ValueError si una versión se repite"""
+    migraciones = {}
+    for archivo in sorted(os.listdir(directorio)):
+        coincidencia = _ARCHIVO.match(archivo)
+        if not coincidencia:
+            continue
+        version = int(coincidencia.group(1))
+        if version in migraciones:
+            raise ValueError(f"Versión de migración repetida: {version}")
+        migraciones[version] = Migracion(version, coincidencia.group(2), os.path.join(directorio, archivo))
+    return [migraciones[version] for version in sorted(migraciones)]
+
+
+def sentencias(texto: str) -> List[str]:
+    """Divide un script SQL en sentencias, sin los comentarios de línea `--`
+
+    Las sentencias terminan con `;` al final de una línea.
+    """
+    resultado = []
+    actual = []
+    for linea in texto.splitlines():
+        if linea.strip().startswith('--'):
+            continue
+        actual.append(linea)
+        if linea.rstrip().endswith(';'):
+            resultado.append("\n".join(actual).strip().rstrip(';'))
+            actual = []
+    resto = "\n".join(actual).strip()
+    if resto:
+        resultado.append(resto)
+    return [sentencia for sentencia in resultado if sentencia]
+
+
+def versiones_aplicadas(cursor) -> Dict[int, datetime]:
+    """Versiones registradas en `esquema_migraciones` y cuándo se aplicaron"""
+    cursor.execute(SQL_TABLA_MIGRACIONES)
+    cursor.execute("SELECT version, aplicada FROM esquema_migraciones")
+    return {version: aplicada for version, aplicada in cursor.fetchall()}
+
+
+def estado() -> List[Dict]:
+    """Cada migración con su fecha de aplicación, o None si está pendiente"""
+    with Database().connection() as conn:
+        cursor = conn.cursor()
+        aplicadas = versiones_aplicadas(cursor)
+        cursor.close()
+    return [{"version": migracion.version, "nombre": migracion.nombre,
+             "aplicada": aplicadas.get(migracion.version)}
+            for migracion in listar_migraciones()]
+
+
+def _aplicar(cursor, migracion: Migracion):
+    with open(migracion.ruta, encoding='utf-8') as archivo:
+        texto = archivo.read()
+    for sentencia in sentencias(texto):
+        try:
+            cursor.execute(sentencia)
+        except Error as e:
+            if e.errno not in ERRORES_REPETIDOS:
+                raise
+            logger.info("Migración %s: se omite una sentencia ya aplicada (%s)", migracion.version, e.msg)
+
+
+def migrar(hasta: Optional[int] = None,
+           al_aplicar: Optional[Callable[[Migracion], None]] = None) -> List[Migracion]:
+    """Aplica en orden las migraciones pendientes, hasta la versión `hasta` si se indica
+
+    `al_aplicar` se invoca antes de aplicar cada una. Retorna las aplicadas.
+    """
+    aplicadas = []
+    with Database().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (BLOQUEO_MIGRACIONES, ESPERA_BLOQUEO))
+        if not cursor.fetchone()[0]:
+            cursor.close()
+            raise RuntimeError("Otro proceso está aplicando las migraciones")
+        try:
+            registradas = versiones_aplicadas(cursor)
+            for migracion in listar_migraciones():
+                if migracion.version in registradas:
+                    continue
+                if hasta is not None and migracion.version > hasta:
+                    break
+                if al_aplicar:
+                    al_aplicar(migracion)
+                _aplicar(cursor, migracion)
+                cursor.execute("INSERT INTO esquema_migraciones (version, nombre) VALUES (%s, %s)",
+                               (migracion.version, migracion.nombre))
+                conn.commit()
+                aplicadas.append(migracion)
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (BLOQUEO_MIGRACIONES,))
+            cursor.fetchone()
+            cursor.close()
+    return aplicadas
+
+
+def migrar_al_iniciar() -> List[Migracion]:
+    """Aplica las migraciones pendientes si `MIGRAR_AL_INICIAR` está activo; retorna las aplicadas
+
+    Se invoca una vez al cargar la aplicación, antes de atender requests. Los
+    errores se propagan: el proceso no arranca con el esquema a medio migrar.
+    """
+    if not MIGRAR_AL_INICIAR:
+        return []
+    aplicadas = migrar()
+    for migracion in aplicadas:
+        logger.info("Migración aplicada: %03d %s", migracion.version, migracion.nombre)
+    return aplicadas
+
+
+def falta_tabla(error: Exception) -> bool:
+    """Si `error` se debe a una tabla inexistente, es decir, a migraciones sin aplicar"""
+    return isinstance(error, Error) and error.errno == errorcode.ER_NO_SUCH_TABLE
+
+
+# ==================== PLANES DE LAS CONSULTAS CRÍTICAS ====================
+
+# Filas estimadas a partir de las que un recorrido completo se reporta; en
+# tablas pequeñas el optimizador prefiere recorrerlas aunque exista el índice
+PLANES_MIN_FILAS = int(os.getenv('REVISAR_PLANES_MIN_FILAS', '1000'))
+
+
+def consultas_criticas() -> List[Tuple[str, str, tuple]]:
+    """Consultas más frecuentes de `models.py` como (nombre, sql, params)
+
+    Los parámetros son representativos: un cliente, un producto y la última semana.
+    """
+    fin = datetime.now().replace(microsecond=0)
+    inicio = fin - timedelta(days=7)
+    consultas = [
+        ("ventas.pagina", *Venta.sql_pagina(50)),
+        ("ventas.pagina_cliente", *Venta.sql_pagina(50, id_cliente=1)),
+        ("ventas.por_cliente", *Venta.sql_buscar(id_cliente=1)),
+        ("ventas.por_producto", *Venta.sql_buscar(id_producto=1, fecha_inicio=inicio, fecha_fin=fin)),
+        ("ventas.por_fechas", *Venta.sql_buscar(fecha_inicio=inicio, fecha_fin=fin)),
+        ("resumen.agrupado_producto", *ResumenDiario.sql_agrupado('producto', fecha_inicio=inicio,
+                                                                  fecha_fin=fin, limite=10)),
+        ("cambios.desde", *CambiosVenta.sql_desde(0, CambiosVenta.LIMITE)),
+        ("cambios.estado", CambiosVenta.SQL_ESTADO, (CambiosVenta.MARGEN,)),
+    ]
+    for campo in ('cliente', 'producto'):
+        plan = ResumenDiario.plan_metricas(**{f"id_{campo}": 1}, fecha_inicio=inicio - timedelta(hours=12),
+                                           fecha_fin=fin)
+        consultas.extend((f"resumen.metricas_{campo}[{indice}]", sql, params)
+                         for indice, (sql, params) in enumerate(plan))
+    return consultas
+
+
+def revisar_planes(min_filas: int = PLANES_MIN_FILAS) -> List[Dict]:
+    """Ejecuta EXPLAIN sobre cada consulta crítica
+
+    Retorna una fila por tabla de cada plan con `recorrido_completo` en True
+    cuando la tabla se lee entera (`type` ALL) y se estiman al menos
+    `min_filas` filas.
+    """
+    resultado = []
+    with Database().connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        for nombre, sql, params in consultas_criticas():
+            cursor.execute(f"EXPLAIN {sql}", params)
+            for paso in cursor.fetchall():
+                filas = int(paso.get('rows') or 0)
+                resultado.append({
+                    "consulta": nombre,
+                    "tabla": paso.get('table'),
+                    "tipo": paso.get('type'),
+                    "indice": paso.get('key'),
+                    "filas": filas,
+                    "extra": paso.get('Extra'),
+                    "recorrido_completo": paso.get('type') == 'ALL' and filas >= min_filas
+                })
+        cursor.close()
+    return resultado
+
+
+def advertir_planes(min_filas: int = PLANES_MIN_FILAS, pasos: Optional[List[Dict]] = None) -> List[Dict]:
+    """Registra una advertencia por cada recorrido completo; retorna esos pasos del plan
+
+    `pasos` reutiliza el resultado de `revisar_planes` en lugar de volver a consultarlo.
+    """
+    if pasos is None:
+        pasos = revisar_planes(min_filas)
+    completos = [paso for paso in pasos if paso["recorrido_completo"]]
+    for paso in completos:
+        logger.warning("La consulta %s recorre completa la tabla %s (~%s filas); "
+                       "¿faltan migraciones? (flask --app app db migrar)",
+                       paso["consulta"], paso["tabla"], paso["filas"])
+    return completos
@@ -0,0 +1,82 @@
+"""
+Transmisión de cambios de ventas con Server-Sent Events (SSE)
+
+Cada evento `ventas` lleva como `id` el watermark de `CambiosVenta`, de modo
+que al reconectarse el navegador envía `Last-Event-ID` y recibe solo los
+cambios que le faltan. Las escrituras de `Venta` en este proceso despiertan
+la transmisión de inmediato; las de otros procesos se detectan consultando
+`ventas_cambios` cada `SSE_INTERVALO` segundos.
+"""
+import logging
+import os
+import time
+from typing import Dict, Iterator, Optional
+from mysql.connector import Error
+from database import Database
+from models import Venta, CambiosVenta, WatermarkExpirado
+from serializacion import dumps
+
+logger = logging.getLogger(__name__)
+
+SSE_INTERVALO = float(os.getenv('SSE_INTERVALO', '2'))
+SSE_LATIDO = float(os.getenv('SSE_LATIDO', '15'))
+SSE_DURACION = float(os.getenv('SSE_DURACION', '300'))
+SSE_REINTENTO_MS = 3000
+
+
+def evento(tipo: str, datos: Dict, id_evento: Optional[int] = None) -> str:
+    """Formatea un evento SSE con datos JSON"""
+    linea_id = f"id: {id_evento}\n" if id_evento is not None else ""
+    return f"{linea_id}event: {tipo}\ndata: {dumps(datos)}\n\n"
+
+
+def generar_eventos_ventas(since: int, duracion: float = SSE_DURACION) -> Iterator[str]:
+    """Genera eventos con las ventas insertadas, actualizadas o eliminadas después de `since`
+
+    Cada evento `ventas` trae `data` (estado actual de las ventas insertadas o
+    actualizadas) y `eliminadas` (IDs). Si el watermark expiró se envía un
+    evento `recargar` y la transmisión termina. Tras `duracion` segundos la
+    conexión se cierra para liberar el hilo; el navegador se reconecta solo.
+
+    Cada consulta toma una conexión del pool y la devuelve enseguida, sin
+    retenerla entre esperas.
+    """
+    enviados = set()
+    fin = time.monotonic() + duracion
+    ultimo_envio = time.monotonic()
+    yield f"retry: {SSE_REINTENTO_MS}\n\n"
+
+    while time.monotonic() < fin:
+        version = Venta.version_datos()
+        try:
+            with Database().connection():
+                cambios, watermark, hay_mas = CambiosVenta.leer(since)
+                # Los cambios más recientes que el margen se releen hasta que el
+                # watermark los deja atrás; solo se envían la primera vez
+                nuevos = [cambio for cambio in cambios if cambio[0] not in enviados]
+                ids = CambiosVenta.ids_venta(nuevos)
+                ventas = Venta.buscar(ids=ids) if ids else []
+        except WatermarkExpirado as e:
+            yield evento('recargar', {"error": str(e)})
+            return
+        except Error as e:
+            logger.warning("Transmisión de ventas interrumpida: %s", e)
+            return
+
+        if nuevos:
+            enviados.update(id_cambio for id_cambio, _ in nuevos)
+            yield evento('ventas', {
+                "data": ventas,
+                "eliminadas": CambiosVenta.separar(ids, (venta['id_venta'] for venta in ventas))
+            }, watermark)
+            ultimo_envio = time.monotonic()
+        enviados = {id_cambio for id_cambio in enviados if id_cambio > watermark}
+        since = watermark
+        if hay_mas:
+            continue
+
+        if time.monotonic() - ultimo_envio >= SSE_LATIDO:
+            # Comentario SSE: mantiene viva la conexión a través de proxies
+            yield ": latido\n\n"
+            ultimo_envio = time.monotonic()
+        Venta.esperar_cambio(version, min(SSE_INTERVALO, max(fin - time.monotonic(), 0)))
@@ -0,0 +1,36 @@
+"""
+Serialización en streaming de reportes de ventas (CSV y NDJSON)
+"""
+import csv
+import io
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Sequence
+from serializacion import dumps_bytes
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson'
+}
+
+def _valor_csv(valor):
+    """Formatea un valor para una celda CSV"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+def generar_csv(lotes: Iterable[List[Dict]], campos: Sequence[str]) -> Iterator[str]:
+    """Genera el CSV por fragmentos, uno por lote de filas"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(campos)
+    yield buffer.getvalue()
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_valor_csv(fila[campo]) for campo in campos] for fila in lote)
+        yield buffer.getvalue()
+
+def generar_ndjson(lotes: Iterable[List[Dict]]) -> Iterator[bytes]:
+    """Genera NDJSON (un objeto JSON por línea) por fragmentos, uno por lote de filas"""
+    for lote in lotes:
+        yield b''.join(dumps_bytes(fila) + b'\n' for fila in lote)
@@ -0,0 +1,180 @@
+"""
+Generación por lotes de las facturas de un período
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import multiprocessing
+import os
+import re
+import threading
+from builder import FacturaBuilder
+from database import Database
+from models import Venta
+
+DIRECTORIO_FACTURAS = os.getenv('FACTURAS_DIR', 'facturas')
+
+# Construir una factura es trabajo de CPU en Python (Decimal y json.dump), que
+# con hilos no avanza en paralelo por el GIL: los lotes usan procesos, como
+# máximo uno por núcleo
+FACTURAS_WORKERS_MAX = 8
+# Grupos de clientes por proceso: reparten la carga sin pagar el envío entre
+# procesos por cada factura
+GRUPOS_POR_WORKER = 4
+
+_PERIODO_VALIDO = re.compile(r'^\d{8}_\d{8}$')
+_lotes_activos = {}
+_lock = threading.Lock()
+
+def clave_periodo(fecha_inicio: datetime, fecha_fin: datetime) -> str:
+    """Nombre del directorio de salida de un período"""
+    return f"{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}"
+
+def _escribir_json(ruta: str, contenido: Dict):
+    """Escribe un archivo JSON de forma atómica (archivo temporal + renombrado)"""
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(contenido, archivo, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+def _generar_factura_cliente(periodo: str, ventas: List[Dict], ruta: str):
+    """Construye y guarda la factura de un cliente a partir de sus ventas ya obtenidas"""
+    cliente = FacturaBuilder.cliente_de_venta(ventas[0])
+    factura = (FacturaBuilder()
+               .set_numero_factura(f"{periodo}-{cliente['id_cliente']}")
+               .set_cliente(cliente['id_cliente'], cliente)
+               .agregar_items(ventas)
+               .construir())
+    _escribir_json(ruta, factura)
+
+def _generar_grupo(periodo: str, grupo: List[Tuple[int, List[Dict], str]]) -> List[Tuple[int, Optional[str]]]:
+    """Genera las facturas de un grupo de clientes; retorna (id_cliente, error o None) por cada una"""
+    resultados = []
+    for id_cliente, ventas, ruta in grupo:
+        try:
+            _generar_factura_cliente(periodo, ventas, ruta)
+            resultados.append((id_cliente, None))
+        except Exception as e:
+            resultados.append((id_cliente, str(e)))
+    return resultados
+
+def validar_workers(workers) -> int:
+    """Valida el número de procesos de un lote; lanza ValueError si está fuera de rango"""
+    if isinstance(workers, bool) or not isinstance(workers, int) or not 1 <= workers <= FACTURAS_WORKERS_MAX:
+        raise ValueError(f"workers debe ser un entero entre 1 y {FACTURAS_WORKERS_MAX}")
+    return workers
+
+def generar_facturas_periodo(fecha_inicio: datetime, fecha_fin: datetime,
+                             directorio: str = DIRECTORIO_FACTURAS, workers: int = 4,
+                             progreso: Optional[Callable[[Dict], None]] = None) -> Dict:
+    """Genera una factura por cliente con las ventas del período
+    
+    Las ventas se obtienen con una sola consulta y las facturas se construyen
+    en hasta `workers` procesos (no más que núcleos), una por archivo
+    `factura_<id_cliente>.json`. Las facturas que ya existen en el directorio
+    del período se omiten, de modo que un lote interrumpido se reanuda al
+    volver a ejecutarlo. El avance se guarda en `progreso.json` y se notifica
+    a `progreso` tras cada grupo de facturas.
+    """
+    validar_workers(workers)
+    periodo = clave_periodo(fecha_inicio, fecha_fin)
+    salida = os.path.join(directorio, periodo)
+    os.makedirs(salida, exist_ok=True)
+    
+    # Agrupar por cliente las ventas del período, en orden cronológico
+    por_cliente = {}
+    for venta in reversed(Venta.buscar(fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, detalle=True)):
+        por_cliente.setdefault(venta['id_cliente'], []).append(venta)
+    
+    estado = {
+        "periodo": periodo,
+        "fecha_inicio": fecha_inicio.isoformat(),
+        "fecha_fin": fecha_fin.isoformat(),
+        "directorio": salida,
+        "total": len(por_cliente),
+        "generadas": 0,
+        "omitidas": 0,
+        "errores": [],
+        "estado": "en_curso"
+    }
+    pendientes = []
+    for id_cliente, ventas in por_cliente.items():
+        ruta = os.path.join(salida, f"factura_{id_cliente}.json")
+        if os.path.exists(ruta):
+            estado["omitidas"] += 1
+        else:
+            pendientes.append((id_cliente, ventas, ruta))
+    
+    def notificar():
+        estado["actualizado"] = datetime.now().isoformat()
+        _escribir_json(os.path.join(salida, 'progreso.json'), estado)
+        if progreso:
+            progreso(dict(estado))
+    
+    def registrar(resultados: List[Tuple[int, Optional[str]]]):
+        for id_cliente, error in resultados:
+            if error is None:
+                estado["generadas"] += 1
+            else:
+                estado["errores"].append({"id_cliente": id_cliente, "error": error})
+        notificar()
+    
+    notificar()
+    procesos = min(workers, os.cpu_count() or 1, max(len(pendientes), 1))
+    tamano = max(1, -(-len(pendientes) // (procesos * GRUPOS_POR_WORKER)))
+    grupos = [pendientes[inicio:inicio + tamano] for inicio in range(0, len(pendientes), tamano)]
+    if procesos == 1:
+        for grupo in grupos:
+            registrar(_generar_grupo(periodo, grupo))
+    else:
+        # spawn: el lote corre en un hilo de un proceso con otros hilos
+        # (servidor, pool de conexiones), que fork copiaría a medio usar
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as executor:
+            tareas = {executor.submit(_generar_grupo, periodo, grupo): grupo for grupo in grupos}
+            for tarea in as_completed(tareas):
+                try:
+                    registrar(tarea.result())
+                except Exception as e:
+                    registrar([(id_cliente, str(e)) for id_cliente, _, _ in tareas[tarea]])
+    
+    estado["estado"] = "completado_con_errores" if estado["errores"] else "completado"
+    notificar()
+    return estado
+
+def iniciar_lote(fecha_inicio: datetime, fecha_fin: datetime, workers: int = 4) -> bool:
+    """Lanza la generación del período en un hilo de fondo
+    
+    Retorna False si ya hay un lote en curso para el mismo período. Lanza
+    ValueError si `workers` está fuera de rango.
+    """
+    validar_workers(workers)
+    periodo = clave_periodo(fecha_inicio, fecha_fin)
+    with _lock:
+        hilo = _lotes_activos.get(periodo)
+        if hilo is not None and hilo.is_alive():
+            return False
+        
+        def ejecutar():
+            try:
+                with Database().connection():
+                    generar_facturas_periodo(fecha_inicio, fecha_fin, workers=workers)
+            except Exception as e:
+                print(f"Error en el lote de facturas {periodo}: {e}")
+        
+        hilo = threading.Thread(target=ejecutar, name=f"facturas-{periodo}", daemon=True)
+        _lotes_activos[periodo] = hilo
+        hilo.start()
+    return True
+
+def consultar_lote(periodo: str) -> Optional[Dict]:
+    """Lee el progreso guardado de un período; None si no existe"""
+    if not _PERIODO_VALIDO.match(periodo):
+        return None
+    ruta = os.path.join(DIRECTORIO_FACTURAS, periodo, 'progreso.json')
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            return json.load(archivo)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
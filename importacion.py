@@ -0,0 +1,156 @@
+"""
+Importación masiva de ventas históricas desde CSV
+
+El archivo se lee en streaming, fila por fila, y las ventas válidas se
+insertan por lotes con `Venta.create_many`, una transacción por lote, de modo
+que el resumen diario y el registro de cambios quedan al día igual que con la
+API. Los IDs de clientes y los precios de productos se cargan una sola vez al
+comenzar, así que validar una fila no consulta la base de datos.
+"""
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+import csv
+import os
+import time
+from models import Cliente, Producto, Venta
+
+IMPORTACION_LOTE = int(os.getenv('IMPORTACION_LOTE', '5000'))
+IMPORTACION_LOTE_MAXIMO = 50000
+
+COLUMNAS_REQUERIDAS = ('id_cliente', 'id_producto', 'cantidad')
+COLUMNAS_OPCIONALES = ('fecha', 'total')
+
+# Filas rechazadas que se conservan con su detalle; las demás solo se cuentan
+RECHAZOS_DETALLE = 1000
+
+
+class ErrorImportacion(ValueError):
+    """El archivo no se puede importar (por ejemplo, le faltan columnas requeridas)"""
+
+
+def validar_encabezado(columnas: Optional[Sequence[str]]) -> List[str]:
+    """Nombres de columna normalizados; lanza ErrorImportacion si falta alguna requerida"""
+    if not columnas:
+        raise ErrorImportacion("El archivo está vacío")
+    normalizadas = [columna.strip().lower() for columna in columnas]
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in normalizadas]
+    if faltantes:
+        raise ErrorImportacion(f"Faltan columnas requeridas: {', '.join(faltantes)}")
+    return normalizadas
+
+
+def _entero(valor: str, campo: str) -> int:
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{campo} debe ser un entero")
+
+
+def convertir_fila(fila: Dict[str, str], clientes: set, precios: Dict[int, Decimal]) -> tuple:
+    """Valida una fila y la convierte en la tupla de `Venta.create_many`
+
+    Sin `total` se calcula como precio del producto por cantidad; sin `fecha`
+    se usa la fecha actual. Lanza ValueError con el motivo del rechazo.
+    """
+    id_cliente = _entero(fila.get('id_cliente'), 'id_cliente')
+    id_producto = _entero(fila.get('id_producto'), 'id_producto')
+    cantidad = _entero(fila.get('cantidad'), 'cantidad')
+    if cantidad < 1:
+        raise ValueError("cantidad debe ser un entero positivo")
+    if id_cliente not in clientes:
+        raise ValueError("Cliente no encontrado")
+    if id_producto not in precios:
+        raise ValueError("Producto no encontrado")
+
+    total = fila.get('total')
+    if total:
+        try:
+            total = Decimal(total)
+        except InvalidOperation:
+            raise ValueError("total debe ser un número")
+        if not total.is_finite() or total < 0:
+            raise ValueError("total debe ser un número no negativo")
+    else:
+        total = Decimal(str(precios[id_producto])) * cantidad
+
+    fecha = fila.get('fecha')
+    if fecha:
+        try:
+            fecha = datetime.fromisoformat(fecha.strip())
+        except ValueError:
+            raise ValueError("fecha debe estar en formato ISO (AAAA-MM-DD o AAAA-MM-DD HH:MM:SS)")
+    else:
+        fecha = None
+    return id_cliente, id_producto, cantidad, total, fecha
+
+
+def importar_ventas(lineas: Iterable[str], tamano_lote: int = IMPORTACION_LOTE, saltar: int = 0,
+                    rechazada: Optional[Callable[[Dict], None]] = None) -> Iterator[Dict]:
+    """Importa las ventas de un CSV y genera el progreso tras cada lote insertado
+
+    `lineas` puede ser un archivo abierto o cualquier iterable de líneas; se
+    lee a medida que se insertan los lotes. Las primeras `saltar` filas de
+    datos se omiten, para reanudar una importación interrumpida. Cada fila
+    rechazada se pasa a `rechazada` con su número de línea, el motivo y sus
+    valores. El último estado generado tiene `estado` igual a `completado`.
+    Lanza ErrorImportacion si el encabezado no es válido.
+    """
+    if not 1 <= tamano_lote <= IMPORTACION_LOTE_MAXIMO:
+        raise ErrorImportacion(f"El tamaño de lote debe estar entre 1 y {IMPORTACION_LOTE_MAXIMO}")
+    lector = csv.reader(lineas)
+    columnas = validar_encabezado(next(lector, None))
+    clientes = Cliente.ids()
+    precios = Producto.precios()
+
+    inicio = time.perf_counter()
+    estado = {
+        "estado": "en_curso",
+        "leidas": 0,
+        "omitidas": 0,
+        "insertadas": 0,
+        "rechazadas": 0,
+        "lotes": 0,
+        "primer_id": None,
+        "ultimo_id": None,
+        "filas_por_segundo": 0.0
+    }
+
+    def insertar(lote: List[tuple]) -> Dict:
+        ids = Venta.create_many(lote)
+        estado["insertadas"] += len(ids)
+        estado["lotes"] += 1
+        if estado["primer_id"] is None:
+            estado["primer_id"] = ids[0]
+        estado["ultimo_id"] = ids[-1]
+        transcurrido = time.perf_counter() - inicio
+        estado["filas_por_segundo"] = round(estado["leidas"] / transcurrido, 1) if transcurrido else 0.0
+        return dict(estado)
+
+    lote = []
+    for valores in lector:
+        if not valores:
+            continue
+        estado["leidas"] += 1
+        if estado["leidas"] <= saltar:
+            estado["omitidas"] += 1
+            continue
+        fila = dict(zip(columnas, valores))
+        try:
+            lote.append(convertir_fila(fila, clientes, precios))
+        except ValueError as e:
+            estado["rechazadas"] += 1
+            if rechazada:
+                rechazada({"linea": lector.line_num, "error": str(e), "fila": fila})
+            continue
+        if len(lote) >= tamano_lote:
+            yield insertar(lote)
+            lote = []
+    if lote:
+        yield insertar(lote)
+
+    transcurrido = time.perf_counter() - inicio
+    estado["filas_por_segundo"] = round(estado["leidas"] / transcurrido, 1) if transcurrido else 0.0
+    estado["duracion"] = round(transcurrido, 3)
+    estado["estado"] = "completado"
+    yield dict(estado)
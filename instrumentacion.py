@@ -0,0 +1,257 @@
+"""
+Medición de consultas y tiempos por request, y métricas agregadas por endpoint
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+from flask import current_app
+from serializacion import ProveedorJSONRapido
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class PresupuestoConsultasExcedido(RuntimeError):
+    """Un endpoint ejecutó más consultas de las permitidas por su presupuesto"""
+
+
+# ==================== MEDICIÓN POR REQUEST ====================
+
+def iniciar_medicion():
+    """Reinicia los contadores del hilo actual al comenzar un request"""
+    _local.inicio = time.perf_counter()
+    _local.consultas = 0
+    _local.tiempo_bd = 0.0
+    _local.filas = 0
+    _local.tiempos = {}
+    _local.activos = set()
+
+
+def registrar_consulta(duracion: float = 0.0):
+    """Cuenta un viaje de ida y vuelta a la base de datos (consulta o commit)"""
+    _local.consultas = getattr(_local, 'consultas', 0) + 1
+    _local.tiempo_bd = getattr(_local, 'tiempo_bd', 0.0) + duracion
+
+
+def registrar_lectura(filas: int, duracion: float = 0.0):
+    """Suma filas leídas de un cursor y el tiempo dedicado a leerlas"""
+    _local.filas = getattr(_local, 'filas', 0) + filas
+    _local.tiempo_bd = getattr(_local, 'tiempo_bd', 0.0) + duracion
+
+
+def consultas_realizadas() -> int:
+    """Consultas registradas en el hilo actual desde `iniciar_medicion()`"""
+    return getattr(_local, 'consultas', 0)
+
+
+def tiempo_bd() -> float:
+    """Segundos de base de datos registrados en el hilo actual"""
+    return getattr(_local, 'tiempo_bd', 0.0)
+
+
+@contextmanager
+def medir(nombre: str):
+    """Acumula en `nombre` el tiempo propio de un bloque, sin contar la base de datos
+
+    Los bloques anidados con el mismo nombre se cuentan una sola vez.
+    """
+    activos = getattr(_local, 'activos', None)
+    if activos is None:
+        activos = _local.activos = set()
+    if nombre in activos:
+        yield
+        return
+    activos.add(nombre)
+    inicio = time.perf_counter()
+    bd_inicio = tiempo_bd()
+    try:
+        yield
+    finally:
+        activos.discard(nombre)
+        propio = time.perf_counter() - inicio - (tiempo_bd() - bd_inicio)
+        tiempos = getattr(_local, 'tiempos', None)
+        if tiempos is None:
+            tiempos = _local.tiempos = {}
+        tiempos[nombre] = tiempos.get(nombre, 0.0) + propio
+
+
+def resumen_medicion() -> Dict:
+    """Mediciones del request en curso"""
+    inicio = getattr(_local, 'inicio', None)
+    return {
+        "total": time.perf_counter() - inicio if inicio is not None else 0.0,
+        "consultas": consultas_realizadas(),
+        "bd": tiempo_bd(),
+        "filas": getattr(_local, 'filas', 0),
+        "tiempos": dict(getattr(_local, 'tiempos', {}))
+    }
+
+
+def server_timing(medicion: Dict) -> str:
+    """Valor de la cabecera `Server-Timing` (duraciones en milisegundos)"""
+    partes = [f'db;dur={medicion["bd"] * 1000:.2f};desc="{medicion["consultas"]} consultas, {medicion["filas"]} filas"']
+    for nombre, segundos in medicion["tiempos"].items():
+        partes.append(f"{nombre};dur={segundos * 1000:.2f}")
+    partes.append(f"total;dur={medicion['total'] * 1000:.2f}")
+    return ", ".join(partes)
+
+
+class ProveedorJSONMedido(ProveedorJSONRapido):
+    """Proveedor JSON de Flask que registra el tiempo de serialización del request"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with medir('serializacion'):
+            return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        with medir('serializacion'):
+            return super().response(*args, **kwargs)
+
+
+def presupuesto_consultas(maximo: int):
+    """Decorador que limita las consultas que puede ejecutar un endpoint
+
+    Si se excede el límite se registra una advertencia. En modo estricto
+    (`app.config['TESTING']` o `QUERY_BUDGET_STRICT=1`) se lanza
+    `PresupuestoConsultasExcedido`, para que las regresiones fallen en las pruebas.
+    """
+    def decorador(vista):
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            inicio = consultas_realizadas()
+            respuesta = vista(*args, **kwargs)
+            consultas = consultas_realizadas() - inicio
+            if consultas > maximo:
+                mensaje = f"{vista.__name__} ejecutó {consultas} consultas (presupuesto: {maximo})"
+                if current_app.config.get('TESTING') or os.getenv('QUERY_BUDGET_STRICT') == '1':
+                    raise PresupuestoConsultasExcedido(mensaje)
+                logger.warning(mensaje)
+            return respuesta
+        return envoltura
+    return decorador
+
+
+# ==================== MÉTRICAS AGREGADAS ====================
+
+BUCKETS_SEGUNDOS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_FILAS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos, en el formato de Prometheus"""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.conteos = [0] * (len(buckets) + 1)
+        self.suma = 0.0
+
+    def observar(self, valor: float):
+        self.conteos[bisect_left(self.buckets, valor)] += 1
+        self.suma += valor
+
+    def lineas(self, nombre: str, etiquetas: str) -> Iterable[str]:
+        acumulado = 0
+        for limite, conteo in zip(self.buckets, self.conteos):
+            acumulado += conteo
+            yield f'{nombre}_bucket{{{etiquetas},le="{limite}"}} {acumulado}'
+        acumulado += self.conteos[-1]
+        yield f'{nombre}_bucket{{{etiquetas},le="+Inf"}} {acumulado}'
+        yield f'{nombre}_sum{{{etiquetas}}} {self.suma}'
+        yield f'{nombre}_count{{{etiquetas}}} {acumulado}'
+
+
+HISTOGRAMAS = {
+    "salesflow_request_duration_seconds": ("Duración total del request", BUCKETS_SEGUNDOS),
+    "salesflow_request_db_seconds": ("Tiempo en la base de datos por request", BUCKETS_SEGUNDOS),
+    "salesflow_request_queries": ("Consultas a la base de datos por request", BUCKETS_CONSULTAS),
+    "salesflow_request_rows": ("Filas leídas de la base de datos por request", BUCKETS_FILAS),
+    "salesflow_request_builder_seconds": ("Tiempo propio de los builders por request", BUCKETS_SEGUNDOS),
+    "salesflow_request_serialization_seconds": ("Tiempo de serialización JSON por request", BUCKETS_SEGUNDOS),
+}
+
+_lock_metricas = threading.Lock()
+_histogramas: Dict[Tuple[str, str, str], Histograma] = {}
+_requests: Dict[Tuple[str, str, str], int] = {}
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def registrar_request(endpoint: str, metodo: str, estado: int, medicion: Dict):
+    """Agrega las mediciones de un request a las métricas de su endpoint"""
+    valores = {
+        "salesflow_request_duration_seconds": medicion["total"],
+        "salesflow_request_db_seconds": medicion["bd"],
+        "salesflow_request_queries": medicion["consultas"],
+        "salesflow_request_rows": medicion["filas"],
+        "salesflow_request_builder_seconds": medicion["tiempos"].get("builder", 0.0),
+        "salesflow_request_serialization_seconds": medicion["tiempos"].get("serializacion", 0.0),
+    }
+    with _lock_metricas:
+        clave = (endpoint, metodo, str(estado))
+        _requests[clave] = _requests.get(clave, 0) + 1
+        for nombre, valor in valores.items():
+            clave = (nombre, endpoint, metodo)
+            if clave not in _histogramas:
+                _histogramas[clave] = Histograma(HISTOGRAMAS[nombre][1])
+            _histogramas[clave].observar(valor)
+
+
+def indicadores_de(prefijo: str, ayuda: str, stats: Dict[str, float], contadores: Iterable[str],
+                   etiquetas: Optional[Dict[str, str]] = None) -> List[Tuple[str, str, Dict[str, str], float, str]]:
+    """Convierte un diccionario de estadísticas en indicadores para `formato_prometheus`
+
+    Las claves de `contadores` son valores que solo crecen y se publican como
+    `counter` con el sufijo `_total`; las demás, como `gauge`.
+    """
+    contadores = set(contadores)
+    indicadores = []
+    for clave, valor in stats.items():
+        nombre = f"{prefijo}_{clave}"
+        if clave in contadores:
+            if not nombre.endswith('_total'):
+                nombre += '_total'
+            indicadores.append((nombre, ayuda, etiquetas or {}, valor, 'counter'))
+        else:
+            indicadores.append((nombre, ayuda, etiquetas or {}, valor, 'gauge'))
+    return indicadores
+
+
+def formato_prometheus(indicadores: Optional[List[Tuple]] = None) -> str:
+    """Métricas en formato de texto de Prometheus
+
+    `indicadores` agrega valores como tuplas (nombre, ayuda, etiquetas, valor[, tipo]);
+    el tipo es `gauge` si no se indica.
+    """
+    lineas = [
+        "# HELP salesflow_requests_total Requests atendidos",
+        "# TYPE salesflow_requests_total counter",
+    ]
+    with _lock_metricas:
+        for (endpoint, metodo, estado), total in sorted(_requests.items()):
+            lineas.append(f'salesflow_requests_total{{endpoint="{_escapar(endpoint)}",method="{metodo}",'
+                          f'status="{estado}"}} {total}')
+        for nombre, (ayuda, _) in HISTOGRAMAS.items():
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} histogram")
+            for (metrica, endpoint, metodo), histograma in sorted(_histogramas.items()):
+                if metrica == nombre:
+                    lineas.extend(histograma.lineas(nombre, f'endpoint="{_escapar(endpoint)}",method="{metodo}"'))
+
+    declarados = set()
+    for nombre, ayuda, etiquetas, valor, *tipo in sorted(indicadores or [], key=lambda indicador: indicador[0]):
+        if nombre not in declarados:
+            declarados.add(nombre)
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo[0] if tipo else 'gauge'}")
+        texto = ",".join(f'{clave}="{_escapar(v)}"' for clave, v in etiquetas.items())
+        lineas.append(f"{nombre}{{{texto}}} {valor}" if texto else f"{nombre} {valor}")
+    return "\n".join(lineas) + "\n"
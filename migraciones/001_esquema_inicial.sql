@@ -0,0 +1,26 @@
+-- Tablas principales; en una base creada con salesflow.sql no cambian nada
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    correo VARCHAR(100) NOT NULL,
+    telefono VARCHAR(20),
+    direccion VARCHAR(255)
+);
+
+CREATE TABLE IF NOT EXISTS productos (
+    id_producto INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    precio DECIMAL(10, 2) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ventas (
+    id_venta INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    id_cliente INT NOT NULL,
+    id_producto INT NOT NULL,
+    fecha DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    cantidad INT NOT NULL,
+    total DECIMAL(12, 2) NOT NULL,
+    CONSTRAINT fk_ventas_cliente FOREIGN KEY (id_cliente) REFERENCES clientes (id_cliente),
+    CONSTRAINT fk_ventas_producto FOREIGN KEY (id_producto) REFERENCES productos (id_producto)
+);
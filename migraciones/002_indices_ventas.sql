@@ -0,0 +1,8 @@
+-- Listado y paginación por cursor: ORDER BY fecha DESC, id_venta DESC
+CREATE INDEX idx_ventas_fecha_id ON ventas (fecha, id_venta);
+
+-- Ventas de un cliente ordenadas por fecha; también sirve a la clave foránea
+CREATE INDEX idx_ventas_cliente_fecha ON ventas (id_cliente, fecha);
+
+-- Reportes por producto y rango de fechas
+CREATE INDEX idx_ventas_producto_fecha ON ventas (id_producto, fecha);
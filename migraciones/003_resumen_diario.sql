@@ -0,0 +1,18 @@
+-- Resumen diario usado por las métricas y agrupaciones de reportes (models.ResumenDiario)
+CREATE TABLE IF NOT EXISTS ventas_resumen_diario (
+    dia DATE NOT NULL,
+    id_cliente INT NOT NULL,
+    id_producto INT NOT NULL,
+    num_ventas INT NOT NULL DEFAULT 0,
+    cantidad BIGINT NOT NULL DEFAULT 0,
+    monto DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, id_cliente, id_producto),
+    KEY idx_resumen_cliente_dia (id_cliente, dia),
+    KEY idx_resumen_producto_dia (id_producto, dia)
+);
+
+-- Puebla la tabla recién creada; si ya existía con datos, sus filas se conservan
+INSERT IGNORE INTO ventas_resumen_diario (dia, id_cliente, id_producto, num_ventas, cantidad, monto)
+SELECT DATE(fecha), id_cliente, id_producto, COUNT(*), SUM(cantidad), SUM(total)
+FROM ventas
+GROUP BY DATE(fecha), id_cliente, id_producto;
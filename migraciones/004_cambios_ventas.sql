@@ -0,0 +1,8 @@
+-- Registro de cambios para las lecturas incrementales (models.CambiosVenta)
+CREATE TABLE IF NOT EXISTS ventas_cambios (
+    id_cambio BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    id_venta INT NOT NULL,
+    operacion CHAR(1) NOT NULL,
+    fecha TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    KEY idx_cambios_fecha (fecha)
+);
@@ -0,0 +1,9 @@
+-- Versión de los datos de ventas (models.CambiosVenta.version): cada escritura
+-- la incrementa en su propia transacción, así que cambia con cada commit
+-- aunque los commits lleguen en otro orden que sus IDs de ventas_cambios
+CREATE TABLE IF NOT EXISTS ventas_version (
+    id TINYINT NOT NULL PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+INSERT IGNORE INTO ventas_version (id, version) VALUES (1, 0);
@@ -2,77 +2,524 @@
 Modelos de datos para SalesFlow
 """
 from database import Database
-from datetime import datetime
-from typing import Optional, Dict, List
+from cache import TTLCache
+from busqueda import IndiceCatalogo
+from mysql.connector import Error
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from typing import Optional, Dict, List, Set, Tuple
+import base64
+import itertools
+import os
+import threading
+
+def _cache_catalogo() -> TTLCache:
+    """Crea la caché de lectura para un catálogo (clientes o productos)"""
+    return TTLCache(
+        max_entries=int(os.getenv('CACHE_CATALOGO_MAX', '10000')),
+        ttl=float(os.getenv('CACHE_CATALOGO_TTL', '60'))
+    )
+
+def _cache_listado() -> TTLCache:
+    """Caché del listado completo de un catálogo, separada de las filas por ID
+
+    Así el listado no compite en el LRU con las filas individuales: con más
+    filas que `CACHE_CATALOGO_MAX`, precalentarlas lo desalojaría enseguida.
+    """
+    return TTLCache(max_entries=1, ttl=float(os.getenv('CACHE_CATALOGO_TTL', '60')))
+
+def _precalentar_catalogo(cache: TTLCache, filas: List[Dict], campo_id: str):
+    """Guarda cada fila del listado por su ID, si caben todas en la caché"""
+    if len(filas) > cache.max_entries:
+        return
+    for fila in filas:
+        cache.set(fila[campo_id], fila)
+
+def _get_many_catalogo(tabla: str, campo_id: str, ids, cache: TTLCache) -> Dict[int, Dict]:
+    """Obtiene varias filas de un catálogo por ID: las que no están en caché, con una sola consulta IN"""
+    resultado = {}
+    faltantes = []
+    for id_fila in set(ids):
+        encontrado, fila = cache.get(id_fila)
+        if encontrado:
+            resultado[id_fila] = dict(fila)
+        else:
+            faltantes.append(id_fila)
+    if faltantes:
+        marcadores = ", ".join(["%s"] * len(faltantes))
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"SELECT * FROM {tabla} WHERE {campo_id} IN ({marcadores})", tuple(faltantes))
+        for fila in cursor.fetchall():
+            cache.set(fila[campo_id], fila)
+            resultado[fila[campo_id]] = dict(fila)
+        cursor.close()
+    return resultado
+
+def valores_por_columna(filas: List[tuple], num_columnas: int) -> List[list]:
+    """Transpone filas leídas como tuplas a una lista de valores por columna"""
+    if not filas:
+        return [[] for _ in range(num_columnas)]
+    return [list(columna) for columna in zip(*filas)]
+
+def _catalogo_desde(tabla: str, campo_id: str, desde: int, limite: int) -> List[Dict]:
+    """Hasta `limite` filas de un catálogo con ID mayor que `desde`, para refrescar su índice de búsqueda"""
+    db = Database()
+    conn = db.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"SELECT * FROM {tabla} WHERE {campo_id} > %s ORDER BY {campo_id} LIMIT %s", (desde, limite))
+    filas = cursor.fetchall()
+    cursor.close()
+    return filas
 
 class Cliente:
-    """Modelo para la entidad Cliente"""
+    """Modelo para la entidad Cliente
+    
+    Las lecturas pasan por una caché en memoria con TTL; quien modifique
+    clientes fuera de esta clase debe llamar a `Cliente.invalidar()`.
+    """
+    
+    _cache = _cache_catalogo()
+    _cache_todos = _cache_listado()
+    SQL_TODOS = "SELECT * FROM clientes ORDER BY id_cliente"
+    SQL_POR_ID = "SELECT * FROM clientes WHERE id_cliente = %s"
+    
+    _indice = IndiceCatalogo('id_cliente', ('nombre', 'correo'))
     
     @staticmethod
     def get_all():
         """Obtiene todos los clientes"""
-        db = Database()
-        conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM clientes ORDER BY id_cliente")
-        clientes = cursor.fetchall()
-        cursor.close()
-        return clientes
+        encontrado, clientes = Cliente._cache_todos.get('todos')
+        if not encontrado:
+            db = Database()
+            conn = db.get_connection()
+            cursor = conn.cursor_preparado(Cliente.SQL_TODOS, dictionary=True)
+            cursor.execute(Cliente.SQL_TODOS)
+            clientes = cursor.fetchall()
+            cursor.close()
+            Cliente._cache_todos.set('todos', clientes)
+            _precalentar_catalogo(Cliente._cache, clientes, 'id_cliente')
+        return [dict(cliente) for cliente in clientes]
     
     @staticmethod
     def get_by_id(id_cliente: int):
         """Obtiene un cliente por ID"""
+        encontrado, cliente = Cliente._cache.get(id_cliente)
+        if not encontrado:
+            db = Database()
+            conn = db.get_connection()
+            cursor = conn.cursor_preparado(Cliente.SQL_POR_ID, dictionary=True)
+            cursor.execute(Cliente.SQL_POR_ID, (id_cliente,))
+            cliente = cursor.fetchone()
+            cursor.close()
+            if cliente is None:
+                return None
+            Cliente._cache.set(id_cliente, cliente)
+        return dict(cliente)
+    
+    @staticmethod
+    def get_many(ids: List[int]) -> Dict[int, Dict]:
+        """Obtiene varios clientes por ID; retorna un diccionario con los que existen"""
+        return _get_many_catalogo('clientes', 'id_cliente', ids, Cliente._cache)
+    
+    @staticmethod
+    def ids() -> Set[int]:
+        """IDs de todos los clientes, sin leer el resto de sus columnas"""
         db = Database()
         conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM clientes WHERE id_cliente = %s", (id_cliente,))
-        cliente = cursor.fetchone()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_cliente FROM clientes")
+        ids = {id_cliente for id_cliente, in cursor.fetchall()}
         cursor.close()
-        return cliente
+        return ids
+    
+    @staticmethod
+    def buscar(texto: str, limite: int = 10) -> List[Dict]:
+        """Busca clientes por prefijos de palabras de su nombre o correo, con el índice en memoria"""
+        Cliente._indice.refrescar(
+            Cliente.get_all,
+            lambda desde, limite: _catalogo_desde('clientes', 'id_cliente', desde, limite),
+            Cliente.get_many
+        )
+        return Cliente._indice.buscar(texto, limite)
+    
+    @staticmethod
+    def invalidar(id_cliente: Optional[int] = None):
+        """Descarta de la caché un cliente, o todos si no se indica ID
+        
+        El índice de búsqueda vuelve a leerlo (o se reconstruye) en su próximo refresco.
+        """
+        if id_cliente is None:
+            Cliente._cache.clear()
+        else:
+            Cliente._cache.invalidate(id_cliente)
+        Cliente._cache_todos.clear()
+        Cliente._indice.marcar(id_cliente)
+    
+    @staticmethod
+    def cache_stats(listado: bool = False) -> Dict:
+        """Estadísticas de la caché de clientes por ID, o de la del listado completo"""
+        return (Cliente._cache_todos if listado else Cliente._cache).stats()
 
 class Producto:
-    """Modelo para la entidad Producto"""
+    """Modelo para la entidad Producto
+    
+    Las lecturas pasan por una caché en memoria con TTL; quien modifique
+    productos fuera de esta clase debe llamar a `Producto.invalidar()`.
+    """
+    
+    _cache = _cache_catalogo()
+    _cache_todos = _cache_listado()
+    SQL_TODOS = "SELECT * FROM productos ORDER BY id_producto"
+    SQL_POR_ID = "SELECT * FROM productos WHERE id_producto = %s"
+    
+    _indice = IndiceCatalogo('id_producto', ('nombre', 'descripcion'))
     
     @staticmethod
     def get_all():
         """Obtiene todos los productos"""
-        db = Database()
-        conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM productos ORDER BY id_producto")
-        productos = cursor.fetchall()
-        cursor.close()
-        return productos
+        encontrado, productos = Producto._cache_todos.get('todos')
+        if not encontrado:
+            db = Database()
+            conn = db.get_connection()
+            cursor = conn.cursor_preparado(Producto.SQL_TODOS, dictionary=True)
+            cursor.execute(Producto.SQL_TODOS)
+            productos = cursor.fetchall()
+            cursor.close()
+            Producto._cache_todos.set('todos', productos)
+            _precalentar_catalogo(Producto._cache, productos, 'id_producto')
+        return [dict(producto) for producto in productos]
     
     @staticmethod
     def get_by_id(id_producto: int):
         """Obtiene un producto por ID"""
+        encontrado, producto = Producto._cache.get(id_producto)
+        if not encontrado:
+            db = Database()
+            conn = db.get_connection()
+            cursor = conn.cursor_preparado(Producto.SQL_POR_ID, dictionary=True)
+            cursor.execute(Producto.SQL_POR_ID, (id_producto,))
+            producto = cursor.fetchone()
+            cursor.close()
+            if producto is None:
+                return None
+            Producto._cache.set(id_producto, producto)
+        return dict(producto)
+    
+    @staticmethod
+    def get_many(ids: List[int]) -> Dict[int, Dict]:
+        """Obtiene varios productos por ID; retorna un diccionario con los que existen"""
+        return _get_many_catalogo('productos', 'id_producto', ids, Producto._cache)
+    
+    @staticmethod
+    def precios() -> Dict[int, Decimal]:
+        """Precio de cada producto por ID, sin leer el resto de sus columnas"""
         db = Database()
         conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM productos WHERE id_producto = %s", (id_producto,))
-        producto = cursor.fetchone()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id_producto, precio FROM productos")
+        precios = dict(cursor.fetchall())
         cursor.close()
-        return producto
+        return precios
+    
+    @staticmethod
+    def buscar(texto: str, limite: int = 10) -> List[Dict]:
+        """Busca productos por prefijos de palabras de su nombre o descripción, con el índice en memoria"""
+        Producto._indice.refrescar(
+            Producto.get_all,
+            lambda desde, limite: _catalogo_desde('productos', 'id_producto', desde, limite),
+            Producto.get_many
+        )
+        return Producto._indice.buscar(texto, limite)
+    
+    @staticmethod
+    def invalidar(id_producto: Optional[int] = None):
+        """Descarta de la caché un producto, o todos si no se indica ID
+        
+        El índice de búsqueda vuelve a leerlo (o se reconstruye) en su próximo refresco.
+        """
+        if id_producto is None:
+            Producto._cache.clear()
+        else:
+            Producto._cache.invalidate(id_producto)
+        Producto._cache_todos.clear()
+        Producto._indice.marcar(id_producto)
+    
+    @staticmethod
+    def cache_stats(listado: bool = False) -> Dict:
+        """Estadísticas de la caché de productos por ID, o de la del listado completo"""
+        return (Producto._cache_todos if listado else Producto._cache).stats()
 
 class Venta:
     """Modelo para la entidad Venta"""
     
+    COLUMNAS = """v.id_venta, v.id_cliente, v.id_producto, v.fecha, v.cantidad, v.total,
+                   c.nombre as cliente_nombre, c.correo as cliente_correo,
+                   p.nombre as producto_nombre, p.precio as producto_precio"""
+    
+    COLUMNAS_DETALLE = """v.id_venta, v.id_cliente, v.id_producto, v.fecha, v.cantidad, v.total,
+                   c.nombre as cliente_nombre, c.correo as cliente_correo, c.telefono as cliente_telefono,
+                   c.direccion as cliente_direccion,
+                   p.nombre as producto_nombre, p.descripcion as producto_descripcion, 
+                   p.precio as producto_precio"""
+    
+    CAMPOS = ('id_venta', 'id_cliente', 'id_producto', 'fecha', 'cantidad', 'total',
+              'cliente_nombre', 'cliente_correo', 'producto_nombre', 'producto_precio')
+    
+    JOINS = """FROM ventas v
+            INNER JOIN clientes c ON v.id_cliente = c.id_cliente
+            INNER JOIN productos p ON v.id_producto = p.id_producto"""
+    
+    SQL_POR_ID = f"SELECT {COLUMNAS_DETALLE} {JOINS} WHERE v.id_venta = %s"
+    SQL_TODAS = f"SELECT {COLUMNAS} {JOINS} ORDER BY v.fecha DESC"
+    SQL_POR_CLIENTE = f"SELECT {COLUMNAS} {JOINS} WHERE v.id_cliente = %s ORDER BY v.fecha DESC"
+    
+    _version = 0
+    _versiones = itertools.count(1)
+    _aviso = threading.Condition()
+    
+    @staticmethod
+    def version_datos() -> int:
+        """Versión de las ventas en este proceso; cambia tras cada escritura confirmada de `Venta`"""
+        return Venta._version
+    
+    @staticmethod
+    def _nueva_version():
+        with Venta._aviso:
+            Venta._version = next(Venta._versiones)
+            Venta._aviso.notify_all()
+    
+    @staticmethod
+    def esperar_cambio(version: int, timeout: float) -> bool:
+        """Espera hasta `timeout` segundos a que la versión deje de ser `version`
+        
+        Retorna True si hubo una escritura en este proceso; las de otros
+        procesos solo se ven consultando `CambiosVenta` al vencer la espera.
+        """
+        with Venta._aviso:
+            return Venta._aviso.wait_for(lambda: Venta._version != version, timeout)
+    
+    @staticmethod
+    def construir_filtros(id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+                          fecha_inicio: Optional[datetime] = None,
+                          fecha_fin: Optional[datetime] = None, alias: str = 'v',
+                          ids: Optional[List[int]] = None) -> Tuple[str, tuple]:
+        """Compone la cláusula WHERE parametrizada para los filtros de ventas"""
+        condiciones = []
+        params = []
+        if ids is not None:
+            condiciones.append(f"{alias}.id_venta IN ({', '.join(['%s'] * len(ids))})")
+            params.extend(ids)
+        if id_cliente is not None:
+            condiciones.append(f"{alias}.id_cliente = %s")
+            params.append(id_cliente)
+        if id_producto is not None:
+            condiciones.append(f"{alias}.id_producto = %s")
+            params.append(id_producto)
+        if fecha_inicio is not None:
+            condiciones.append(f"{alias}.fecha >= %s")
+            params.append(fecha_inicio)
+        if fecha_fin is not None:
+            condiciones.append(f"{alias}.fecha <= %s")
+            params.append(fecha_fin)
+        where = " WHERE " + " AND ".join(condiciones) if condiciones else ""
+        return where, tuple(params)
+    
+    @staticmethod
+    def buscar(id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+               fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None,
+               detalle: bool = False, ids: Optional[List[int]] = None, limite: Optional[int] = None):
+        """Obtiene las ventas que cumplen los filtros en una sola consulta
+        
+        Con `detalle` incluye los mismos datos de cliente y producto que `get_by_id`;
+        con `ids`, solo las ventas de esos IDs; con `limite`, solo las más recientes.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(*Venta.sql_buscar(id_cliente, id_producto, fecha_inicio, fecha_fin, detalle, ids, limite))
+        ventas = cursor.fetchall()
+        cursor.close()
+        return ventas
+    
+    @staticmethod
+    def buscar_columnar(id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+                        fecha_inicio: Optional[datetime] = None,
+                        fecha_fin: Optional[datetime] = None,
+                        ids: Optional[List[int]] = None) -> List[list]:
+        """Como `buscar`, pero retorna una lista de valores por cada columna de `CAMPOS`
+        
+        Lee las filas como tuplas, sin crear un diccionario por fila.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(*Venta.sql_buscar(id_cliente, id_producto, fecha_inicio, fecha_fin, ids=ids))
+        filas = cursor.fetchall()
+        cursor.close()
+        return valores_por_columna(filas, len(Venta.CAMPOS))
+    
+    @staticmethod
+    def sql_buscar(id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+                   fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None,
+                   detalle: bool = False, ids: Optional[List[int]] = None,
+                   limite: Optional[int] = None) -> Tuple[str, tuple]:
+        """Consulta y parámetros de `buscar`"""
+        where, params = Venta.construir_filtros(id_cliente, id_producto, fecha_inicio, fecha_fin, ids=ids)
+        columnas = Venta.COLUMNAS_DETALLE if detalle else Venta.COLUMNAS
+        sql = f"SELECT {columnas} {Venta.JOINS}{where} ORDER BY v.fecha DESC"
+        if limite is not None:
+            sql += " LIMIT %s"
+            params = (*params, limite)
+        return sql, params
+    
+    @staticmethod
+    def iterar_lotes(tamano_lote: int = 1000, id_cliente: Optional[int] = None,
+                     id_producto: Optional[int] = None, fecha_inicio: Optional[datetime] = None,
+                     fecha_fin: Optional[datetime] = None):
+        """Recorre las ventas filtradas en lotes sin cargar el resultado completo
+        
+        Usa una conexión dedicada del pool y un cursor sin búfer, de modo que
+        las filas se leen del servidor a medida que se consumen los lotes. Si el
+        consumidor abandona el recorrido, la conexión se descarta en lugar de
+        devolverla al pool con resultados pendientes.
+        """
+        sql, params = Venta.sql_buscar(id_cliente, id_producto, fecha_inicio, fecha_fin)
+        pool = Database().get_pool()
+        conn = pool.acquire()
+        completo = False
+        try:
+            cursor = conn.cursor(dictionary=True, buffered=False)
+            cursor.execute(sql, params)
+            while True:
+                lote = cursor.fetchmany(tamano_lote)
+                if not lote:
+                    break
+                yield lote
+            cursor.close()
+            completo = True
+        finally:
+            pool.release(conn, discard=not completo)
+    
+    @staticmethod
+    def codificar_cursor(fecha: datetime, id_venta: int) -> str:
+        """Codifica la posición (fecha, id_venta) de una venta como cursor opaco"""
+        valor = f"{fecha.isoformat()}|{id_venta}".encode()
+        return base64.urlsafe_b64encode(valor).decode().rstrip('=')
+    
     @staticmethod
-    def create(id_cliente: int, id_producto: int, cantidad: int, total: float):
-        """Crea una nueva venta"""
+    def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+        """Decodifica un cursor de paginación; lanza ValueError si no es válido"""
+        try:
+            valor = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+            fecha, id_venta = valor.split('|')
+            return datetime.fromisoformat(fecha), int(id_venta)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Cursor de paginación inválido") from e
+    
+    @staticmethod
+    def paginar(limite: int, cursor: Optional[str] = None,
+                id_cliente: Optional[int] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Obtiene una página de ventas ordenada por fecha descendente
+        
+        Usa paginación por clave (keyset): en lugar de OFFSET, busca las ventas
+        posteriores al cursor sobre el índice (fecha, id_venta), de modo que el
+        costo de cada página no depende de su posición. Retorna las ventas y el
+        cursor de la página siguiente, o None si no hay más.
+        """
+        db = Database()
+        conn = db.get_connection()
+        sql, params = Venta.sql_pagina(limite, cursor, id_cliente)
+        # sql_pagina solo produce cuatro textos distintos: se preparan una vez por conexión
+        cursor_db = conn.cursor_preparado(sql, dictionary=True)
+        cursor_db.execute(sql, params)
+        ventas = cursor_db.fetchall()
+        cursor_db.close()
+        return Venta.cortar_pagina(ventas, limite)
+    
+    @staticmethod
+    def sql_pagina(limite: int, cursor: Optional[str] = None,
+                   id_cliente: Optional[int] = None) -> Tuple[str, tuple]:
+        """Consulta y parámetros de `paginar`; pide una fila de más para saber si hay otra página"""
+        where, params = Venta.construir_filtros(id_cliente=id_cliente)
+        if cursor:
+            fecha, id_venta = Venta.decodificar_cursor(cursor)
+            busqueda = "(v.fecha < %s OR (v.fecha = %s AND v.id_venta < %s))"
+            where = f"{where} AND {busqueda}" if where else f" WHERE {busqueda}"
+            params += (fecha, fecha, id_venta)
+        sql = f"SELECT {Venta.COLUMNAS} {Venta.JOINS}{where} ORDER BY v.fecha DESC, v.id_venta DESC LIMIT %s"
+        return sql, params + (limite + 1,)
+    
+    @staticmethod
+    def cortar_pagina(ventas: List[Dict], limite: int) -> Tuple[List[Dict], Optional[str]]:
+        """Recorta el resultado de `sql_pagina` y calcula el cursor de la página siguiente"""
+        siguiente = None
+        if len(ventas) > limite:
+            ventas = ventas[:limite]
+            siguiente = Venta.codificar_cursor(ventas[-1]['fecha'], ventas[-1]['id_venta'])
+        return ventas, siguiente
+    
+    @staticmethod
+    def create(id_cliente: int, id_producto: int, cantidad: int, total: float,
+               fecha: Optional[datetime] = None) -> Tuple[int, datetime]:
+        """Crea una nueva venta; retorna su ID y la fecha guardada
+        
+        Si no se indica la `fecha`, se usa la hora actual del servidor de base
+        de datos, que se lee de la fila insertada dentro de la misma transacción.
+        """
         db = Database()
         conn = db.get_connection()
         cursor = conn.cursor()
         try:
             cursor.execute(
-                "INSERT INTO ventas (id_cliente, id_producto, cantidad, total, fecha) VALUES (%s, %s, %s, %s, NOW())",
-                (id_cliente, id_producto, cantidad, total)
+                "INSERT INTO ventas (id_cliente, id_producto, cantidad, total, fecha) VALUES (%s, %s, %s, %s, COALESCE(%s, NOW()))",
+                (id_cliente, id_producto, cantidad, total, fecha)
             )
-            conn.commit()
             venta_id = cursor.lastrowid
+            if fecha is None:
+                cursor.execute("SELECT fecha FROM ventas WHERE id_venta = %s", (venta_id,))
+                fecha, = cursor.fetchone()
+            ResumenDiario.aplicar(cursor, venta_id, venta_id, 1)
+            CambiosVenta.registrar(cursor, [venta_id], CambiosVenta.INSERCION)
+            conn.commit()
+            Venta._nueva_version()
             cursor.close()
-            return venta_id
+            return venta_id, fecha
+        except Error as e:
+            conn.rollback()
+            cursor.close()
+            raise e
+    
+    @staticmethod
+    def create_many(ventas: List[tuple]) -> List[int]:
+        """Crea varias ventas (id_cliente, id_producto, cantidad, total[, fecha]) en una sola transacción
+        
+        Las ventas sin fecha, o con fecha None, se registran con la fecha actual.
+        Retorna los IDs asignados, en el mismo orden de entrada.
+        """
+        if not ventas:
+            return []
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        try:
+            # executemany envía un único INSERT de varias filas; InnoDB asigna a
+            # sus filas IDs seguidos, separados por @@auto_increment_increment
+            paso = conn.incremento_autoincremento()
+            cursor.executemany(
+                "INSERT INTO ventas (id_cliente, id_producto, cantidad, total, fecha) "
+                "VALUES (%s, %s, %s, %s, COALESCE(%s, NOW()))",
+                [venta if len(venta) == 5 else (*venta, None) for venta in ventas]
+            )
+            primer_id = cursor.lastrowid
+            ids = list(range(primer_id, primer_id + len(ventas) * paso, paso))
+            ResumenDiario.aplicar(cursor, primer_id, ids[-1], 1, paso)
+            CambiosVenta.registrar(cursor, ids, CambiosVenta.INSERCION)
+            conn.commit()
+            Venta._nueva_version()
+            cursor.close()
+            return ids
         except Error as e:
             conn.rollback()
             cursor.close()
@@ -83,16 +530,8 @@ class Venta:
         """Obtiene todas las ventas con información de cliente y producto"""
         db = Database()
         conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT v.id_venta, v.id_cliente, v.id_producto, v.fecha, v.cantidad, v.total,
-                   c.nombre as cliente_nombre, c.correo as cliente_correo,
-                   p.nombre as producto_nombre, p.precio as producto_precio
-            FROM ventas v
-            INNER JOIN clientes c ON v.id_cliente = c.id_cliente
-            INNER JOIN productos p ON v.id_producto = p.id_producto
-            ORDER BY v.fecha DESC
-        """)
+        cursor = conn.cursor_preparado(Venta.SQL_TODAS, dictionary=True)
+        cursor.execute(Venta.SQL_TODAS)
         ventas = cursor.fetchall()
         cursor.close()
         return ventas
@@ -102,54 +541,88 @@ class Venta:
         """Obtiene una venta por ID con información relacionada"""
         db = Database()
         conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT v.id_venta, v.id_cliente, v.id_producto, v.fecha, v.cantidad, v.total,
-                   c.nombre as cliente_nombre, c.correo as cliente_correo, c.telefono as cliente_telefono,
-                   c.direccion as cliente_direccion,
-                   p.nombre as producto_nombre, p.descripcion as producto_descripcion, 
-                   p.precio as producto_precio
-            FROM ventas v
-            INNER JOIN clientes c ON v.id_cliente = c.id_cliente
-            INNER JOIN productos p ON v.id_producto = p.id_producto
-            WHERE v.id_venta = %s
-        """, (id_venta,))
+        cursor = conn.cursor_preparado(Venta.SQL_POR_ID, dictionary=True)
+        cursor.execute(Venta.SQL_POR_ID, (id_venta,))
         venta = cursor.fetchone()
         cursor.close()
         return venta
     
+    @staticmethod
+    def fila_detalle(id_venta: int, fecha: datetime, cantidad: int, total,
+                     cliente: Dict, producto: Dict) -> Dict:
+        """Compone, con datos ya disponibles, la misma fila que retorna `get_by_id`"""
+        return {
+            "id_venta": id_venta,
+            "id_cliente": cliente['id_cliente'],
+            "id_producto": producto['id_producto'],
+            "fecha": fecha,
+            "cantidad": cantidad,
+            "total": total,
+            "cliente_nombre": cliente['nombre'],
+            "cliente_correo": cliente['correo'],
+            "cliente_telefono": cliente.get('telefono'),
+            "cliente_direccion": cliente.get('direccion'),
+            "producto_nombre": producto['nombre'],
+            "producto_descripcion": producto.get('descripcion'),
+            "producto_precio": producto['precio']
+        }
+    
+    @staticmethod
+    def get_many(ids: List[int]) -> List[Dict]:
+        """Obtiene varias ventas por ID, con la información de `get_by_id`, en una sola consulta"""
+        if not ids:
+            return []
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(*Venta.sql_get_many(ids))
+        ventas = cursor.fetchall()
+        cursor.close()
+        return ventas
+    
+    @staticmethod
+    def sql_get_many(ids: List[int]) -> Tuple[str, tuple]:
+        """Consulta y parámetros de `get_many`"""
+        marcadores = ", ".join(["%s"] * len(ids))
+        sql = f"SELECT {Venta.COLUMNAS_DETALLE} {Venta.JOINS} WHERE v.id_venta IN ({marcadores}) ORDER BY v.fecha, v.id_venta"
+        return sql, tuple(ids)
+    
     @staticmethod
     def get_by_cliente(id_cliente: int):
         """Obtiene todas las ventas de un cliente"""
         db = Database()
         conn = db.get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT v.id_venta, v.id_cliente, v.id_producto, v.fecha, v.cantidad, v.total,
-                   c.nombre as cliente_nombre, c.correo as cliente_correo,
-                   p.nombre as producto_nombre, p.precio as producto_precio
-            FROM ventas v
-            INNER JOIN clientes c ON v.id_cliente = c.id_cliente
-            INNER JOIN productos p ON v.id_producto = p.id_producto
-            WHERE v.id_cliente = %s
-            ORDER BY v.fecha DESC
-        """, (id_cliente,))
+        cursor = conn.cursor_preparado(Venta.SQL_POR_CLIENTE, dictionary=True)
+        cursor.execute(Venta.SQL_POR_CLIENTE, (id_cliente,))
         ventas = cursor.fetchall()
         cursor.close()
         return ventas
     
     @staticmethod
     def update(id_venta: int, id_cliente: int, id_producto: int, cantidad: int, total: float):
-        """Actualiza una venta existente"""
+        """Actualiza una venta; retorna False si no existía
+        
+        La fila se bloquea antes de escribir, de modo que una eliminación
+        concurrente no deja registrado un cambio de una venta que ya no existe.
+        """
         db = Database()
         conn = db.get_connection()
         cursor = conn.cursor()
         try:
+            cursor.execute("SELECT id_venta FROM ventas WHERE id_venta = %s FOR UPDATE", (id_venta,))
+            if cursor.fetchone() is None:
+                conn.rollback()
+                cursor.close()
+                return False
+            ResumenDiario.aplicar(cursor, id_venta, id_venta, -1)
             cursor.execute(
                 "UPDATE ventas SET id_cliente = %s, id_producto = %s, cantidad = %s, total = %s WHERE id_venta = %s",
                 (id_cliente, id_producto, cantidad, total, id_venta)
             )
+            ResumenDiario.aplicar(cursor, id_venta, id_venta, 1)
+            CambiosVenta.registrar(cursor, [id_venta], CambiosVenta.ACTUALIZACION)
             conn.commit()
+            Venta._nueva_version()
             cursor.close()
             return True
         except Error as e:
@@ -159,17 +632,443 @@ class Venta:
     
     @staticmethod
     def delete(id_venta: int):
-        """Elimina una venta"""
+        """Elimina una venta; retorna False si no existía"""
         db = Database()
         conn = db.get_connection()
         cursor = conn.cursor()
         try:
+            ResumenDiario.aplicar(cursor, id_venta, id_venta, -1)
             cursor.execute("DELETE FROM ventas WHERE id_venta = %s", (id_venta,))
+            eliminada = cursor.rowcount > 0
+            if eliminada:
+                CambiosVenta.registrar(cursor, [id_venta], CambiosVenta.ELIMINACION)
             conn.commit()
+            if eliminada:
+                Venta._nueva_version()
             cursor.close()
-            return True
+            return eliminada
         except Error as e:
             conn.rollback()
             cursor.close()
             raise e
 
+class WatermarkExpirado(Exception):
+    """El watermark es anterior a los cambios conservados; hay que recargar los datos completos"""
+
+class CambiosVenta:
+    """Registro de cambios de `ventas` para lecturas incrementales
+    
+    Cada escritura de `Venta` agrega, dentro de la misma transacción, una fila
+    por venta insertada (I), actualizada (U) o eliminada (D). El watermark que
+    reciben los clientes es un `id_cambio`: con él se piden solo las ventas
+    modificadas desde entonces.
+    
+    Los IDs se asignan al insertar y no al confirmar, así que una transacción
+    lenta puede hacer visible un cambio con ID menor que otro ya leído. Por eso
+    el watermark nunca avanza más allá del último cambio con al menos
+    `CAMBIOS_MARGEN` segundos de antigüedad: los cambios más recientes se
+    entregan, pero se vuelven a entregar en la siguiente lectura.
+    """
+    
+    SQL_ESTADO = """
+        SELECT (SELECT MIN(id_cambio) FROM ventas_cambios) AS minimo,
+               (SELECT id_cambio FROM ventas_cambios
+                WHERE fecha < NOW() - INTERVAL %s SECOND
+                ORDER BY fecha DESC, id_cambio DESC LIMIT 1) AS seguro
+    """
+    
+    SQL_VERSION = "SELECT version FROM ventas_version WHERE id = 1"
+    SQL_AVANZAR_VERSION = "UPDATE ventas_version SET version = version + 1 WHERE id = 1"
+    
+    INSERCION = 'I'
+    ACTUALIZACION = 'U'
+    ELIMINACION = 'D'
+    
+    MARGEN = int(os.getenv('CAMBIOS_MARGEN', '5'))
+    LIMITE = 10000
+    
+    @staticmethod
+    def registrar(cursor, ids: List[int], operacion: str):
+        """Agrega un cambio por venta con el cursor de la transacción que las modifica
+        
+        También avanza la versión de `ventas_version`; la fila queda bloqueada
+        hasta el commit, así que las escrituras concurrentes la incrementan de
+        a una y ninguna versión se repite.
+        """
+        cursor.executemany(
+            "INSERT INTO ventas_cambios (id_venta, operacion) VALUES (%s, %s)",
+            [(id_venta, operacion) for id_venta in ids]
+        )
+        cursor.execute(CambiosVenta.SQL_AVANZAR_VERSION)
+    
+    @staticmethod
+    def watermark_seguro(estado: Tuple[Optional[int], Optional[int]]) -> int:
+        """Watermark a partir del resultado de `SQL_ESTADO` (mínimo conservado, último cambio antiguo)"""
+        minimo, seguro = estado
+        if seguro is not None:
+            return int(seguro)
+        return int(minimo) - 1 if minimo is not None else 0
+    
+    @staticmethod
+    def watermark() -> int:
+        """Watermark desde el que un cliente que carga los datos completos puede pedir cambios
+        
+        Debe leerse antes que los datos, para que ningún cambio quede entre ambos.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor_preparado(CambiosVenta.SQL_ESTADO)
+        cursor.execute(CambiosVenta.SQL_ESTADO, (CambiosVenta.MARGEN,))
+        estado = cursor.fetchone()
+        cursor.close()
+        return CambiosVenta.watermark_seguro(estado)
+    
+    @staticmethod
+    def version() -> int:
+        """Versión de las ventas; cambia con cada escritura confirmada, de cualquier proceso
+        
+        A diferencia del último `id_cambio`, no se la salta un commit que
+        llega después de otro con un ID mayor.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor_preparado(CambiosVenta.SQL_VERSION)
+        cursor.execute(CambiosVenta.SQL_VERSION)
+        fila = cursor.fetchone()
+        cursor.close()
+        return int(fila[0]) if fila else 0
+    
+    @staticmethod
+    def sql_desde(since: int, limite: int) -> Tuple[str, tuple]:
+        """Consulta de los cambios posteriores a `since`; pide uno de más para saber si hay otros"""
+        return ("SELECT id_cambio, id_venta FROM ventas_cambios WHERE id_cambio > %s ORDER BY id_cambio LIMIT %s",
+                (since, limite + 1))
+    
+    @staticmethod
+    def recortar(since: int, estado: Tuple[Optional[int], Optional[int]], cambios: List[tuple],
+                 limite: int) -> Tuple[List[tuple], int, bool]:
+        """Limita los cambios leídos con `sql_desde` y calcula el nuevo watermark
+        
+        Retorna (cambios (id_cambio, id_venta), watermark, hay_mas). Lanza
+        WatermarkExpirado si los cambios posteriores a `since` ya se purgaron.
+        """
+        minimo = estado[0]
+        if minimo is not None and since < minimo - 1:
+            raise WatermarkExpirado(f"El watermark {since} expiró; vuelva a cargar los datos completos")
+        hay_mas = len(cambios) > limite
+        cambios = cambios[:limite]
+        watermark = CambiosVenta.watermark_seguro(estado)
+        if hay_mas:
+            watermark = min(watermark, cambios[-1][0])
+        return cambios, max(watermark, since), hay_mas
+    
+    @staticmethod
+    def ids_venta(cambios: List[tuple]) -> List[int]:
+        """IDs de venta de una lista de cambios, sin repetir y en orden de cambio"""
+        return list(dict.fromkeys(id_venta for _, id_venta in cambios))
+    
+    @staticmethod
+    def leer(since: int, limite: Optional[int] = None) -> Tuple[List[tuple], int, bool]:
+        """Cambios (id_cambio, id_venta) posteriores a `since`, nuevo watermark y si hay más"""
+        limite = limite or CambiosVenta.LIMITE
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor_preparado(CambiosVenta.SQL_ESTADO)
+        cursor.execute(CambiosVenta.SQL_ESTADO, (CambiosVenta.MARGEN,))
+        estado = cursor.fetchone()
+        cursor.close()
+        sql, params = CambiosVenta.sql_desde(since, limite)
+        cursor = conn.cursor_preparado(sql)
+        cursor.execute(sql, params)
+        cambios = cursor.fetchall()
+        cursor.close()
+        return CambiosVenta.recortar(since, estado, cambios, limite)
+    
+    @staticmethod
+    def desde(since: int, limite: Optional[int] = None) -> Tuple[List[int], int, bool]:
+        """IDs de las ventas insertadas, actualizadas o eliminadas después de `since`
+        
+        Retorna (ids, nuevo watermark, hay_mas). Cada venta aparece una vez
+        aunque haya cambiado varias veces; su estado actual se lee de `ventas`.
+        """
+        cambios, watermark, hay_mas = CambiosVenta.leer(since, limite)
+        return CambiosVenta.ids_venta(cambios), watermark, hay_mas
+    
+    @staticmethod
+    def purgar(dias: int) -> int:
+        """Elimina los cambios con más de `dias` días, conservando siempre el último
+        
+        Los clientes con un watermark anterior a lo purgado reciben WatermarkExpirado.
+        Retorna el número de cambios eliminados.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT MAX(id_cambio) FROM ventas_cambios")
+            ultimo = cursor.fetchone()[0]
+            eliminados = 0
+            if ultimo is not None:
+                cursor.execute(
+                    "DELETE FROM ventas_cambios WHERE fecha < NOW() - INTERVAL %s DAY AND id_cambio < %s",
+                    (dias, ultimo)
+                )
+                eliminados = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            return eliminados
+        except Error as e:
+            conn.rollback()
+            cursor.close()
+            raise e
+    
+    @staticmethod
+    def separar(ids: List[int], presentes) -> List[int]:
+        """IDs modificados que ya no están entre las ventas leídas (eliminados o fuera del filtro)"""
+        presentes = set(presentes)
+        return [id_venta for id_venta in ids if id_venta not in presentes]
+
+class ResumenDiario:
+    """Resumen de ventas por día, cliente y producto
+    
+    Se mantiene incrementalmente dentro de la misma transacción que cada
+    escritura de `Venta`, de modo que las métricas de rangos de fechas se
+    obtienen sumando a lo sumo una fila por día, cliente y producto.
+    """
+    
+    @staticmethod
+    def aplicar(cursor, primer_id: int, ultimo_id: int, signo: int, paso: int = 1):
+        """Suma (signo 1) o resta (signo -1) al resumen las ventas de un rango de IDs
+        
+        Debe ejecutarse con el cursor de la transacción que modifica las ventas:
+        después de insertarlas, o antes de modificarlas o eliminarlas. Con
+        `paso` mayor que 1 solo cuenta los IDs `primer_id + k * paso`, de modo
+        que las ventas de otros primarios intercaladas en el rango no se suman.
+        """
+        condicion = "id_venta BETWEEN %s AND %s"
+        params = [signo, signo, signo, primer_id, ultimo_id]
+        if paso > 1:
+            condicion += " AND MOD(id_venta - %s, %s) = 0"
+            params += [primer_id, paso]
+        cursor.execute(f"""
+            INSERT INTO ventas_resumen_diario (dia, id_cliente, id_producto, num_ventas, cantidad, monto)
+            SELECT DATE(fecha), id_cliente, id_producto, %s * COUNT(*), %s * SUM(cantidad), %s * SUM(total)
+            FROM ventas
+            WHERE {condicion}
+            GROUP BY DATE(fecha), id_cliente, id_producto
+            ON DUPLICATE KEY UPDATE
+                num_ventas = num_ventas + VALUES(num_ventas),
+                cantidad = cantidad + VALUES(cantidad),
+                monto = monto + VALUES(monto)
+        """, tuple(params))
+    
+    @staticmethod
+    def reconstruir() -> int:
+        """Repuebla el resumen desde cero a partir de `ventas`
+        
+        La tabla la crea la migración 003. Retorna el número de filas del resumen.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM ventas_resumen_diario")
+            cursor.execute("""
+                INSERT INTO ventas_resumen_diario (dia, id_cliente, id_producto, num_ventas, cantidad, monto)
+                SELECT DATE(fecha), id_cliente, id_producto, COUNT(*), SUM(cantidad), SUM(total)
+                FROM ventas
+                GROUP BY DATE(fecha), id_cliente, id_producto
+            """)
+            filas = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            return filas
+        except Error as e:
+            conn.rollback()
+            cursor.close()
+            raise e
+    
+    @staticmethod
+    def metricas(id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+                 fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None) -> Dict:
+        """Calcula conteo, suma y promedio de las ventas filtradas usando el resumen diario
+        
+        Los días completamente incluidos en el rango se suman desde el resumen;
+        las fracciones de día en los extremos se agregan desde `ventas`.
+        """
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        filas = []
+        for sql, params in ResumenDiario.plan_metricas(id_cliente, id_producto, fecha_inicio, fecha_fin):
+            cursor.execute(sql, params)
+            filas.append(cursor.fetchone())
+        cursor.close()
+        return ResumenDiario.combinar_metricas(filas)
+    
+    @staticmethod
+    def plan_metricas(id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+                      fecha_inicio: Optional[datetime] = None,
+                      fecha_fin: Optional[datetime] = None) -> List[Tuple[str, tuple]]:
+        """Consultas que calculan las métricas; cada una devuelve una fila (ventas, monto, cantidad)
+        
+        Se combinan con `combinar_metricas`.
+        """
+        def sobre_ventas(where, params):
+            return (f"""
+            SELECT COUNT(*), COALESCE(SUM(v.total), 0), COALESCE(SUM(v.cantidad), 0)
+            FROM ventas v{where}
+        """, params)
+        
+        rango = ResumenDiario.dividir_rango(id_cliente, id_producto, fecha_inicio, fecha_fin)
+        if rango is None:
+            return [sobre_ventas(*Venta.construir_filtros(id_cliente, id_producto, fecha_inicio, fecha_fin))]
+        
+        where_resumen, params_resumen, bordes = rango
+        consultas = [(f"""
+            SELECT COALESCE(SUM(r.num_ventas), 0), COALESCE(SUM(r.monto), 0), COALESCE(SUM(r.cantidad), 0)
+            FROM ventas_resumen_diario r{where_resumen}
+        """, params_resumen)]
+        if bordes is not None:
+            consultas.append(sobre_ventas(*bordes))
+        return consultas
+    
+    @staticmethod
+    def dividir_rango(id_cliente: Optional[int], id_producto: Optional[int],
+                      fecha_inicio: Optional[datetime], fecha_fin: Optional[datetime]):
+        """Reparte un rango de fechas entre el resumen diario y la tabla de ventas
+        
+        Retorna `(where_resumen, params_resumen, bordes)`: el filtro sobre el
+        resumen (alias `r`) para los días completos y, si el rango empieza o
+        termina a mitad de un día, `bordes = (where, params)` sobre `ventas`
+        (alias `v`) para esas fracciones. Retorna None si el resumen no sirve
+        (un solo extremo del rango, o ningún día completo).
+        """
+        if (fecha_inicio is None) != (fecha_fin is None):
+            return None
+        
+        where_resumen, params_resumen = Venta.construir_filtros(id_cliente, id_producto, alias='r')
+        if fecha_inicio is None:
+            return where_resumen, params_resumen, None
+        
+        primer_dia = fecha_inicio.date()
+        if fecha_inicio.time() != time.min:
+            primer_dia += timedelta(days=1)
+        ultimo_dia = (fecha_fin + timedelta(microseconds=1)).date() - timedelta(days=1)
+        if primer_dia > ultimo_dia:
+            return None
+        
+        rango = "r.dia BETWEEN %s AND %s"
+        where_resumen = f"{where_resumen} AND {rango}" if where_resumen else f" WHERE {rango}"
+        params_resumen += (primer_dia, ultimo_dia)
+        
+        # Fracciones de día en los extremos del rango: [inicio, primer_dia) y [ultimo_dia + 1, fin]
+        where, params = Venta.construir_filtros(id_cliente, id_producto)
+        borde = "((v.fecha >= %s AND v.fecha < %s) OR (v.fecha >= %s AND v.fecha <= %s))"
+        bordes = (
+            f"{where} AND {borde}" if where else f" WHERE {borde}",
+            params + (fecha_inicio, datetime.combine(primer_dia, time.min),
+                      datetime.combine(ultimo_dia + timedelta(days=1), time.min), fecha_fin)
+        )
+        return where_resumen, params_resumen, bordes
+    
+    DIMENSIONES = {
+        # dimensión: (columnas de la clave, expresión de agrupación, JOIN para los nombres, orden por clave)
+        'cliente': ("c.id_cliente, c.nombre AS cliente_nombre", "c.id_cliente, c.nombre",
+                    "INNER JOIN clientes c ON t.id_cliente = c.id_cliente", "c.id_cliente"),
+        'producto': ("p.id_producto, p.nombre AS producto_nombre", "p.id_producto, p.nombre",
+                     "INNER JOIN productos p ON t.id_producto = p.id_producto", "p.id_producto"),
+        'dia': ("t.dia AS periodo", "t.dia", "", "periodo"),
+        'semana': ("DATE_SUB(t.dia, INTERVAL WEEKDAY(t.dia) DAY) AS periodo",
+                   "DATE_SUB(t.dia, INTERVAL WEEKDAY(t.dia) DAY)", "", "periodo"),
+        'mes': ("DATE_SUB(t.dia, INTERVAL DAYOFMONTH(t.dia) - 1 DAY) AS periodo",
+                "DATE_SUB(t.dia, INTERVAL DAYOFMONTH(t.dia) - 1 DAY)", "", "periodo"),
+    }
+    
+    ORDENES = ('monto', 'cantidad', 'num_ventas', 'clave')
+    
+    @staticmethod
+    def sql_agrupado(dimension: str, id_cliente: Optional[int] = None, id_producto: Optional[int] = None,
+                     fecha_inicio: Optional[datetime] = None, fecha_fin: Optional[datetime] = None,
+                     ordenar_por: Optional[str] = None, descendente: Optional[bool] = None,
+                     limite: Optional[int] = None) -> Tuple[str, tuple]:
+        """Consulta que agrega las ventas filtradas por cliente, producto, día, semana o mes
+        
+        Los días completos se leen del resumen diario y solo las fracciones de
+        día de los extremos del rango se agrupan desde `ventas`. Las semanas
+        empiezan en lunes y `periodo` es la fecha del primer día del grupo.
+        Por defecto los periodos se ordenan cronológicamente y los clientes y
+        productos por monto descendente.
+        """
+        if dimension not in ResumenDiario.DIMENSIONES:
+            raise ValueError(f"Agrupación no soportada: {dimension}. "
+                             f"Use {', '.join(ResumenDiario.DIMENSIONES)}")
+        if ordenar_por is None:
+            ordenar_por = 'monto' if dimension in ('cliente', 'producto') else 'clave'
+        if ordenar_por not in ResumenDiario.ORDENES:
+            raise ValueError(f"Orden no soportado: {ordenar_por}. Use {', '.join(ResumenDiario.ORDENES)}")
+        if descendente is None:
+            descendente = ordenar_por != 'clave'
+        
+        def desde_ventas(where):
+            return f"""
+                SELECT DATE(v.fecha) AS dia, v.id_cliente, v.id_producto, COUNT(*) AS num_ventas,
+                       SUM(v.cantidad) AS cantidad, SUM(v.total) AS monto
+                FROM ventas v{where}
+                GROUP BY DATE(v.fecha), v.id_cliente, v.id_producto"""
+        
+        rango = ResumenDiario.dividir_rango(id_cliente, id_producto, fecha_inicio, fecha_fin)
+        if rango is None:
+            where, params = Venta.construir_filtros(id_cliente, id_producto, fecha_inicio, fecha_fin)
+            origen = desde_ventas(where)
+        else:
+            where_resumen, params, bordes = rango
+            origen = f"""
+                SELECT r.dia, r.id_cliente, r.id_producto, r.num_ventas, r.cantidad, r.monto
+                FROM ventas_resumen_diario r{where_resumen}"""
+            if bordes is not None:
+                origen += f" UNION ALL {desde_ventas(bordes[0])}"
+                params += bordes[1]
+        
+        columnas, grupo, join, clave = ResumenDiario.DIMENSIONES[dimension]
+        direccion = "DESC" if descendente else "ASC"
+        orden = f"{clave} {direccion}" if ordenar_por == 'clave' else f"{ordenar_por} {direccion}, {clave}"
+        sql = f"""
+            SELECT {columnas},
+                   CAST(SUM(t.num_ventas) AS SIGNED) AS num_ventas,
+                   CAST(SUM(t.cantidad) AS SIGNED) AS cantidad,
+                   SUM(t.monto) AS monto,
+                   ROUND(SUM(t.monto) / SUM(t.num_ventas), 2) AS promedio_venta
+            FROM ({origen}) t {join}
+            GROUP BY {grupo}
+            HAVING SUM(t.num_ventas) > 0
+            ORDER BY {orden}"""
+        if limite is not None:
+            sql += " LIMIT %s"
+            params += (limite,)
+        return sql, params
+    
+    @staticmethod
+    def agrupar(dimension: str, **kwargs) -> Tuple[List[str], List[list]]:
+        """Ejecuta `sql_agrupado`; retorna los nombres de columna y una lista de valores por columna"""
+        db = Database()
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(*ResumenDiario.sql_agrupado(dimension, **kwargs))
+        filas = cursor.fetchall()
+        columnas = list(cursor.column_names)
+        cursor.close()
+        return columnas, valores_por_columna(filas, len(columnas))
+    
+    @staticmethod
+    def combinar_metricas(filas: List[tuple]) -> Dict:
+        """Suma las filas (ventas, monto, cantidad) de `plan_metricas` y calcula el promedio"""
+        total_ventas = sum(int(fila[0]) for fila in filas)
+        total_monto = sum(float(fila[1]) for fila in filas)
+        cantidad_items = sum(int(fila[2]) for fila in filas)
+        return {
+            "total_ventas": total_ventas,
+            "total_monto": round(total_monto, 2),
+            "promedio_venta": round(total_monto / total_ventas, 2) if total_ventas else 0.0,
+            "cantidad_items": int(cantidad_items)
+        }
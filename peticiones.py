@@ -0,0 +1,241 @@
+"""
+Lectura de parámetros y composición de respuestas de la API, sin depender del servidor
+
+Las usan tanto los endpoints Flask de `app.py` como los manejadores
+asíncronos de `asgi.py`, de modo que ambos validan igual y responden con el
+mismo JSON. `args` es cualquier mapeo de la query string (por ejemplo
+`request.args`) y `data` el cuerpo JSON ya decodificado. Los parámetros
+inválidos lanzan ValueError (400); las comprobaciones que dependen de los
+datos leídos lanzan ErrorPeticion con su código de estado.
+"""
+from datetime import datetime
+from typing import Dict, List, Mapping, NamedTuple, Optional, Tuple
+from builder import FacturaBuilder, ReporteVentasBuilder, aplicar_agrupacion
+from models import CambiosVenta, Venta
+
+LIMITE_PAGINA_DEFECTO = 50
+LIMITE_PAGINA_MAXIMO = 500
+LIMITE_VENTAS_FACTURA = 1000
+FORMATOS_REPORTE = ('filas', 'columnar')
+
+
+class ErrorPeticion(Exception):
+    """La petición no se puede atender; se responde con `estado` y el mensaje"""
+
+    def __init__(self, mensaje: str, estado: int = 400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def es_entero(valor) -> bool:
+    """Si `valor` es un entero de JSON; `true` y `false` no cuentan como 1 y 0"""
+    return isinstance(valor, int) and not isinstance(valor, bool)
+
+
+def leer_entero(args: Mapping[str, str], nombre: str) -> Optional[int]:
+    """Entero de la query string; None si falta o no es válido, como `request.args.get(type=int)`"""
+    try:
+        return int(args[nombre])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def leer_paginacion(args: Mapping[str, str]) -> Tuple[int, Optional[str]]:
+    """Lee `limit` y `cursor`; lanza ValueError si no son válidos"""
+    limite = leer_entero(args, 'limit') if 'limit' in args else LIMITE_PAGINA_DEFECTO
+    if limite is None or not 1 <= limite <= LIMITE_PAGINA_MAXIMO:
+        raise ValueError(f"limit debe estar entre 1 y {LIMITE_PAGINA_MAXIMO}")
+    cursor = args.get('cursor') or None
+    if cursor:
+        Venta.decodificar_cursor(cursor)
+    return limite, cursor
+
+
+def leer_since(args: Mapping[str, str]) -> Optional[int]:
+    """Lee el watermark `since`; None si no se indicó"""
+    since = args.get('since')
+    if since is None or since == '':
+        return None
+    if not since.isdigit():
+        raise ValueError("since debe ser un watermark (entero no negativo)")
+    return int(since)
+
+
+def leer_periodo(data: dict) -> Tuple[datetime, datetime]:
+    """Lee `fecha_inicio` y `fecha_fin` del cuerpo JSON; lanza ValueError si no son válidas"""
+    try:
+        fecha_inicio = datetime.fromisoformat(data['fecha_inicio'])
+        fecha_fin = datetime.fromisoformat(data['fecha_fin'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("fecha_inicio y fecha_fin deben estar en formato ISO (AAAA-MM-DD)")
+    if fecha_inicio > fecha_fin:
+        raise ValueError("fecha_inicio no puede ser posterior a fecha_fin")
+    return fecha_inicio, fecha_fin
+
+
+# ==================== VENTAS ====================
+
+def pagina_ventas(ventas: List[Dict], siguiente: Optional[str], watermark: Optional[int]) -> Dict:
+    """Respuesta de una página de `GET /api/ventas`"""
+    return {
+        "success": True,
+        "data": ventas,
+        "total": len(ventas),
+        "next_cursor": siguiente,
+        "watermark": watermark
+    }
+
+
+def cambios_ventas(ids: List[int], ventas: List[Dict], watermark: int, hay_mas: bool) -> Dict:
+    """Respuesta de `GET /api/ventas?since=`: ventas cambiadas, IDs eliminados y nuevo watermark"""
+    return {
+        "success": True,
+        "data": ventas,
+        "total": len(ventas),
+        "eliminadas": CambiosVenta.separar(ids, (venta['id_venta'] for venta in ventas)),
+        "watermark": watermark,
+        "hay_mas": hay_mas
+    }
+
+
+def ventas_de_cliente(cliente: Dict, ventas: List[Dict], siguiente: Optional[str]) -> Dict:
+    """Respuesta de una página de `GET /api/ventas/cliente/<id>`"""
+    return {
+        "success": True,
+        "cliente": {
+            "id": cliente['id_cliente'],
+            "nombre": cliente['nombre'],
+            "correo": cliente['correo']
+        },
+        "data": ventas,
+        "total": len(ventas),
+        "next_cursor": siguiente
+    }
+
+
+# ==================== REPORTES ====================
+
+def aplicar_filtros_reporte(builder: ReporteVentasBuilder, args: Mapping[str, str]) -> ReporteVentasBuilder:
+    """Aplica al builder los filtros de reporte presentes en la query string"""
+    id_cliente = leer_entero(args, 'id_cliente')
+    id_producto = leer_entero(args, 'id_producto')
+    fecha_inicio = args.get('fecha_inicio')
+    fecha_fin = args.get('fecha_fin')
+
+    if id_cliente:
+        builder.aplicar_filtro_cliente(id_cliente)
+
+    if id_producto:
+        builder.aplicar_filtro_producto(id_producto)
+
+    if fecha_inicio and fecha_fin:
+        builder.aplicar_filtro_fecha(fecha_inicio, fecha_fin)
+
+    return builder
+
+
+def preparar_reporte(args: Mapping[str, str]) -> Tuple[ReporteVentasBuilder, str]:
+    """Builder y formato de `GET /api/reportes/ventas`; lanza ValueError si algún parámetro no es válido"""
+    formato = args.get('formato', 'filas').lower()
+    if formato not in FORMATOS_REPORTE:
+        raise ValueError(f"Formato no soportado: {formato}. Use filas o columnar")
+
+    builder = ReporteVentasBuilder()
+    builder.reset()
+    builder.set_titulo("Reporte de Ventas")
+    builder.set_tipo("reporte_ventas")
+    aplicar_filtros_reporte(builder, args)
+    # Las fechas se convierten aquí para rechazar las que no son ISO antes de consultar
+    builder.filtros_consulta()
+    # Agrupación y top-N, calculados con GROUP BY en la base de datos
+    aplicar_agrupacion(builder, args)
+    since = leer_since(args)
+    if args.get('solo_metricas', '').lower() in ('1', 'true'):
+        builder.set_solo_metricas()
+    # Reporte incremental: solo las ventas cambiadas desde el watermark
+    if since is not None:
+        builder.set_desde(since)
+    builder.revisar_opciones()
+    return builder, formato
+
+
+# ==================== FACTURAS ====================
+
+class SolicitudFactura(NamedTuple):
+    """Ventas de `POST /api/facturas`: por IDs, o de un cliente en un período"""
+    ids_venta: Optional[List[int]]
+    id_cliente: Optional[int]
+    fecha_inicio: Optional[datetime]
+    fecha_fin: Optional[datetime]
+
+
+def leer_solicitud_factura(data) -> SolicitudFactura:
+    """Valida el cuerpo de `POST /api/facturas`; lanza ValueError si no es válido"""
+    if not data or not isinstance(data, dict):
+        raise ValueError("No se proporcionaron datos")
+
+    ids_venta = data.get('ids_venta')
+    id_cliente = data.get('id_cliente')
+    if ids_venta:
+        if not isinstance(ids_venta, list) or not all(es_entero(i) for i in ids_venta):
+            raise ValueError("ids_venta debe ser una lista de enteros")
+        if len(ids_venta) > LIMITE_VENTAS_FACTURA:
+            raise ValueError(f"Una factura no puede incluir más de {LIMITE_VENTAS_FACTURA} ventas")
+        return SolicitudFactura(ids_venta, None, None, None)
+
+    if id_cliente and data.get('fecha_inicio') and data.get('fecha_fin'):
+        if not es_entero(id_cliente):
+            raise ValueError("id_cliente debe ser un entero")
+        return SolicitudFactura(None, id_cliente, *leer_periodo(data))
+
+    raise ValueError("Se requiere ids_venta, o id_cliente con fecha_inicio y fecha_fin")
+
+
+def revisar_ventas_factura(ids_venta: List[int], ventas: List[Dict]) -> Dict:
+    """Comprueba que se encontraron todas las ventas pedidas y que son de un solo cliente
+
+    Retorna el cliente de la factura; lanza ErrorPeticion si no se cumple.
+    """
+    faltantes = sorted(set(ids_venta) - {venta['id_venta'] for venta in ventas})
+    if faltantes:
+        raise ErrorPeticion(f"Ventas no encontradas: {faltantes}", 404)
+    if len({venta['id_cliente'] for venta in ventas}) > 1:
+        raise ErrorPeticion("Todas las ventas de una factura deben ser del mismo cliente")
+    return FacturaBuilder.cliente_de_venta(ventas[0])
+
+
+def revisar_rango_factura(ventas: List[Dict]) -> List[Dict]:
+    """Ventas de un período leídas con `limite=LIMITE_VENTAS_FACTURA + 1`, en orden cronológico
+
+    Lanza ErrorPeticion si el período no tiene ventas o supera el límite.
+    """
+    # Una venta más que el límite basta para saber que el rango lo supera
+    if len(ventas) > LIMITE_VENTAS_FACTURA:
+        raise ErrorPeticion(f"El rango incluye más de {LIMITE_VENTAS_FACTURA} ventas; acote las fechas")
+    if not ventas:
+        raise ErrorPeticion("No hay ventas del cliente en el rango de fechas", 404)
+    return ventas[::-1]
+
+
+def factura_de_venta(venta: Dict) -> Dict:
+    """Factura de `GET /api/facturas/<id>` a partir de la venta con detalle"""
+    factura_builder = FacturaBuilder()
+    factura_builder.reset()
+    factura_builder.set_numero_factura(venta['id_venta'])
+    factura_builder.set_cliente(venta['id_cliente'], FacturaBuilder.cliente_de_venta(venta))
+    factura_builder.agregar_item(venta['id_venta'], venta)
+    if isinstance(venta['fecha'], datetime):
+        factura_builder.set_fecha(venta['fecha'].isoformat())
+    else:
+        factura_builder.set_fecha(venta['fecha'])
+    return factura_builder.construir()
+
+
+def factura_de_ventas(data: Dict, cliente: Dict, ventas: List[Dict]) -> Dict:
+    """Factura de `POST /api/facturas` con los datos ya obtenidos"""
+    factura_builder = FacturaBuilder()
+    factura_builder.reset()
+    factura_builder.set_numero_factura(data.get('numero_factura', ventas[0]['id_venta']))
+    factura_builder.set_cliente(cliente['id_cliente'], cliente)
+    factura_builder.agregar_items(ventas)
+    return factura_builder.construir()
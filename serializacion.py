@@ -0,0 +1,85 @@
+"""
+Codificación JSON rápida para las respuestas de la API
+
+Fechas (`datetime`, `date`) se codifican en ISO 8601 y los `Decimal` como
+texto, igual que hacían los handlers a mano, sin recorrer las filas antes de
+serializar. Si `orjson` está instalado se usa como codificador; si no, se
+recurre al módulo `json` de la biblioteca estándar con el mismo resultado.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+
+def valor_json(valor):
+    """Convierte fechas y decimales a tipos serializables en JSON"""
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _valor_orjson(valor):
+    """Tipos que orjson no codifica por sí mismo"""
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def dumps_bytes(obj, sort_keys: bool = False, indent: bool = False) -> bytes:
+    """Serializa `obj` a JSON en UTF-8"""
+    if orjson is not None:
+        opciones = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            opciones |= orjson.OPT_SORT_KEYS
+        if indent:
+            opciones |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_valor_orjson, option=opciones)
+    return json.dumps(
+        obj, default=valor_json, ensure_ascii=False, sort_keys=sort_keys,
+        indent=2 if indent else None, separators=None if indent else (',', ':')
+    ).encode('utf-8')
+
+
+def dumps(obj, sort_keys: bool = False, indent: bool = False) -> str:
+    """Serializa `obj` a una cadena JSON"""
+    return dumps_bytes(obj, sort_keys, indent).decode('utf-8')
+
+
+def loads(datos):
+    """Decodifica JSON desde texto o bytes"""
+    if orjson is not None:
+        return orjson.loads(datos)
+    return json.loads(datos)
+
+
+class ProveedorJSONRapido(DefaultJSONProvider):
+    """Proveedor JSON de Flask basado en `dumps_bytes`
+
+    Respeta `sort_keys` y `compact` de Flask y escribe la respuesta
+    directamente en bytes, sin pasar por una cadena intermedia.
+    """
+
+    def _indentar(self, indent=None) -> bool:
+        if indent is not None:
+            return bool(indent)
+        return self.compact is False or (self.compact is None and self._app.debug)
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys),
+                     indent=self._indentar(kwargs.get('indent')))
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        cuerpo = dumps_bytes(obj, sort_keys=self.sort_keys, indent=self._indentar())
+        return self._app.response_class(cuerpo + b"\n", mimetype=self.mimetype)
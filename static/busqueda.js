@@ -0,0 +1,56 @@
+// Búsqueda mientras se escribe (typeahead) sobre los endpoints /api/<catálogo>/buscar,
+// compartida por las páginas de ventas y reportes
+
+// Milisegundos sin escribir antes de consultar, y resultados por búsqueda
+const ESPERA_BUSQUEDA = 200;
+const RESULTADOS_BUSQUEDA = 20;
+
+// Llenar un select con los resultados de búsqueda mientras se escribe en su campo de texto.
+// `completarOpcion` (opcional) recibe cada <option> y su fila, para agregarle datos
+function configurarBusqueda(inputId, selectId, url, textoVacio, textoOpcion, completarOpcion) {
+    const input = document.getElementById(inputId);
+    const select = document.getElementById(selectId);
+    let temporizador = null;
+    let ultimaBusqueda = 0;
+    
+    input.addEventListener('input', function() {
+        clearTimeout(temporizador);
+        temporizador = setTimeout(async function() {
+            const numero = ++ultimaBusqueda;
+            const texto = input.value.trim();
+            if (!texto) {
+                select.innerHTML = `<option value="">${textoVacio}</option>`;
+                select.dispatchEvent(new Event('change'));
+                return;
+            }
+            
+            try {
+                const params = new URLSearchParams({ q: texto, limit: RESULTADOS_BUSQUEDA });
+                const response = await fetch(`${url}?${params.toString()}`);
+                const data = await response.json();
+                // Descartar respuestas de búsquedas que ya fueron reemplazadas
+                if (numero !== ultimaBusqueda || !data.success) {
+                    return;
+                }
+                
+                select.innerHTML = `<option value="">${data.data.length ? textoVacio : 'Sin resultados'}</option>`;
+                data.data.forEach(fila => {
+                    const option = document.createElement('option');
+                    option.value = fila[select.name];
+                    option.textContent = textoOpcion(fila);
+                    if (completarOpcion) {
+                        completarOpcion(option, fila);
+                    }
+                    select.appendChild(option);
+                });
+                // El resultado más relevante queda seleccionado
+                if (data.data.length) {
+                    select.selectedIndex = 1;
+                }
+                select.dispatchEvent(new Event('change'));
+            } catch (error) {
+                console.error('Error al buscar:', error);
+            }
+        }, ESPERA_BUSQUEDA);
+    });
+}
@@ -1,55 +1,15 @@
 // Cargar clientes y productos al iniciar
 document.addEventListener('DOMContentLoaded', function() {
-    cargarClientes();
-    cargarProductos();
+    configurarBusqueda('buscar_reporte_cliente', 'reporte_cliente', '/api/clientes/buscar', 'Todos los clientes',
+        cliente => `${cliente.nombre} (${cliente.correo})`);
+    configurarBusqueda('buscar_reporte_producto', 'reporte_producto', '/api/productos/buscar', 'Todos los productos',
+        producto => `${producto.nombre}`);
     
     // Event listeners
     document.getElementById('reporteForm').addEventListener('submit', generarReporte);
     document.getElementById('facturaForm').addEventListener('submit', generarFactura);
 });
 
-// Cargar lista de clientes
-async function cargarClientes() {
-    try {
-        const response = await fetch('/api/clientes');
-        const data = await response.json();
-        
-        const selectReporte = document.getElementById('reporte_cliente');
-        
-        if (data.success && data.data) {
-            data.data.forEach(cliente => {
-                const option = document.createElement('option');
-                option.value = cliente.id_cliente;
-                option.textContent = `${cliente.nombre} (${cliente.correo})`;
-                selectReporte.appendChild(option);
-            });
-        }
-    } catch (error) {
-        console.error('Error al cargar clientes:', error);
-    }
-}
-
-// Cargar lista de productos
-async function cargarProductos() {
-    try {
-        const response = await fetch('/api/productos');
-        const data = await response.json();
-        
-        const select = document.getElementById('reporte_producto');
-        
-        if (data.success && data.data) {
-            data.data.forEach(producto => {
-                const option = document.createElement('option');
-                option.value = producto.id_producto;
-                option.textContent = `${producto.nombre}`;
-                select.appendChild(option);
-            });
-        }
-    } catch (error) {
-        console.error('Error al cargar productos:', error);
-    }
-}
-
 // Generar reporte de ventas
 async function generarReporte(e) {
     e.preventDefault();
@@ -70,9 +30,17 @@ async function generarReporte(e) {
     if (formData.get('fecha_fin')) {
         params.append('fecha_fin', formData.get('fecha_fin'));
     }
+    if (formData.get('agrupar_por')) {
+        params.append('agrupar_por', formData.get('agrupar_por'));
+        if (formData.get('top')) {
+            params.append('top', formData.get('top'));
+        }
+    }
+    // Columnas una sola vez y un arreglo por columna: respuesta más liviana
+    params.append('formato', 'columnar');
     
     try {
-        const url = `/api/reportes/ventas${params.toString() ? '?' + params.toString() : ''}`;
+        const url = `/api/reportes/ventas?${params.toString()}`;
         const response = await fetch(url);
         const data = await response.json();
         
@@ -87,6 +55,69 @@ async function generarReporte(e) {
     }
 }
 
+// Generar las filas de la tabla a partir de los datos columnares del reporte
+function filasReporte(datos) {
+    const columna = {};
+    datos.columnas.forEach((nombre, i) => {
+        columna[nombre] = datos.valores[i];
+    });
+    
+    const filas = [];
+    for (let i = 0; i < datos.filas; i++) {
+        filas.push(`
+            <tr>
+                <td>${columna.id_venta[i]}</td>
+                <td>${columna.cliente_nombre[i]}</td>
+                <td>${columna.producto_nombre[i]}</td>
+                <td>${columna.cantidad[i]}</td>
+                <td>$${parseFloat(columna.total[i]).toFixed(2)}</td>
+                <td>${new Date(columna.fecha[i]).toLocaleString('es-ES')}</td>
+            </tr>
+        `);
+    }
+    return filas.join('');
+}
+
+// Títulos de las columnas de un reporte agrupado
+const TITULOS_GRUPO = {
+    id_cliente: 'ID Cliente',
+    cliente_nombre: 'Cliente',
+    id_producto: 'ID Producto',
+    producto_nombre: 'Producto',
+    periodo: 'Periodo',
+    num_ventas: 'Ventas',
+    cantidad: 'Items',
+    monto: 'Monto',
+    promedio_venta: 'Promedio'
+};
+
+// Generar la tabla de un reporte agrupado a partir de sus datos columnares
+function tablaAgrupada(datos) {
+    const monetarias = ['monto', 'promedio_venta'];
+    const encabezado = datos.columnas.map(nombre => `<th>${TITULOS_GRUPO[nombre] || nombre}</th>`).join('');
+    
+    const filas = [];
+    for (let i = 0; i < datos.filas; i++) {
+        const celdas = datos.columnas.map((nombre, j) => {
+            const valor = datos.valores[j][i];
+            return `<td>${monetarias.includes(nombre) ? '$' + parseFloat(valor).toFixed(2) : valor}</td>`;
+        }).join('');
+        filas.push(`<tr>${celdas}</tr>`);
+    }
+    
+    return `
+        <table class="data-table">
+            <thead><tr>${encabezado}</tr></thead>
+            <tbody>
+                ${filas.length > 0
+                    ? filas.join('')
+                    : `<tr><td colspan="${datos.columnas.length}" class="loading">No hay datos para mostrar</td></tr>`
+                }
+            </tbody>
+        </table>
+    `;
+}
+
 // Mostrar reporte
 function mostrarReporte(reporte) {
     const container = document.getElementById('resultsContainer');
@@ -127,8 +158,9 @@ function mostrarReporte(reporte) {
                 </div>
             </div>
             
-            <h4 style="margin-top: 30px; color: #667eea;">Datos del Reporte:</h4>
+            <h4 style="margin-top: 30px; color: #667eea;">Datos del Reporte${reporte.agrupacion ? ` (agrupados por ${reporte.agrupacion.dimension})` : ''}:</h4>
             <div class="table-container">
+                ${reporte.agrupacion ? tablaAgrupada(reporte.datos) : `
                 <table class="data-table">
                     <thead>
                         <tr>
@@ -141,21 +173,12 @@ function mostrarReporte(reporte) {
                         </tr>
                     </thead>
                     <tbody>
-                        ${reporte.datos.length > 0 
-                            ? reporte.datos.map(venta => `
-                                <tr>
-                                    <td>${venta.id_venta}</td>
-                                    <td>${venta.cliente_nombre}</td>
-                                    <td>${venta.producto_nombre}</td>
-                                    <td>${venta.cantidad}</td>
-                                    <td>$${parseFloat(venta.total).toFixed(2)}</td>
-                                    <td>${new Date(venta.fecha).toLocaleString('es-ES')}</td>
-                                </tr>
-                            `).join('')
+                        ${reporte.datos.filas > 0 
+                            ? filasReporte(reporte.datos)
                             : '<tr><td colspan="6" class="loading">No hay datos para mostrar</td></tr>'
                         }
                     </tbody>
-                </table>
+                </table>`}
             </div>
             
             <div style="margin-top: 20px;">
@@ -1,13 +1,17 @@
 // Cargar clientes y productos al iniciar
 document.addEventListener('DOMContentLoaded', function() {
-    cargarClientes();
-    cargarProductos();
+    configurarBusqueda('buscar_cliente', 'id_cliente', '/api/clientes/buscar', 'Seleccionar cliente...',
+        cliente => `${cliente.nombre} (${cliente.correo})`);
+    configurarBusqueda('buscar_producto', 'id_producto', '/api/productos/buscar', 'Seleccionar producto...',
+        producto => `${producto.nombre} - $${producto.precio}`,
+        (option, producto) => { option.dataset.precio = producto.precio; });
     cargarVentas();
     
     // Event listeners
     document.getElementById('ventaForm').addEventListener('submit', crearVenta);
     document.getElementById('btnCancelar').addEventListener('click', resetForm);
     document.getElementById('btnRefresh').addEventListener('click', cargarVentas);
+    document.getElementById('btnCargarMas').addEventListener('click', cargarMasVentas);
     document.getElementById('searchInput').addEventListener('input', buscarVentas);
     
     // Calcular total cuando cambia cantidad o producto
@@ -15,51 +19,6 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('cantidad').addEventListener('input', calcularTotal);
 });
 
-// Cargar lista de clientes
-async function cargarClientes() {
-    try {
-        const response = await fetch('/api/clientes');
-        const data = await response.json();
-        
-        const select = document.getElementById('id_cliente');
-        select.innerHTML = '<option value="">Seleccionar cliente...</option>';
-        
-        if (data.success && data.data) {
-            data.data.forEach(cliente => {
-                const option = document.createElement('option');
-                option.value = cliente.id_cliente;
-                option.textContent = `${cliente.nombre} (${cliente.correo})`;
-                select.appendChild(option);
-            });
-        }
-    } catch (error) {
-        console.error('Error al cargar clientes:', error);
-    }
-}
-
-// Cargar lista de productos
-async function cargarProductos() {
-    try {
-        const response = await fetch('/api/productos');
-        const data = await response.json();
-        
-        const select = document.getElementById('id_producto');
-        select.innerHTML = '<option value="">Seleccionar producto...</option>';
-        
-        if (data.success && data.data) {
-            data.data.forEach(producto => {
-                const option = document.createElement('option');
-                option.value = producto.id_producto;
-                option.textContent = `${producto.nombre} - $${producto.precio}`;
-                option.dataset.precio = producto.precio;
-                select.appendChild(option);
-            });
-        }
-    } catch (error) {
-        console.error('Error al cargar productos:', error);
-    }
-}
-
 // Calcular total
 function calcularTotal() {
     const productoSelect = document.getElementById('id_producto');
@@ -99,7 +58,7 @@ async function crearVenta(e) {
         if (data.success) {
             alert('Venta creada exitosamente');
             resetForm();
-            cargarVentas();
+            actualizarFilas([data.data], []);
         } else {
             alert('Error: ' + data.error);
         }
@@ -109,39 +68,137 @@ async function crearVenta(e) {
     }
 }
 
-// Cargar todas las ventas
+// Tamaño de página y cursor de la siguiente página de ventas
+const VENTAS_POR_PAGINA = 50;
+let siguienteCursor = null;
+
+// Transmisión de cambios de ventas (Server-Sent Events)
+let streamVentas = null;
+
+// Cargar la primera página de ventas
 async function cargarVentas() {
+    siguienteCursor = null;
+    await cargarPaginaVentas(false);
+}
+
+// Escuchar los cambios posteriores al watermark de la carga inicial
+function conectarStream(watermark) {
+    if (streamVentas) {
+        streamVentas.close();
+    }
+    // Al reconectarse, el navegador envía Last-Event-ID y solo recibe lo que le falta
+    streamVentas = new EventSource(`/api/ventas/stream?since=${watermark}`);
+    streamVentas.addEventListener('ventas', function(evento) {
+        const cambios = JSON.parse(evento.data);
+        actualizarFilas(cambios.data, cambios.eliminadas);
+    });
+    streamVentas.addEventListener('recargar', function() {
+        // El watermark expiró: se recarga la tabla completa y se abre una transmisión nueva
+        streamVentas.close();
+        streamVentas = null;
+        cargarVentas();
+    });
+}
+
+// Fila de la tabla para una venta
+function filaVenta(venta) {
+    return `
+        <tr data-id="${venta.id_venta}">
+            <td>${venta.id_venta}</td>
+            <td>${venta.cliente_nombre}</td>
+            <td>${venta.producto_nombre}</td>
+            <td>${venta.cantidad}</td>
+            <td>$${parseFloat(venta.total).toFixed(2)}</td>
+            <td>${new Date(venta.fecha).toLocaleString('es-ES')}</td>
+            <td>
+                <button class="btn btn-success" onclick="verFactura(${venta.id_venta})">Factura</button>
+                <button class="btn btn-danger" onclick="eliminarVenta(${venta.id_venta})">Eliminar</button>
+            </td>
+        </tr>
+    `;
+}
+
+// Aplicar cambios a la tabla sin volver a descargarla
+function actualizarFilas(ventas, eliminadas) {
+    const tbody = document.getElementById('ventasTableBody');
+    
+    eliminadas.forEach(idVenta => {
+        const fila = tbody.querySelector(`tr[data-id="${idVenta}"]`);
+        if (fila) {
+            fila.remove();
+        }
+    });
+    
+    ventas.forEach(venta => {
+        const existente = tbody.querySelector(`tr[data-id="${venta.id_venta}"]`);
+        const primera = tbody.querySelector('tr[data-id]');
+        if (existente) {
+            existente.outerHTML = filaVenta(venta);
+        } else if (!primera || venta.id_venta > Number(primera.dataset.id)) {
+            // Las ventas nuevas son las más recientes: van al inicio de la tabla. Las
+            // actualizadas que no están cargadas aparecerán al cargar su página
+            tbody.querySelectorAll('tr:not([data-id])').forEach(fila => fila.remove());
+            tbody.insertAdjacentHTML('afterbegin', filaVenta(venta));
+        }
+    });
+    
+    if (!tbody.querySelector('tr')) {
+        tbody.innerHTML = '<tr><td colspan="7" class="loading">No hay ventas registradas</td></tr>';
+    }
+    buscarVentas();
+}
+
+// Cargar la siguiente página y agregarla a la tabla
+async function cargarMasVentas() {
+    if (siguienteCursor) {
+        await cargarPaginaVentas(true);
+    }
+}
+
+// Cargar una página de ventas desde la API
+async function cargarPaginaVentas(agregar) {
+    const btnCargarMas = document.getElementById('btnCargarMas');
+    
     try {
-        const response = await fetch('/api/ventas');
+        const params = new URLSearchParams({ limit: VENTAS_POR_PAGINA });
+        if (agregar && siguienteCursor) {
+            params.append('cursor', siguienteCursor);
+        }
+        
+        const response = await fetch(`/api/ventas?${params.toString()}`);
         const data = await response.json();
         
         const tbody = document.getElementById('ventasTableBody');
         
         if (data.success && data.data) {
-            if (data.data.length === 0) {
+            siguienteCursor = data.next_cursor;
+            btnCargarMas.style.display = siguienteCursor ? '' : 'none';
+            
+            // La primera página trae el watermark desde el que escuchar cambios
+            if (!agregar && data.watermark !== null && data.watermark !== undefined) {
+                conectarStream(data.watermark);
+            }
+            
+            if (!agregar && data.data.length === 0) {
                 tbody.innerHTML = '<tr><td colspan="7" class="loading">No hay ventas registradas</td></tr>';
                 return;
             }
             
-            tbody.innerHTML = data.data.map(venta => `
-                <tr>
-                    <td>${venta.id_venta}</td>
-                    <td>${venta.cliente_nombre}</td>
-                    <td>${venta.producto_nombre}</td>
-                    <td>${venta.cantidad}</td>
-                    <td>$${parseFloat(venta.total).toFixed(2)}</td>
-                    <td>${new Date(venta.fecha).toLocaleString('es-ES')}</td>
-                    <td>
-                        <button class="btn btn-success" onclick="verFactura(${venta.id_venta})">Factura</button>
-                        <button class="btn btn-danger" onclick="eliminarVenta(${venta.id_venta})">Eliminar</button>
-                    </td>
-                </tr>
-            `).join('');
+            const filas = data.data.map(filaVenta).join('');
+            
+            if (agregar) {
+                tbody.insertAdjacentHTML('beforeend', filas);
+                buscarVentas();
+            } else {
+                tbody.innerHTML = filas;
+            }
         } else {
+            btnCargarMas.style.display = 'none';
             tbody.innerHTML = '<tr><td colspan="7" class="loading">Error al cargar ventas</td></tr>';
         }
     } catch (error) {
         console.error('Error al cargar ventas:', error);
+        btnCargarMas.style.display = 'none';
         document.getElementById('ventasTableBody').innerHTML = 
             '<tr><td colspan="7" class="loading">Error al cargar ventas</td></tr>';
     }
@@ -250,7 +307,7 @@ async function eliminarVenta(idVenta) {
         
         if (data.success) {
             alert('Venta eliminada exitosamente');
-            cargarVentas();
+            actualizarFilas([], [idVenta]);
         } else {
             alert('Error: ' + data.error);
         }
@@ -263,6 +320,8 @@ async function eliminarVenta(idVenta) {
 // Resetear formulario
 function resetForm() {
     document.getElementById('ventaForm').reset();
+    document.getElementById('id_cliente').innerHTML = '<option value="">Seleccionar cliente...</option>';
+    document.getElementById('id_producto').innerHTML = '<option value="">Seleccionar producto...</option>';
     document.getElementById('precio_unitario').value = '';
     document.getElementById('total').value = '';
 }
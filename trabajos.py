@@ -0,0 +1,341 @@
+"""
+Reportes de ventas en segundo plano con resultados guardados en disco
+
+Cada trabajo construye un reporte con `ReporteVentasBuilder` en un pool de
+hilos local y guarda la respuesta JSON comprimida con gzip en
+`REPORTES_DIR/<id>.json.gz`, junto a su estado en `REPORTES_DIR/<id>.json`.
+El ID se deriva de los parámetros del reporte y de la versión de las ventas
+(`ventas_version`, que cambia con cada escritura confirmada): pedir de nuevo
+el mismo reporte sin que las ventas hayan cambiado devuelve el trabajo
+existente y su archivo, sin volver a calcularlo.
+Los archivos se eliminan tras `REPORTES_RETENCION_HORAS`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+import gzip
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from builder import Reporte, ReporteVentasBuilder, aplicar_agrupacion
+from database import Database
+from models import CambiosVenta
+from serializacion import dumps, dumps_bytes, loads
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_REPORTES = os.getenv('REPORTES_DIR', 'reportes')
+REPORTES_WORKERS = int(os.getenv('REPORTES_WORKERS', '2'))
+REPORTES_RETENCION_HORAS = float(os.getenv('REPORTES_RETENCION_HORAS', '24'))
+
+# Un trabajo en curso cuyo estado no se actualiza en este tiempo se da por
+# abandonado (por ejemplo, si su proceso terminó) y puede volver a lanzarse
+ABANDONO_SEGUNDOS = 900
+# Mientras se construye, el estado se reescribe con esta frecuencia para que
+# un reporte largo no se tome por abandonado
+LATIDO_SEGUNDOS = 60
+# Intervalo mínimo entre purgas automáticas al recibir trabajos
+INTERVALO_PURGA = 600
+# Filas (o valores de una columna) que se serializan juntas al guardar un resultado
+LOTE_ESCRITURA = 10000
+
+FORMATOS_TRABAJO = ('filas', 'columnar')
+PENDIENTE = 'pendiente'
+EN_CURSO = 'en_curso'
+COMPLETADO = 'completado'
+ERROR = 'error'
+
+_ID_VALIDO = re.compile(r'^[0-9a-f]{20}$')
+_activos = {}
+_lock = threading.Lock()
+_executor = None
+_ultima_purga = 0.0
+
+
+def _ruta_estado(id_trabajo: str, directorio: str = DIRECTORIO_REPORTES) -> str:
+    return os.path.join(directorio, f"{id_trabajo}.json")
+
+
+def _ruta_resultado(id_trabajo: str, directorio: str = DIRECTORIO_REPORTES) -> str:
+    return os.path.join(directorio, f"{id_trabajo}.json.gz")
+
+
+def _guardar_estado(estado: Dict):
+    """Escribe el estado de un trabajo de forma atómica (archivo temporal + renombrado)"""
+    estado["actualizado"] = datetime.now().isoformat()
+    ruta = _ruta_estado(estado["id"])
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, 'wb') as archivo:
+        archivo.write(dumps_bytes(estado, indent=True))
+    os.replace(temporal, ruta)
+
+
+def preparar_builder(parametros: Dict) -> Tuple[ReporteVentasBuilder, str]:
+    """Builder y formato de salida a partir de los parámetros de un trabajo
+
+    Acepta los mismos filtros y opciones que `GET /api/reportes/ventas`
+    salvo `since`; lanza ValueError si alguno no es válido.
+    """
+    builder = ReporteVentasBuilder()
+    builder.reset()
+    builder.set_titulo("Reporte de Ventas")
+    builder.set_tipo("reporte_ventas")
+    for campo, aplicar in (('id_cliente', builder.aplicar_filtro_cliente),
+                           ('id_producto', builder.aplicar_filtro_producto)):
+        valor = parametros.get(campo)
+        if valor:
+            try:
+                aplicar(int(valor))
+            except (TypeError, ValueError):
+                raise ValueError(f"{campo} debe ser un entero")
+    fecha_inicio = parametros.get('fecha_inicio')
+    fecha_fin = parametros.get('fecha_fin')
+    if fecha_inicio and fecha_fin:
+        try:
+            datetime.fromisoformat(fecha_inicio)
+            datetime.fromisoformat(fecha_fin)
+        except (TypeError, ValueError):
+            raise ValueError("fecha_inicio y fecha_fin deben estar en formato ISO (AAAA-MM-DD)")
+        builder.aplicar_filtro_fecha(fecha_inicio, fecha_fin)
+    aplicar_agrupacion(builder, parametros)
+    if str(parametros.get('solo_metricas', '')).lower() in ('1', 'true'):
+        builder.set_solo_metricas()
+    formato = str(parametros.get('formato', 'filas')).lower()
+    if formato not in FORMATOS_TRABAJO:
+        raise ValueError(f"Formato no soportado: {formato}. Use filas o columnar")
+    return builder, formato
+
+
+def calcular_id(builder: ReporteVentasBuilder, formato: str, version: int) -> str:
+    """ID del trabajo: igual para el mismo reporte mientras las ventas no cambien"""
+    clave = dumps([builder.clave_cache(), formato, version])
+    return hashlib.sha256(clave.encode('utf-8')).hexdigest()[:20]
+
+
+def _obtener_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=REPORTES_WORKERS, thread_name_prefix='reportes')
+    return _executor
+
+
+def _abandonado(id_trabajo: str) -> bool:
+    try:
+        return time.time() - os.path.getmtime(_ruta_estado(id_trabajo)) > ABANDONO_SEGUNDOS
+    except FileNotFoundError:
+        return True
+
+
+def enviar_trabajo(parametros: Dict) -> Tuple[Dict, bool]:
+    """Encola la construcción de un reporte
+
+    Retorna el estado del trabajo y si se creó uno nuevo; si el mismo reporte
+    ya está en curso, o terminado con los datos actuales, retorna ese trabajo.
+    Lanza ValueError si los parámetros no son válidos.
+    """
+    builder, formato = preparar_builder(parametros)
+    version = CambiosVenta.version()
+    id_trabajo = calcular_id(builder, formato, version)
+    os.makedirs(DIRECTORIO_REPORTES, exist_ok=True)
+    _purgar_si_corresponde()
+
+    with _lock:
+        existente = consultar_trabajo(id_trabajo)
+        if existente is not None:
+            if id_trabajo in _activos:
+                return existente, False
+            if existente["estado"] == COMPLETADO and os.path.exists(_ruta_resultado(id_trabajo)):
+                return existente, False
+            if existente["estado"] in (PENDIENTE, EN_CURSO) and not _abandonado(id_trabajo):
+                return existente, False
+
+        ahora = datetime.now().isoformat()
+        estado = {
+            "id": id_trabajo,
+            "estado": PENDIENTE,
+            "etapa": "en_cola",
+            "progreso": 0,
+            "parametros": {**builder.reporte.filtros, "formato": formato,
+                           "agrupacion": builder.reporte.agrupacion,
+                           "solo_metricas": builder.solo_metricas},
+            "version_datos": version,
+            "creado": ahora
+        }
+        _guardar_estado(estado)
+        respuesta = dict(estado)
+        _activos[id_trabajo] = _obtener_executor().submit(_ejecutar, estado, builder, formato)
+    return respuesta, True
+
+
+def _escribir_json(archivo: BinaryIO, reporte: Reporte, columnar: bool,
+                   avance: Callable[[float], None]) -> int:
+    """Escribe en `archivo` el mismo JSON que `GET /api/reportes/ventas`, por lotes
+
+    Solo se serializa un lote a la vez, sin armar el cuerpo completo en
+    memoria; `avance` recibe la fracción de los datos escrita tras cada lote.
+    Retorna los bytes de JSON escritos.
+    """
+    escritos = 0
+    hechos = 0
+    filas = reporte.num_filas
+    total = filas * len(reporte.columnas) if columnar else filas
+
+    def escribir(datos: bytes):
+        nonlocal escritos
+        archivo.write(datos)
+        escritos += len(datos)
+
+    def arreglo(lotes):
+        nonlocal hechos
+        escribir(b'[')
+        separador = b''
+        for lote in lotes:
+            if lote:
+                escribir(separador + dumps_bytes(lote)[1:-1])
+                separador = b','
+            hechos += len(lote)
+            avance(hechos / total)
+        escribir(b']')
+
+    def porciones(columna):
+        return (columna[inicio:inicio + LOTE_ESCRITURA] for inicio in range(0, filas, LOTE_ESCRITURA))
+
+    # El encabezado termina en `}}`: los datos se insertan antes de cerrarlo
+    encabezado = dumps_bytes({"success": True, "reporte": reporte.encabezado(columnar)})
+    escribir(encabezado[:-2] + b',"datos":')
+    if columnar:
+        escribir(b'{"columnas":' + dumps_bytes(reporte.columnas) + b',"filas":' + str(filas).encode() + b',"valores":[')
+        for indice, columna in enumerate(reporte.valores):
+            if indice:
+                escribir(b',')
+            arreglo(porciones(columna))
+        escribir(b']}')
+    else:
+        lotes = zip(*(porciones(columna) for columna in reporte.valores))
+        arreglo([dict(zip(reporte.columnas, fila)) for fila in zip(*lote)] for lote in lotes)
+    escribir(b'}}')
+    return escritos
+
+
+def _ejecutar(estado: Dict, builder: ReporteVentasBuilder, formato: str):
+    """Construye el reporte y lo guarda comprimido, actualizando el progreso"""
+    inicio = time.perf_counter()
+    temporal = f"{_ruta_resultado(estado['id'])}.{os.getpid()}.{threading.get_ident()}.tmp"
+    guardando = threading.Lock()
+    detener = threading.Event()
+
+    def guardar(**cambios):
+        with guardando:
+            estado.update(cambios)
+            _guardar_estado(estado)
+
+    def avanzar(etapa: str, progreso: int):
+        guardar(estado=EN_CURSO, etapa=etapa, progreso=progreso)
+
+    def latir():
+        while not detener.wait(LATIDO_SEGUNDOS):
+            try:
+                guardar()
+            except OSError as e:
+                logger.warning("No se pudo actualizar el estado del trabajo %s: %s", estado["id"], e)
+
+    threading.Thread(target=latir, name=f"latido-{estado['id']}", daemon=True).start()
+    try:
+        avanzar("consultando", 10)
+        with Database().connection():
+            reporte = builder.construir()
+
+        def avance(fraccion: float):
+            progreso = 20 + int(75 * fraccion)
+            if progreso >= estado["progreso"] + 5:
+                avanzar("escribiendo", progreso)
+
+        avanzar("escribiendo", 20)
+        with gzip.open(temporal, 'wb', compresslevel=6) as archivo:
+            bytes_json = _escribir_json(archivo, reporte, formato == 'columnar', avance)
+        os.replace(temporal, _ruta_resultado(estado['id']))
+
+        guardar(
+            estado=COMPLETADO, etapa="listo", progreso=100, filas=reporte.num_filas,
+            bytes_json=bytes_json, bytes=os.path.getsize(_ruta_resultado(estado['id'])),
+            duracion=round(time.perf_counter() - inicio, 3)
+        )
+    except Exception as e:
+        logger.exception("Error en el trabajo de reporte %s", estado["id"])
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        guardar(estado=ERROR, error=str(e))
+    finally:
+        detener.set()
+        with _lock:
+            _activos.pop(estado["id"], None)
+
+
+def consultar_trabajo(id_trabajo: str) -> Optional[Dict]:
+    """Estado guardado de un trabajo; None si no existe o ya se purgó"""
+    if not _ID_VALIDO.match(id_trabajo):
+        return None
+    try:
+        with open(_ruta_estado(id_trabajo), 'rb') as archivo:
+            return loads(archivo.read())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def ruta_resultado(id_trabajo: str) -> Optional[str]:
+    """Archivo comprimido con el resultado de un trabajo terminado; None si no está disponible"""
+    if not _ID_VALIDO.match(id_trabajo):
+        return None
+    ruta = _ruta_resultado(id_trabajo)
+    return ruta if os.path.exists(ruta) else None
+
+
+def purgar_resultados(horas: Optional[float] = None, directorio: str = DIRECTORIO_REPORTES) -> int:
+    """Elimina los trabajos actualizados hace más de `horas` horas y sus resultados
+
+    Los trabajos en curso en este proceso se conservan; también se eliminan
+    los archivos temporales abandonados. Retorna el número de trabajos eliminados.
+    """
+    horas = REPORTES_RETENCION_HORAS if horas is None else horas
+    limite = time.time() - horas * 3600
+    if not os.path.isdir(directorio):
+        return 0
+    eliminados = 0
+    for archivo in os.listdir(directorio):
+        id_trabajo = archivo.split('.', 1)[0]
+        if not _ID_VALIDO.match(id_trabajo) or id_trabajo in _activos:
+            continue
+        ruta = os.path.join(directorio, archivo)
+        try:
+            if os.path.getmtime(ruta) >= limite:
+                continue
+            if archivo.endswith('.tmp'):
+                os.remove(ruta)
+                continue
+            if not archivo.endswith('.json'):
+                continue
+            for asociado in (_ruta_resultado(id_trabajo, directorio), ruta):
+                if os.path.exists(asociado):
+                    os.remove(asociado)
+            eliminados += 1
+        except FileNotFoundError:
+            continue
+    return eliminados
+
+
+def _purgar_si_corresponde():
+    """Purga los trabajos vencidos como máximo una vez cada `INTERVALO_PURGA` segundos"""
+    global _ultima_purga
+    ahora = time.monotonic()
+    if ahora - _ultima_purga < INTERVALO_PURGA:
+        return
+    _ultima_purga = ahora
+    try:
+        eliminados = purgar_resultados()
+        if eliminados:
+            logger.info("Trabajos de reportes purgados: %s", eliminados)
+    except OSError as e:
+        logger.warning("No se pudieron purgar los trabajos de reportes: %s", e)